@@ -0,0 +1,340 @@
+import logging
+from datetime import date, datetime, time
+
+from django.conf import settings
+from django.db import connection, transaction
+from pymongo import ASCENDING, DESCENDING
+from pymongo.errors import BulkWriteError, PyMongoError
+
+from .mongodb_manager import mongo_manager, async_mongo_manager
+
+logger = logging.getLogger(__name__)
+
+CHECKIN_COLLECTION = 'checkin_archive'
+BOOKING_COLLECTION = 'classbooking_archive'
+
+DUPLICATE_KEY = 11000
+
+
+class ArchiveUnavailable(Exception):
+    """O MongoDB não está acessível; nada é apagado do PostgreSQL"""
+
+
+# Cada tipo de histórico: coleção, query das linhas antigas de um lote de
+# membros (ordenadas por membro/data), colunas e DELETE por ids
+ARCHIVE_KINDS = {
+    'checkins': {
+        'collection': CHECKIN_COLLECTION,
+        'members_sql': """
+            SELECT DISTINCT memberid FROM checkin
+            WHERE date < %s AND memberid > %s
+            ORDER BY memberid LIMIT %s
+        """,
+        'rows_sql': """
+            SELECT checkinid, memberid, date, entrancetime, exittime
+            FROM checkin
+            WHERE memberid = ANY(%s) AND date < %s
+            ORDER BY memberid, date, entrancetime, checkinid
+        """,
+        'columns': ['checkinid', 'memberid', 'date', 'entrancetime', 'exittime'],
+        # A condição na data permite ao PostgreSQL podar as partições recentes
+        'delete_sql': "DELETE FROM checkin WHERE checkinid = ANY(%s) AND date < %s",
+    },
+    'bookings': {
+        'collection': BOOKING_COLLECTION,
+        'members_sql': """
+            SELECT DISTINCT cb.memberid FROM classbooking cb
+            JOIN classschedule cs ON cs.classscheduleid = cb.classscheduleid
+            WHERE cs.date < %s AND cb.memberid > %s
+            ORDER BY cb.memberid LIMIT %s
+        """,
+        'rows_sql': """
+            SELECT cb.bookingid, cb.memberid, cs.date, cs.starttime, cs.endtime,
+                   cb.classscheduleid, c.name, c.room, cb.bookingdate
+            FROM classbooking cb
+            JOIN classschedule cs ON cs.classscheduleid = cb.classscheduleid
+            JOIN class c ON c.classid = cs.classid
+            WHERE cb.memberid = ANY(%s) AND cs.date < %s
+            ORDER BY cb.memberid, cs.date, cs.starttime, cb.bookingid
+        """,
+        'columns': ['bookingid', 'memberid', 'date', 'starttime', 'endtime',
+                    'classscheduleid', 'class_name', 'room', 'bookingdate'],
+        'delete_sql': """
+            DELETE FROM classbooking cb USING classschedule cs
+            WHERE cs.classscheduleid = cb.classscheduleid
+              AND cb.bookingid = ANY(%s) AND cs.date < %s
+        """,
+    },
+}
+
+
+# Totais dos agregados anteriores ao corte: o arquivo não os pode alterar
+# (os triggers de CHECKIN/CLASSBOOKING ignoram os DELETE com primefit.archiving)
+AGGREGATE_TOTALS_SQL = """
+    SELECT
+        (SELECT COALESCE(SUM(total), 0) FROM dailycheckincount WHERE date < %(cutoff)s),
+        (SELECT COALESCE(SUM(entries), 0) || '/' || COALESCE(SUM(exits), 0)
+         FROM hourlyoccupancy WHERE date < %(cutoff)s),
+        (SELECT COALESCE(SUM(checkin_count), 0) || '/' || COALESCE(SUM(class_bookings), 0)
+                || '/' || COALESCE(SUM(total_hours), 0)
+         FROM member_month_stats WHERE month < %(cutoff)s),
+        (SELECT COALESCE(SUM(booked_count), 0) FROM classschedule WHERE date < %(cutoff)s)
+"""
+
+AGGREGATE_NAMES = ['dailycheckincount', 'hourlyoccupancy', 'member_month_stats', 'booked_count']
+
+
+def retention_cutoff(months=None):
+    """
+    Primeiro dia do mês de há `months` meses (por omissão
+    ARCHIVE_RETENTION_MONTHS): arquivam-se sempre meses inteiros.
+    """
+    if months is None:
+        months = settings.ARCHIVE_RETENTION_MONTHS
+    today = date.today()
+    month = today.year * 12 + today.month - 1 - months
+    return date(month // 12, month % 12 + 1, 1)
+
+
+# Marca d'água por tipo de histórico: só sobe (GREATEST)
+RAISE_WATERMARK_SQL = """
+    INSERT INTO archivewatermark (kind, archived_before) VALUES (%s, %s)
+    ON CONFLICT (kind) DO UPDATE
+    SET archived_before = GREATEST(archivewatermark.archived_before, EXCLUDED.archived_before),
+        updated_at = CURRENT_TIMESTAMP
+"""
+
+WATERMARK_SQL = "SELECT MAX(archived_before) FROM archivewatermark WHERE kind = ANY(%s)"
+
+
+def raise_watermark(kind, cutoff):
+    with connection.cursor() as cursor:
+        cursor.execute(RAISE_WATERMARK_SQL, [kind, cutoff])
+
+
+def rebuild_cutoff(kinds=None):
+    """
+    Primeira data cujos agregados ainda podem ser recalculados a partir do
+    PostgreSQL: a marca d'água do que foi de facto arquivado (seja qual for a
+    retenção usada), ou date.min se nada foi arquivado.
+    """
+    with connection.cursor() as cursor:
+        cursor.execute(WATERMARK_SQL, [list(kinds or ARCHIVE_KINDS)])
+        watermark = cursor.fetchone()[0]
+    return watermark or date.min
+
+
+def aggregate_totals(cutoff):
+    with connection.cursor() as cursor:
+        cursor.execute(AGGREGATE_TOTALS_SQL, {'cutoff': cutoff})
+        return dict(zip(AGGREGATE_NAMES, (str(value) for value in cursor.fetchone())))
+
+
+def _to_bson(value):
+    # O BSON não tem tipos date/time: datas como datetime, horas como texto
+    if isinstance(value, datetime):
+        return value
+    if isinstance(value, date):
+        return datetime.combine(value, time())
+    if isinstance(value, time):
+        return value.isoformat()
+    return value
+
+
+def _id_column(kind):
+    return ARCHIVE_KINDS[kind]['columns'][0]
+
+
+def build_buckets(kind, rows):
+    """
+    Agrupa as linhas (já ordenadas por membro/data) num documento por membro e
+    mês. O _id inclui o menor id do bucket, por isso é determinístico: repetir o
+    mesmo lote depois de uma falha gera exatamente os mesmos documentos.
+    """
+    columns = ARCHIVE_KINDS[kind]['columns']
+    id_column = _id_column(kind)
+    buckets = {}
+    for row in rows:
+        entry = dict(zip(columns, row))
+        month = entry['date'].strftime('%Y-%m')
+        key = (entry['memberid'], month)
+        bucket = buckets.get(key)
+        if bucket is None:
+            bucket = buckets[key] = {
+                '_id': f'{entry["memberid"]}:{month}:{entry[id_column]}',
+                'memberid': entry['memberid'],
+                'month': month,
+                'entries': [],
+            }
+        del entry['memberid']
+        bucket['entries'].append({name: _to_bson(value) for name, value in entry.items()})
+    for bucket in buckets.values():
+        bucket['count'] = len(bucket['entries'])
+    return list(buckets.values())
+
+
+def _get_collection(kind):
+    collection = mongo_manager.get_collection(ARCHIVE_KINDS[kind]['collection'])
+    if collection is None:
+        raise ArchiveUnavailable()
+    return collection
+
+
+def ensure_archive_indexes():
+    try:
+        for kind in ARCHIVE_KINDS:
+            _get_collection(kind).create_index([('memberid', ASCENDING), ('month', DESCENDING)])
+    except PyMongoError as error:
+        mongo_manager.report_failure(error)
+        raise ArchiveUnavailable() from error
+
+
+def _insert_buckets(collection, buckets):
+    """
+    insert_many ordenado dos buckets ainda não arquivados. Devolve, por
+    bucket, os ids efetivamente guardados no MongoDB (num bucket que já
+    existia, os do documento existente).
+    """
+    existing = {
+        doc['_id']: doc for doc in collection.find(
+            {'_id': {'$in': [bucket['_id'] for bucket in buckets]}}, {'entries': 1}
+        )
+    }
+    pending = [bucket for bucket in buckets if bucket['_id'] not in existing]
+    while pending:
+        try:
+            collection.insert_many(pending, ordered=True)
+            break
+        except BulkWriteError as error:
+            # Só toleramos _id repetidos (outro processo arquivou o mesmo bucket)
+            first = error.details['writeErrors'][0]
+            if first['code'] != DUPLICATE_KEY:
+                raise
+            duplicate = pending[first['index']]
+            existing[duplicate['_id']] = collection.find_one({'_id': duplicate['_id']}, {'entries': 1})
+            pending = pending[first['index'] + 1:]
+    return existing
+
+
+def archive_batch(kind, memberids, cutoff, chunk_size):
+    """
+    Arquiva no MongoDB e apaga do PostgreSQL as linhas anteriores a `cutoff`
+    dos membros indicados. A escrita no MongoDB acontece antes do DELETE, e o
+    DELETE só apaga ids que estão de facto no arquivo. Devolve o número de
+    linhas movidas.
+    """
+    config = ARCHIVE_KINDS[kind]
+    collection = _get_collection(kind)
+    id_column = _id_column(kind)
+
+    with connection.cursor() as cursor:
+        cursor.execute(config['rows_sql'], [memberids, cutoff])
+        buckets = build_buckets(kind, cursor.fetchall())
+
+    moved = 0
+    for start in range(0, len(buckets), chunk_size):
+        chunk = buckets[start:start + chunk_size]
+        try:
+            existing = _insert_buckets(collection, chunk)
+        except PyMongoError as error:
+            mongo_manager.report_failure(error)
+            raise ArchiveUnavailable() from error
+
+        archived_ids = []
+        for bucket in chunk:
+            stored = existing.get(bucket['_id'], bucket)
+            archived_ids.extend(entry[id_column] for entry in stored['entries'])
+
+        with transaction.atomic(), connection.cursor() as cursor:
+            cursor.execute("SET LOCAL primefit.archiving = on")
+            cursor.execute(config['delete_sql'], [archived_ids, cutoff])
+            moved += cursor.rowcount
+    return moved
+
+
+def archive_history(kind, cutoff, members_per_batch=500, chunk_size=1000, progress=None):
+    """Percorre os membros por ordem de memberid e arquiva lote a lote"""
+    ensure_archive_indexes()
+    # Antes do primeiro DELETE: uma execução interrompida já deixa os meses
+    # parcialmente arquivados fora das reconstruções
+    raise_watermark(kind, cutoff)
+    config = ARCHIVE_KINDS[kind]
+    last_memberid = 0
+    total = 0
+    while True:
+        with connection.cursor() as cursor:
+            cursor.execute(config['members_sql'], [cutoff, last_memberid, members_per_batch])
+            memberids = [row[0] for row in cursor.fetchall()]
+        if not memberids:
+            return total
+        total += archive_batch(kind, memberids, cutoff, chunk_size)
+        last_memberid = memberids[-1]
+        if progress:
+            progress(kind, last_memberid, total)
+
+
+def archived_checkins(memberid, limit):
+    """
+    Check-ins mais recentes do membro no arquivo, no formato das linhas de
+    MemberCheckinHistory. Se o MongoDB estiver em baixo devolve [].
+    """
+    if limit <= 0:
+        return []
+    try:
+        collection = _get_collection('checkins')
+        history = []
+        for bucket in collection.find({'memberid': memberid}).sort('month', DESCENDING):
+            entries = sorted(
+                bucket['entries'], key=lambda e: (e['date'], e['entrancetime']), reverse=True
+            )
+            for entry in entries:
+                history.append(_checkin_row(entry))
+            if len(history) >= limit:
+                break
+    except PyMongoError as error:
+        mongo_manager.report_failure(error)
+        return []
+    except ArchiveUnavailable:
+        logger.warning('Arquivo de check-ins indisponível para o membro %s', memberid)
+        return []
+    history.sort(key=lambda row: (row['checkin_date'], row['entrancetime']), reverse=True)
+    return history[:limit]
+
+
+async def archived_checkins_async(memberid, limit):
+    """archived_checkins() para as views assíncronas (cliente MongoDB assíncrono)"""
+    if limit <= 0:
+        return []
+    try:
+        async with async_mongo_manager.collection(CHECKIN_COLLECTION) as collection:
+            if collection is None:
+                logger.warning('Arquivo de check-ins indisponível para o membro %s', memberid)
+                return []
+            history = []
+            async for bucket in collection.find({'memberid': memberid}).sort('month', DESCENDING):
+                history.extend(_checkin_row(entry) for entry in bucket['entries'])
+                if len(history) >= limit:
+                    break
+    except PyMongoError as error:
+        async_mongo_manager.report_failure(error)
+        return []
+    history.sort(key=lambda row: (row['checkin_date'], row['entrancetime']), reverse=True)
+    return history[:limit]
+
+
+def _checkin_row(entry):
+    entrancetime = time.fromisoformat(entry['entrancetime'])
+    exittime = time.fromisoformat(entry['exittime']) if entry.get('exittime') else None
+    row = {
+        'checkinid': entry['checkinid'],
+        'checkin_date': entry['date'].date(),
+        'entrancetime': entrancetime,
+        'exittime': exittime,
+        'duration_hours': None,
+        'duration_formatted': 'Em curso',
+    }
+    if exittime:
+        minutes = (exittime.hour * 60 + exittime.minute) - (entrancetime.hour * 60 + entrancetime.minute)
+        row['duration_hours'] = minutes / 60
+        row['duration_formatted'] = f'{minutes // 60}h {minutes % 60:02d}min'
+    return row
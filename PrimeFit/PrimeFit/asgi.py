@@ -5,6 +5,11 @@ It exposes the ASGI callable as a module-level variable named ``application``.
 
 For more information on this file, see
 https://docs.djangoproject.com/en/5.2/howto/deployment/asgi/
+
+The live occupancy stream (manager/occupancy/stream/) is served as async
+server-sent events only under ASGI, e.g. ``uvicorn PrimeFit.asgi:application``;
+every connected dashboard in the process shares one LISTEN connection
+(PrimeFit.occupancy). Under WSGI each open stream holds a worker thread.
 """
 
 import os
@@ -0,0 +1,126 @@
+import asyncio
+import logging
+from contextlib import asynccontextmanager
+from contextvars import ContextVar
+
+from django.conf import settings
+from django.core.exceptions import ImproperlyConfigured
+
+logger = logging.getLogger(__name__)
+
+# True quando o código corre no event loop do servidor ASGI, que dura o
+# processo inteiro (definido pelas views assíncronas a partir do pedido). Sob
+# WSGI cada pedido a uma view assíncrona corre num loop novo (async_to_sync):
+# aí não se guardam pools nem clientes, que ficariam presos a um loop morto.
+on_server_loop = ContextVar('on_server_loop', default=False)
+
+
+def _psycopg():
+    try:
+        import psycopg
+        from psycopg.rows import dict_row
+        from psycopg_pool import AsyncConnectionPool
+    except ImportError:
+        raise ImproperlyConfigured('As views assíncronas requerem psycopg 3 e psycopg_pool')
+    return psycopg, dict_row, AsyncConnectionPool
+
+
+def _conninfo(alias):
+    psycopg, _, _ = _psycopg()
+    config = settings.DATABASES[alias]
+    return psycopg.conninfo.make_conninfo(
+        dbname=config['NAME'],
+        user=config['USER'] or None,
+        password=config['PASSWORD'] or None,
+        host=config['HOST'] or None,
+        port=config['PORT'] or None,
+    )
+
+
+class AsyncDatabasePools:
+    """
+    Um AsyncConnectionPool (psycopg 3) por alias de perfil, separado das
+    ligações síncronas do Django. Os pools pertencem ao event loop do servidor
+    ASGI; fora dele (on_server_loop falso) cada query usa uma ligação própria,
+    fechada no fim. Se o loop do servidor mudar (ex.: testes) os pools antigos
+    são fechados antes de serem substituídos.
+    """
+
+    def __init__(self):
+        self._pools = {}
+        self._loop = None
+        self._lock = None
+
+    def _discard_pools(self):
+        pools, loop, self._pools = self._pools, self._loop, {}
+        if not pools:
+            return
+        if loop is not None and not loop.is_closed() and loop.is_running():
+            for pool in pools.values():
+                asyncio.run_coroutine_threadsafe(pool.close(), loop)
+        else:
+            logger.warning('Event loop dos pools assíncronos terminou sem async_db.close()')
+
+    async def get_pool(self, alias):
+        loop = asyncio.get_running_loop()
+        if self._loop is not loop:
+            self._discard_pools()
+            self._loop = loop
+            self._lock = asyncio.Lock()
+        pool = self._pools.get(alias)
+        if pool is not None:
+            return pool
+        async with self._lock:
+            if alias not in self._pools:
+                _, dict_row, AsyncConnectionPool = _psycopg()
+                pool = AsyncConnectionPool(
+                    _conninfo(alias),
+                    min_size=settings.ASYNC_DB_POOL_MIN_SIZE,
+                    max_size=settings.ASYNC_DB_POOL_MAX_SIZE,
+                    timeout=settings.ASYNC_DB_POOL_TIMEOUT,
+                    kwargs={'row_factory': dict_row, 'autocommit': True},
+                    name=f'async-{alias}',
+                    open=False,
+                )
+                await pool.open()
+                self._pools[alias] = pool
+        return self._pools[alias]
+
+    @asynccontextmanager
+    async def connection(self, alias):
+        if on_server_loop.get():
+            pool = await self.get_pool(alias)
+            async with pool.connection() as conn:
+                yield conn
+            return
+        psycopg, dict_row, _ = _psycopg()
+        conn = await psycopg.AsyncConnection.connect(_conninfo(alias), row_factory=dict_row, autocommit=True)
+        try:
+            yield conn
+        finally:
+            await conn.close()
+
+    async def fetchall(self, alias, sql, params=None):
+        """Executa uma query numa ligação do pool e devolve as linhas como dicts"""
+        async with self.connection(alias) as conn:
+            cursor = await conn.execute(sql, params)
+            return await cursor.fetchall()
+
+    async def fetchone(self, alias, sql, params=None):
+        rows = await self.fetchall(alias, sql, params)
+        return rows[0] if rows else None
+
+    async def execute(self, alias, sql, params=None):
+        async with self.connection(alias) as conn:
+            await conn.execute(sql, params)
+
+    def stats(self):
+        return {alias: pool.get_stats() for alias, pool in self._pools.items()}
+
+    async def close(self):
+        pools, self._pools = self._pools, {}
+        for pool in pools.values():
+            await pool.close()
+
+
+async_db = AsyncDatabasePools()
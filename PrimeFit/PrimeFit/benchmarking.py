@@ -0,0 +1,31 @@
+import math
+
+
+def percentile(values, pct):
+    """Percentil (nearest-rank) de uma lista de valores já ordenada"""
+    if not values:
+        return 0.0
+    rank = max(1, math.ceil(pct / 100 * len(values)))
+    return values[rank - 1]
+
+
+def summarize_latencies(latencies):
+    """
+    Resume uma lista de latências (em segundos) nos percentis usados pelos
+    comandos de benchmark. Devolve os valores em milissegundos.
+    """
+    ordered = sorted(latencies)
+    return {
+        'count': len(ordered),
+        'p50_ms': percentile(ordered, 50) * 1000,
+        'p95_ms': percentile(ordered, 95) * 1000,
+        'p99_ms': percentile(ordered, 99) * 1000,
+        'max_ms': (ordered[-1] if ordered else 0.0) * 1000,
+    }
+
+
+def format_summary(summary):
+    return (
+        f"n={summary['count']} p50={summary['p50_ms']:.1f}ms p95={summary['p95_ms']:.1f}ms "
+        f"p99={summary['p99_ms']:.1f}ms max={summary['max_ms']:.1f}ms"
+    )
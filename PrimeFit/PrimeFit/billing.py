@@ -0,0 +1,99 @@
+from datetime import date
+
+from django.db import connection, transaction
+
+# Pagamento do ciclo que vence no mês [period_start, period_end) para cada
+# subscrição ativa do intervalo de ids. O vencimento é a data de início mais N
+# meses (o PostgreSQL ajusta o fim do mês: 31/01 + 1 mês = 28 ou 29/02).
+# UQ_PAYMENT_SUBSCRIPTION_DUE torna a execução repetível: os ciclos já
+# faturados são ignorados pelo ON CONFLICT.
+GENERATE_PAYMENTS_SQL = """
+    INSERT INTO payment (paymentid, subscriptionid, amount, ispayed, duedate, reference)
+    SELECT id, subscriptionid, amount, false, duedate, 'PF' || lpad(id::text, 12, '0')
+    FROM (
+        SELECT nextval(pg_get_serial_sequence('payment', 'paymentid')) AS id,
+               ms.subscriptionid, p.monthlyprice AS amount, c.duedate
+        FROM membersubscription ms
+        JOIN plan p ON p.planid = ms.planid
+        CROSS JOIN LATERAL (
+            SELECT (ms.startdate + make_interval(months =>
+                ((EXTRACT(YEAR FROM %(period_start)s::date) - EXTRACT(YEAR FROM ms.startdate)) * 12
+                 + EXTRACT(MONTH FROM %(period_start)s::date) - EXTRACT(MONTH FROM ms.startdate))::int
+            ))::date AS duedate
+        ) c
+        WHERE ms.subscriptionid >= %(first_id)s AND ms.subscriptionid < %(last_id)s
+          AND ms.isactive = true
+          AND p.monthlyprice > 0
+          AND ms.startdate < %(period_end)s
+          AND c.duedate >= ms.startdate
+          AND c.duedate <= ms.enddate
+          AND NOT EXISTS (
+              SELECT 1 FROM payment x
+              WHERE x.subscriptionid = ms.subscriptionid AND x.duedate = c.duedate
+          )
+    ) due
+    ON CONFLICT (subscriptionid, duedate) DO NOTHING
+"""
+
+# Pagamentos por pagar com vencimento anterior ao limite, de todas as
+# subscrições (também as já inativas): um só varrimento do intervalo em
+# DUEDATE com ISPAYED = false, servido por IDX_PAYMENT_UNPAID_DUE. A marca é
+# retirada pelo trigger payment_clear_overdue quando o pagamento é liquidado.
+MARK_OVERDUE_SQL = """
+    UPDATE payment
+    SET isoverdue = true
+    WHERE ispayed = false
+      AND duedate < %(overdue_before)s
+      AND isoverdue = false
+"""
+
+SUBSCRIPTION_RANGE_SQL = "SELECT MIN(subscriptionid), MAX(subscriptionid) FROM membersubscription WHERE isactive = true"
+
+
+def billing_period(month):
+    """Primeiro dia do mês faturado e do mês seguinte"""
+    start = date(month.year, month.month, 1)
+    end = date(start.year + start.month // 12, start.month % 12 + 1, 1)
+    return start, end
+
+
+def subscription_chunks(chunk_size, shard=0, shards=1):
+    """
+    Intervalos [first_id, last_id) de ids de subscrição ativos. Com shards > 1
+    cada processo fica com um em cada `shards` intervalos (shard = 0..shards-1).
+    """
+    with connection.cursor() as cursor:
+        cursor.execute(SUBSCRIPTION_RANGE_SQL)
+        low, high = cursor.fetchone()
+    if low is None:
+        return []
+    chunks = []
+    for index, first_id in enumerate(range(low, high + 1, chunk_size)):
+        if index % shards == shard:
+            chunks.append((first_id, first_id + chunk_size))
+    return chunks
+
+
+def ensure_billing_partition(period_start):
+    with connection.cursor() as cursor:
+        cursor.execute("SELECT fn_ensure_month_partitions('payment', %s, 1)", [period_start])
+
+
+def bill_chunk(first_id, last_id, period_start, period_end):
+    """Fatura um intervalo de subscrições numa só transação. Devolve os pagamentos criados"""
+    params = {
+        'first_id': first_id,
+        'last_id': last_id,
+        'period_start': period_start,
+        'period_end': period_end,
+    }
+    with transaction.atomic(), connection.cursor() as cursor:
+        cursor.execute(GENERATE_PAYMENTS_SQL, params)
+        return cursor.rowcount
+
+
+def mark_overdue(overdue_before):
+    """Marca em atraso os pagamentos por pagar que venceram antes de `overdue_before`"""
+    with transaction.atomic(), connection.cursor() as cursor:
+        cursor.execute(MARK_OVERDUE_SQL, {'overdue_before': overdue_before})
+        return cursor.rowcount
@@ -0,0 +1,81 @@
+def _csv_value(value):
+    if value is None:
+        return ''
+    if value is True:
+        return 't'
+    if value is False:
+        return 'f'
+    if isinstance(value, str):
+        return '"' + value.replace('"', '""') + '"'
+    return str(value)
+
+
+def csv_line(row):
+    """
+    Uma linha no formato CSV do COPY: None fica sem aspas (NULL) e as strings
+    vão sempre entre aspas, por isso '' continua a ser uma string vazia.
+    """
+    return ','.join(_csv_value(value) for value in row) + '\n'
+
+
+class _CopyBuffer:
+    """
+    Objeto tipo ficheiro que gera o CSV do COPY à medida que o psycopg2 o lê,
+    para que o carregamento use memória constante seja qual for o número de linhas.
+    """
+
+    def __init__(self, rows):
+        self._rows = iter(rows)
+        self._buffer = ''
+        self.rowcount = 0
+
+    def _fill(self, size):
+        parts = [self._buffer]
+        length = len(self._buffer)
+        while length < size:
+            try:
+                line = csv_line(next(self._rows))
+            except StopIteration:
+                break
+            parts.append(line)
+            length += len(line)
+            self.rowcount += 1
+        self._buffer = ''.join(parts)
+
+    def read(self, size=-1):
+        if size is None or size < 0:
+            size = 1 << 30
+        self._fill(size)
+        chunk, self._buffer = self._buffer[:size], self._buffer[size:]
+        return chunk
+
+    def readline(self, size=-1):
+        if '\n' not in self._buffer:
+            self._fill(len(self._buffer) + 1)
+        line, sep, rest = self._buffer.partition('\n')
+        self._buffer = rest
+        return line + sep
+
+
+def copy_rows(cursor, table, columns, rows):
+    """
+    Carrega `rows` (iterável de tuplos) em `table` com COPY ... FROM STDIN.
+
+    As linhas são geradas à medida que são enviadas (memória constante).
+    Funciona com cursores Django sobre psycopg2 ou psycopg 3.
+    Devolve o número de linhas enviadas.
+    """
+    sql = f"COPY {table} ({', '.join(columns)}) FROM STDIN WITH (FORMAT csv)"
+    raw = getattr(cursor, 'cursor', cursor)
+
+    if hasattr(raw, 'copy_expert'):
+        buffer = _CopyBuffer(rows)
+        raw.copy_expert(sql, buffer, size=65536)
+        return buffer.rowcount
+
+    count = 0
+    with raw.copy(sql) as copy:
+        for row in rows:
+            copy.write(csv_line(row))
+            count += 1
+    return count
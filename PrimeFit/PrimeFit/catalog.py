@@ -0,0 +1,134 @@
+import logging
+import threading
+import time
+
+from django.conf import settings
+
+from .db_router import get_db_connection
+from .pg_listen import open_listen_connection, wait_for_notifies
+
+logger = logging.getLogger(__name__)
+
+CHANNEL = 'catalog_changed'
+
+# Dados de referência em cache: tabela cujo NOTIFY invalida a entrada e query
+CATALOGS = {
+    'plans': ('plan', "SELECT planid, name, monthlyprice, access24h FROM vw_plan ORDER BY planid"),
+    'plans_detail': ('plan', """
+        SELECT planid, name, monthlyprice, access24h, description, isactive
+        FROM vw_plans ORDER BY monthlyprice
+    """),
+    'usertypes': ('usertype', "SELECT usertypeid, label FROM usertype ORDER BY usertypeid"),
+    'machinestatuses': ('machinestatus', "SELECT machinestatusid, status FROM machinestatus ORDER BY status"),
+}
+
+
+class CatalogCache:
+    """
+    Cache read-through, por processo, dos catálogos pequenos (planos, tipos de
+    utilizador, estados das máquinas). Uma thread faz LISTEN catalog_changed (o
+    NOTIFY vem dos triggers dessas tabelas) e invalida as entradas da tabela
+    alterada em todos os workers. O TTL é a rede de segurança para quando o
+    listener está em baixo; ao religar, tudo é invalidado (podem ter-se perdido
+    notificações). As listas devolvidas são partilhadas: não as alterar.
+    """
+
+    def __init__(self, ttl=300.0, alias='default'):
+        self.ttl = ttl
+        self.alias = alias
+        self._entries = {}
+        self._generation = {name: 0 for name in CATALOGS}
+        self._stats = {name: {'hits': 0, 'misses': 0, 'invalidations': 0} for name in CATALOGS}
+        self._lock = threading.Lock()
+        self._thread = None
+        self._listening = False
+
+    def get(self, name):
+        self._ensure_listener()
+        now = time.monotonic()
+        with self._lock:
+            entry = self._entries.get(name)
+            if entry is not None and entry[1] > now:
+                self._stats[name]['hits'] += 1
+                return entry[0]
+            self._stats[name]['misses'] += 1
+            generation = self._generation[name]
+
+        with get_db_connection().cursor() as cursor:
+            cursor.execute(CATALOGS[name][1])
+            columns = [column[0] for column in cursor.description]
+            rows = [dict(zip(columns, row)) for row in cursor.fetchall()]
+
+        with self._lock:
+            # Uma invalidação durante a leitura torna este resultado obsoleto
+            if self._generation[name] == generation:
+                self._entries[name] = (rows, now + self.ttl)
+        return rows
+
+    def invalidate(self, table=None):
+        """Invalida os catálogos da tabela indicada (ou todos)"""
+        with self._lock:
+            for name, (catalog_table, _) in CATALOGS.items():
+                if table is None or catalog_table == table:
+                    self._entries.pop(name, None)
+                    self._generation[name] += 1
+                    self._stats[name]['invalidations'] += 1
+
+    def stats(self):
+        with self._lock:
+            return {
+                'listening': self._listening,
+                'ttl_seconds': self.ttl,
+                'catalogs': {
+                    name: {**counts, 'cached': name in self._entries}
+                    for name, counts in self._stats.items()
+                },
+            }
+
+    def render_prometheus(self):
+        stats = self.stats()
+        lines = []
+        for field, kind in (('hits', 'counter'), ('misses', 'counter'), ('invalidations', 'counter')):
+            name = f'primefit_catalog_cache_{field}_total'
+            lines.append(f'# TYPE {name} {kind}')
+            for catalog, counts in sorted(stats['catalogs'].items()):
+                lines.append(f'{name}{{catalog="{catalog}"}} {counts[field]}')
+        lines.append('# TYPE primefit_catalog_cache_listening gauge')
+        lines.append(f'primefit_catalog_cache_listening {int(stats["listening"])}')
+        return '\n'.join(lines) + '\n'
+
+    def _ensure_listener(self):
+        if self._thread is not None:
+            return
+        with self._lock:
+            if self._thread is None:
+                self._thread = threading.Thread(target=self._run, name='catalog-listener', daemon=True)
+                self._thread.start()
+
+    def _run(self):
+        backoff = 1.0
+        while True:
+            conn = None
+            try:
+                conn = open_listen_connection(self.alias, [CHANNEL])
+                self.invalidate()
+                self._listening = True
+                backoff = 1.0
+                while True:
+                    for _, table in wait_for_notifies(conn, 60):
+                        self.invalidate(table)
+            except Exception as e:
+                logger.error(f"Catalog listener failed: {e}")
+            finally:
+                self._listening = False
+                if conn is not None:
+                    conn.close()
+            time.sleep(backoff)
+            backoff = min(backoff * 2, 60.0)
+
+
+catalog_cache = CatalogCache(ttl=getattr(settings, 'CATALOG_CACHE_TTL', 300))
+
+
+def get_catalog(name):
+    return catalog_cache.get(name)
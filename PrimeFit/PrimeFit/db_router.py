@@ -0,0 +1,112 @@
+import contextvars
+
+from django.db import connections
+
+# Alias de base de dados por tipo de utilizador (usertypeid)
+USER_TYPE_DB_ALIAS = {
+    1: 'admin',       # Gestor
+    2: 'instructor',  # Instrutor
+    3: 'member',      # Membro
+}
+
+_current_alias = contextvars.ContextVar('primefit_db_alias', default='default')
+
+
+def get_db_alias(request=None):
+    """Alias do pedido atual (definido pelo DatabaseAliasMiddleware)"""
+    if request is not None:
+        return getattr(request, 'db_alias', 'default')
+    return _current_alias.get()
+
+
+def get_db_connection(request=None):
+    """Ligação para cursores raw com o alias do perfil do utilizador"""
+    return connections[get_db_alias(request)]
+
+
+class RoleDatabaseRouter:
+    """
+    Encaminha as queries dos models da aplicação para o alias do perfil do
+    utilizador autenticado. Os models do Django (sessões, auth, ...) ficam
+    sempre no alias 'default'.
+    """
+    app_label = 'PrimeFit'
+
+    def db_for_read(self, model, **hints):
+        if model._meta.app_label == self.app_label:
+            return _current_alias.get()
+        return None
+
+    def db_for_write(self, model, **hints):
+        if model._meta.app_label == self.app_label:
+            return _current_alias.get()
+        return None
+
+    def allow_relation(self, obj1, obj2, **hints):
+        # Todos os aliases apontam para a mesma base de dados
+        return True
+
+    def allow_migrate(self, db, app_label, model_name=None, **hints):
+        return db == 'default'
+
+
+class DatabaseAliasMiddleware:
+    """Escolhe o alias de base de dados a partir do user_type_id do utilizador"""
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        alias = 'default'
+        principal = getattr(request, 'principal', None)
+        if principal is not None:
+            alias = USER_TYPE_DB_ALIAS.get(principal.user_type_id, 'default')
+        request.db_alias = alias
+        token = _current_alias.set(alias)
+        try:
+            return self.get_response(request)
+        finally:
+            _current_alias.reset(token)
+
+
+def close_connections_for_fork():
+    """
+    Fecha as ligações deste processo antes de um fork (ProcessPoolExecutor).
+    Com DB_POOL, close_all() só devolve as ligações ao pool, que continuaria
+    com os sockets abertos e seria herdado pelos processos filhos: os pools
+    também são fechados (o processo pai cria um novo quando voltar a precisar).
+    """
+    connections.close_all()
+    for alias in connections:
+        connections[alias].close_pool()
+
+
+def get_pool_stats():
+    """
+    Estatísticas dos pools de ligações deste processo, por alias.
+    hit_rate é a fração de pedidos servidos sem esperar por uma ligação livre.
+    """
+    stats = {}
+    for alias in connections:
+        pool = connections[alias].pool
+        if pool is None:
+            stats[alias] = {'pooled': False}
+            continue
+        raw = pool.get_stats()
+        requests = raw.get('requests_num', 0)
+        queued = raw.get('requests_queued', 0)
+        wait_ms = raw.get('requests_wait_ms', 0)
+        stats[alias] = {
+            'pooled': True,
+            'pool_min': raw.get('pool_min'),
+            'pool_max': raw.get('pool_max'),
+            'pool_size': raw.get('pool_size'),
+            'pool_available': raw.get('pool_available'),
+            'requests': requests,
+            'requests_waiting': raw.get('requests_waiting', 0),
+            'requests_errors': raw.get('requests_errors', 0),
+            'hit_rate': (requests - queued) / requests if requests else 1.0,
+            'wait_ms_total': wait_ms,
+            'wait_ms_avg': wait_ms / requests if requests else 0.0,
+        }
+    return stats
@@ -0,0 +1,112 @@
+import csv
+import zlib
+
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.core.serializers.json import DjangoJSONEncoder
+from django.http import StreamingHttpResponse
+
+# Linhas pedidas ao servidor de cada vez pelo cursor com nome (server-side)
+EXPORT_FETCH_SIZE = getattr(settings, 'EXPORT_FETCH_SIZE', 2000)
+# Bytes acumulados antes de enviar um bloco ao cliente
+EXPORT_CHUNK_BYTES = getattr(settings, 'EXPORT_CHUNK_BYTES', 64 * 1024)
+
+CONTENT_TYPES = {
+    'csv': 'text/csv; charset=utf-8',
+    'ndjson': 'application/x-ndjson; charset=utf-8',
+}
+
+
+class _Echo:
+    """Pseudo-ficheiro para o csv.writer: devolve a linha em vez de a guardar"""
+
+    def write(self, value):
+        return value
+
+
+def csv_lines(columns, rows):
+    writer = csv.writer(_Echo())
+    yield writer.writerow(columns)
+    for row in rows:
+        yield writer.writerow(row)
+
+
+def ndjson_lines(columns, rows):
+    encoder = DjangoJSONEncoder(ensure_ascii=False)
+    for row in rows:
+        yield encoder.encode(dict(zip(columns, row))) + '\n'
+
+
+def chunked(lines, size=EXPORT_CHUNK_BYTES):
+    """
+    Junta as linhas em blocos de ~size bytes. O primeiro bloco (cabeçalho) sai
+    logo, para o cliente começar a receber antes de a query devolver tudo.
+    """
+    parts = []
+    length = 0
+    first = True
+    for line in lines:
+        data = line.encode('utf-8')
+        parts.append(data)
+        length += len(data)
+        if first or length >= size:
+            yield b''.join(parts)
+            parts = []
+            length = 0
+            first = False
+    if parts:
+        yield b''.join(parts)
+
+
+def gzipped(chunks):
+    """Comprime o stream em gzip, com um sync flush por bloco para não reter bytes"""
+    compressor = zlib.compressobj(6, zlib.DEFLATED, 31)
+    for chunk in chunks:
+        data = compressor.compress(chunk) + compressor.flush(zlib.Z_SYNC_FLUSH)
+        if data:
+            yield data
+    yield compressor.flush()
+
+
+async def async_chunks(chunks):
+    """
+    Iterador assíncrono sobre um gerador síncrono: cada bloco é produzido numa
+    thread (sempre a mesma do pedido, thread_sensitive), por isso o cursor da
+    base de dados não bloqueia o event loop. Sob ASGI o Django consome os
+    iteradores síncronos de uma vez antes de enviar a resposta.
+    """
+    next_chunk = sync_to_async(next, thread_sensitive=True)
+    try:
+        while (chunk := await next_chunk(chunks, None)) is not None:
+            yield chunk
+    finally:
+        # Cliente desligou-se a meio: fecha o gerador (e o cursor com nome)
+        await sync_to_async(chunks.close, thread_sensitive=True)()
+
+
+def stream_export(queryset, columns, filename, fmt='csv', compress=False, asynchronous=False):
+    """
+    Exporta `queryset` (colunas `columns`) como CSV ou NDJSON num
+    StreamingHttpResponse. O iterator() usa um cursor com nome do PostgreSQL
+    com EXPORT_FETCH_SIZE linhas por fetch, por isso a memória é constante
+    seja qual for o número de linhas. Com asynchronous=True (pedidos ASGI) o
+    stream é um iterador assíncrono.
+    """
+    rows = queryset.values_list(*columns).iterator(chunk_size=EXPORT_FETCH_SIZE)
+    lines = csv_lines(columns, rows) if fmt == 'csv' else ndjson_lines(columns, rows)
+    stream = chunked(lines)
+    filename = f'{filename}.{fmt}'
+
+    content_type = CONTENT_TYPES[fmt]
+    if compress:
+        stream = gzipped(stream)
+        filename += '.gz'
+        content_type = 'application/gzip'
+    if asynchronous:
+        stream = async_chunks(stream)
+    response = StreamingHttpResponse(stream, content_type=content_type)
+
+    response['Content-Disposition'] = f'attachment; filename="{filename}"'
+    # Sem buffering em proxies (nginx) para o download começar de imediato
+    response['X-Accel-Buffering'] = 'no'
+    return response
@@ -0,0 +1,101 @@
+import os
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+from django.conf import settings
+from django.contrib.auth.hashers import (
+    Argon2PasswordHasher, ScryptPasswordHasher, check_password, make_password
+)
+
+
+# Hashers com custo configurável (settings ARGON2_* / SCRYPT_*).
+# O nome do algoritmo não muda, por isso hashes existentes continuam válidos e
+# são refeitos no login seguinte quando os custos mudam (must_update).
+class TunedArgon2PasswordHasher(Argon2PasswordHasher):
+    time_cost = getattr(settings, 'ARGON2_TIME_COST', Argon2PasswordHasher.time_cost)
+    memory_cost = getattr(settings, 'ARGON2_MEMORY_COST', Argon2PasswordHasher.memory_cost)
+    parallelism = getattr(settings, 'ARGON2_PARALLELISM', Argon2PasswordHasher.parallelism)
+
+
+class TunedScryptPasswordHasher(ScryptPasswordHasher):
+    work_factor = getattr(settings, 'SCRYPT_WORK_FACTOR', ScryptPasswordHasher.work_factor)
+    block_size = getattr(settings, 'SCRYPT_BLOCK_SIZE', ScryptPasswordHasher.block_size)
+    parallelism = getattr(settings, 'SCRYPT_PARALLELISM', ScryptPasswordHasher.parallelism)
+
+
+class HashingPoolBusy(Exception):
+    """O pool de hashing está cheio; o pedido deve ser rejeitado (back-pressure)"""
+
+
+class HashingPool:
+    """
+    Pool limitado para o hashing de passwords (PBKDF2/scrypt/Argon2 libertam o
+    GIL). No máximo `workers` hashes correm em simultâneo e `max_pending`
+    esperam na fila; acima disso submit() falha após `acquire_timeout`
+    segundos em vez de acumular pedidos atrás de trabalho CPU-bound.
+    """
+
+    def __init__(self, workers, max_pending, acquire_timeout=1.0):
+        self.workers = workers
+        self.acquire_timeout = acquire_timeout
+        self._slots = threading.BoundedSemaphore(workers + max_pending)
+        self._executor = ThreadPoolExecutor(max_workers=workers, thread_name_prefix='password-hashing')
+
+    def submit(self, fn, *args):
+        if not self._slots.acquire(timeout=self.acquire_timeout):
+            raise HashingPoolBusy()
+        try:
+            future = self._executor.submit(fn, *args)
+        except Exception:
+            self._slots.release()
+            raise
+        future.add_done_callback(lambda _: self._slots.release())
+        return future
+
+    def run(self, fn, *args, timeout=None):
+        return self.submit(fn, *args).result(timeout=timeout)
+
+
+_pool = None
+_pool_lock = threading.Lock()
+
+
+def get_hashing_pool():
+    global _pool
+    if _pool is None:
+        with _pool_lock:
+            if _pool is None:
+                workers = getattr(settings, 'PASSWORD_HASHING_WORKERS', None) or os.cpu_count() or 1
+                _pool = HashingPool(
+                    workers,
+                    getattr(settings, 'PASSWORD_HASHING_MAX_PENDING', workers * 4),
+                    getattr(settings, 'PASSWORD_HASHING_ACQUIRE_TIMEOUT', 1.0),
+                )
+    return _pool
+
+
+def _verify(password, encoded):
+    needs_rehash = []
+    valid = check_password(password, encoded, setter=lambda raw: needs_rehash.append(True))
+    new_encoded = make_password(password) if valid and needs_rehash else None
+    return valid, new_encoded
+
+
+def verify_password(password, encoded):
+    """
+    Verifica a password no pool de hashing.
+    Devolve (válida, novo_hash); novo_hash só é diferente de None quando o hash
+    guardado usa um algoritmo/custo antigo e deve ser substituído.
+    """
+    return get_hashing_pool().run(
+        _verify, password, encoded,
+        timeout=getattr(settings, 'PASSWORD_HASHING_TIMEOUT', 30),
+    )
+
+
+def hash_password(password):
+    """make_password no pool de hashing, com o hasher preferido"""
+    return get_hashing_pool().run(
+        make_password, password,
+        timeout=getattr(settings, 'PASSWORD_HASHING_TIMEOUT', 30),
+    )
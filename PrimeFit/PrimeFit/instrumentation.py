@@ -0,0 +1,203 @@
+import hashlib
+import json
+import logging
+import random
+import re
+import threading
+import time
+from contextlib import ExitStack
+
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction, sync_to_async
+from django.conf import settings
+from django.db import connections
+
+slow_logger = logging.getLogger('PrimeFit.slow_requests')
+
+_STRING_LITERAL = re.compile(r"'(?:[^']|'')*'")
+_NUMBER_LITERAL = re.compile(r'\b\d+(?:\.\d+)?\b')
+_PLACEHOLDER_LIST = re.compile(r'\((?:\s*(?:%s|\?)\s*,)+\s*(?:%s|\?)\s*\)')
+_WHITESPACE = re.compile(r'\s+')
+
+
+def fingerprint_sql(sql):
+    """Normaliza uma query: literais -> ?, listas IN (...) colapsadas, espaços únicos"""
+    sql = _STRING_LITERAL.sub('?', sql)
+    sql = _NUMBER_LITERAL.sub('?', sql)
+    sql = _PLACEHOLDER_LIST.sub('(...)', sql)
+    return _WHITESPACE.sub(' ', sql).strip()
+
+
+def fingerprint_params(params):
+    """Hash curto dos parâmetros: permite agrupar repetições sem registar dados pessoais"""
+    if not params:
+        return None
+    return hashlib.sha1(repr(params).encode()).hexdigest()[:12]
+
+
+class QueryRecorder:
+    """execute_wrapper que conta as queries de um pedido e guarda a mais lenta"""
+
+    def __init__(self):
+        self.count = 0
+        self.total = 0.0
+        self.slowest = None
+        self.slowest_time = 0.0
+
+    def __call__(self, execute, sql, params, many, context):
+        started = time.perf_counter()
+        try:
+            return execute(sql, params, many, context)
+        finally:
+            elapsed = time.perf_counter() - started
+            self.count += 1
+            self.total += elapsed
+            if elapsed > self.slowest_time:
+                self.slowest_time = elapsed
+                self.slowest = (sql, params)
+
+
+class RequestMetrics:
+    """Agregados por view deste processo, expostos em /metrics/"""
+
+    FIELDS = ('requests', 'seconds', 'sampled', 'queries', 'db_seconds', 'render_seconds', 'slow')
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._views = {}
+
+    def add(self, view, **values):
+        with self._lock:
+            stats = self._views.setdefault(view, dict.fromkeys(self.FIELDS, 0))
+            for key, value in values.items():
+                stats[key] += value
+
+    def snapshot(self):
+        with self._lock:
+            return {view: dict(stats) for view, stats in self._views.items()}
+
+    def render_prometheus(self):
+        descriptions = {
+            'requests': ('primefit_requests_total', 'counter', 'Pedidos atendidos'),
+            'seconds': ('primefit_request_seconds_total', 'counter', 'Tempo total dos pedidos'),
+            'sampled': ('primefit_sampled_requests_total', 'counter', 'Pedidos com queries instrumentadas'),
+            'queries': ('primefit_db_queries_total', 'counter', 'Queries nos pedidos amostrados'),
+            'db_seconds': ('primefit_db_seconds_total', 'counter', 'Tempo de BD nos pedidos amostrados'),
+            'render_seconds': ('primefit_render_seconds_total', 'counter', 'Tempo de render nos pedidos amostrados'),
+            'slow': ('primefit_slow_requests_total', 'counter', 'Pedidos acima do limite de lentidão'),
+        }
+        snapshot = self.snapshot()
+        lines = []
+        for field in self.FIELDS:
+            name, kind, description = descriptions[field]
+            lines.append(f'# HELP {name} {description}')
+            lines.append(f'# TYPE {name} {kind}')
+            for view, stats in sorted(snapshot.items()):
+                lines.append(f'{name}{{view="{view}"}} {stats[field]}')
+        return '\n'.join(lines) + '\n'
+
+
+request_metrics = RequestMetrics()
+
+
+def render_timer(request):
+    """
+    Context processor: marca o início do render do template. As views fazem
+    render() como último passo, logo o tempo até ao fim do pedido é o render.
+    """
+    request._render_started = time.perf_counter()
+    return {}
+
+
+class InstrumentationMiddleware:
+    """
+    Mede cada pedido: view, número de queries, tempo de BD, query mais lenta
+    (SQL normalizado + hash dos parâmetros) e tempo de render. Só uma fração
+    (INSTRUMENTATION_SAMPLE_RATE) dos pedidos tem as queries instrumentadas;
+    os restantes apenas contam pedidos e duração. Pedidos acima de
+    SLOW_REQUEST_THRESHOLD_MS vão para o log 'PrimeFit.slow_requests'.
+
+    Funciona em WSGI e em ASGI sem adaptação: sob ASGI as ligações do Django
+    vivem na thread síncrona do pedido (thread_sensitive), por isso é lá que o
+    registo das queries é instalado. As queries do async_db (psycopg) não são
+    contadas.
+    """
+
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        self.sample_rate = getattr(settings, 'INSTRUMENTATION_SAMPLE_RATE', 1.0)
+        self.slow_threshold = getattr(settings, 'SLOW_REQUEST_THRESHOLD_MS', 500) / 1000
+        if iscoroutinefunction(self.get_response):
+            markcoroutinefunction(self)
+
+    def __call__(self, request):
+        if iscoroutinefunction(self):
+            return self.__acall__(request)
+
+        sampled = random.random() < self.sample_rate
+        recorder = QueryRecorder() if sampled else None
+        started = time.perf_counter()
+
+        with ExitStack() as stack:
+            if recorder is not None:
+                self.install(stack, recorder)
+            response = self.get_response(request)
+
+        self.record(request, response, recorder, started)
+        return response
+
+    async def __acall__(self, request):
+        sampled = random.random() < self.sample_rate
+        recorder = QueryRecorder() if sampled else None
+        started = time.perf_counter()
+
+        stack = ExitStack()
+        if recorder is not None:
+            await sync_to_async(self.install, thread_sensitive=True)(stack, recorder)
+        try:
+            response = await self.get_response(request)
+        finally:
+            await sync_to_async(stack.close, thread_sensitive=True)()
+
+        self.record(request, response, recorder, started)
+        return response
+
+    def install(self, stack, recorder):
+        for alias in connections:
+            stack.enter_context(connections[alias].execute_wrapper(recorder))
+
+    def record(self, request, response, recorder, started):
+        finished = time.perf_counter()
+        elapsed = finished - started
+        match = getattr(request, 'resolver_match', None)
+        view = match.view_name if match else 'unresolved'
+        render_started = getattr(request, '_render_started', None)
+        render = finished - render_started if render_started else 0.0
+        slow = elapsed >= self.slow_threshold
+
+        values = {'requests': 1, 'seconds': elapsed, 'slow': int(slow)}
+        if recorder is not None:
+            values.update(sampled=1, queries=recorder.count, db_seconds=recorder.total, render_seconds=render)
+        request_metrics.add(view, **values)
+
+        if slow:
+            entry = {
+                'view': view,
+                'method': request.method,
+                'path': request.path,
+                'status': response.status_code,
+                'total_ms': round(elapsed * 1000, 1),
+                'render_ms': round(render * 1000, 1),
+            }
+            if recorder is not None:
+                entry.update(queries=recorder.count, db_ms=round(recorder.total * 1000, 1))
+                if recorder.slowest:
+                    sql, params = recorder.slowest
+                    entry['slowest_query'] = {
+                        'sql': fingerprint_sql(sql),
+                        'params': fingerprint_params(params),
+                        'ms': round(recorder.slowest_time * 1000, 1),
+                    }
+            slow_logger.warning(json.dumps(entry, default=str))
@@ -0,0 +1,150 @@
+import atexit
+import logging
+import threading
+
+from django.conf import settings
+from django.db import connections
+from django.utils import timezone
+
+logger = logging.getLogger(__name__)
+
+
+class LastLoginBuffer:
+    """
+    Buffer write-behind para users.last_login.
+
+    O login apenas regista o timestamp em memória; uma thread de fundo grava
+    todos os pendentes com um único UPDATE ... FROM (VALUES ...) a cada
+    `interval` segundos, ou mais cedo quando há `max_entries` pendentes.
+    Ao terminar o processo (atexit) é feito um último flush.
+
+    Com a base de dados em baixo o buffer não cresce sem limite: guarda no
+    máximo `max_pending` utilizadores (os logins de novos utilizadores são
+    descartados), cada timestamp é descartado depois de `max_attempts`
+    flushes falhados e o intervalo entre tentativas duplica a cada falha.
+    """
+
+    def __init__(self, interval=5.0, max_entries=500, max_pending=10000, max_attempts=5, using='default'):
+        self.interval = interval
+        self.max_entries = max_entries
+        self.max_pending = max_pending
+        self.max_attempts = max_attempts
+        self.using = using
+        self.dropped = 0
+        self._pending = {}
+        self._attempts = {}
+        self._failures = 0
+        self._lock = threading.Lock()
+        self._wakeup = threading.Event()
+        self._stopped = threading.Event()
+        self._thread = None
+
+    def record(self, userid, when=None):
+        when = when or timezone.now()
+        with self._lock:
+            previous = self._pending.get(userid)
+            if previous is None and len(self._pending) >= self.max_pending:
+                self.dropped += 1
+                if self.dropped == 1 or self.dropped % 1000 == 0:
+                    logger.warning(f"last_login buffer full ({self.max_pending}): {self.dropped} logins dropped")
+                return
+            if previous is None or when > previous:
+                self._pending[userid] = when
+            pending = len(self._pending)
+        self._ensure_started()
+        # Com flushes a falhar espera-se pelo backoff em vez de forçar novas tentativas
+        if pending >= self.max_entries and not self._failures:
+            self._wakeup.set()
+
+    def _ensure_started(self):
+        if self._thread is not None:
+            return
+        with self._lock:
+            if self._thread is None:
+                self._thread = threading.Thread(
+                    target=self._run, name='last-login-flusher', daemon=True
+                )
+                self._thread.start()
+                atexit.register(self.stop)
+
+    def _run(self):
+        while not self._stopped.is_set():
+            self._wakeup.wait(self.interval * 2 ** min(self._failures, 6))
+            self._wakeup.clear()
+            self.flush()
+        connections[self.using].close()
+
+    def flush(self):
+        """Grava os timestamps pendentes; devolve o número de utilizadores escritos"""
+        with self._lock:
+            batch, self._pending = self._pending, {}
+        if not batch:
+            return 0
+
+        # Ordenado por userid para que workers concorrentes bloqueiem as
+        # linhas sempre pela mesma ordem
+        rows = sorted(batch.items())
+        values = ', '.join(['(%s, %s::timestamptz)'] * len(rows))
+        params = [value for row in rows for value in row]
+        try:
+            connection = connections[self.using]
+            connection.close_if_unusable_or_obsolete()
+            with connection.cursor() as cursor:
+                cursor.execute(f"""
+                    UPDATE users u
+                    SET last_login = v.logged_at
+                    FROM (VALUES {values}) AS v(userid, logged_at)
+                    WHERE u.userid = v.userid
+                        AND (u.last_login IS NULL OR u.last_login < v.logged_at)
+                """, params)
+        except Exception as e:
+            self._failures += 1
+            # Devolve ao buffer para a próxima tentativa sem perder logins mais
+            # recentes, exceto os que já falharam max_attempts vezes
+            expired = 0
+            with self._lock:
+                for userid, when in batch.items():
+                    attempts = self._attempts.get(userid, 0) + 1
+                    current = self._pending.get(userid)
+                    if attempts >= self.max_attempts or (current is None and len(self._pending) >= self.max_pending):
+                        self._attempts.pop(userid, None)
+                        expired += 1
+                        continue
+                    self._attempts[userid] = attempts
+                    if current is None or when > current:
+                        self._pending[userid] = when
+                self.dropped += expired
+            logger.error(
+                f"Failed to flush {len(rows)} last_login updates (attempt {self._failures}, "
+                f"{expired} dropped): {e}"
+            )
+            return 0
+        self._failures = 0
+        with self._lock:
+            for userid in batch:
+                self._attempts.pop(userid, None)
+        return len(rows)
+
+    def stop(self):
+        self._stopped.set()
+        self._wakeup.set()
+        if self._thread is not None and self._thread is not threading.current_thread():
+            self._thread.join(timeout=self.interval + 5)
+        self.flush()
+
+
+last_login_buffer = LastLoginBuffer(
+    interval=getattr(settings, 'LAST_LOGIN_FLUSH_INTERVAL', 5.0),
+    max_entries=getattr(settings, 'LAST_LOGIN_FLUSH_MAX_ENTRIES', 500),
+    max_pending=getattr(settings, 'LAST_LOGIN_MAX_PENDING', 10000),
+    max_attempts=getattr(settings, 'LAST_LOGIN_FLUSH_MAX_ATTEMPTS', 5),
+)
+
+
+def update_last_login(userid):
+    """Regista o login: em buffer (write-behind) ou de forma síncrona"""
+    if getattr(settings, 'LAST_LOGIN_WRITE_BEHIND', True):
+        last_login_buffer.record(userid)
+        return
+    with connections['default'].cursor() as cursor:
+        cursor.execute("CALL sp_update_last_login(%s)", [userid])
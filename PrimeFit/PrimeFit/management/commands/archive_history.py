@@ -0,0 +1,54 @@
+import time
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+
+from PrimeFit.archive import ARCHIVE_KINDS, ArchiveUnavailable, aggregate_totals, archive_history, retention_cutoff
+
+
+class Command(BaseCommand):
+    help = (
+        'Move check-ins e reservas mais antigos que a retenção do PostgreSQL para o MongoDB, '
+        'em documentos por membro e mês. Pode ser interrompido e repetido sem duplicar dados'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--retention-months', type=int, default=settings.ARCHIVE_RETENTION_MONTHS)
+        parser.add_argument('--only', choices=list(ARCHIVE_KINDS), help='Arquivar só este tipo de histórico')
+        parser.add_argument('--members-per-batch', type=int, default=500,
+                            help='Membros lidos do PostgreSQL por lote')
+        parser.add_argument('--chunk-size', type=int, default=1000,
+                            help='Documentos por insert_many (e por DELETE no PostgreSQL)')
+
+    def handle(self, *args, **options):
+        cutoff = retention_cutoff(options['retention_months'])
+        kinds = [options['only']] if options['only'] else list(ARCHIVE_KINDS)
+        self.stdout.write(f'A arquivar histórico anterior a {cutoff}')
+        totals_before = aggregate_totals(cutoff)
+
+        for kind in kinds:
+            started = time.perf_counter()
+            try:
+                moved = archive_history(
+                    kind, cutoff,
+                    members_per_batch=options['members_per_batch'],
+                    chunk_size=options['chunk_size'],
+                    progress=self.progress,
+                )
+            except ArchiveUnavailable:
+                raise CommandError('MongoDB indisponível; nada mais foi apagado do PostgreSQL')
+            elapsed = time.perf_counter() - started
+            self.stdout.write(self.style.SUCCESS(f'{kind}: {moved} linhas arquivadas em {elapsed:.1f}s'))
+
+        # Os contadores e rollups dos meses arquivados têm de ficar iguais
+        totals_after = aggregate_totals(cutoff)
+        changed = [name for name in totals_before if totals_before[name] != totals_after[name]]
+        if changed:
+            raise CommandError(
+                'O arquivo alterou os agregados: '
+                + ', '.join(f'{name} {totals_before[name]} -> {totals_after[name]}' for name in changed)
+            )
+        self.stdout.write(self.style.SUCCESS('Agregados inalterados'))
+
+    def progress(self, kind, last_memberid, total):
+        self.stdout.write(f'{kind}: até ao membro {last_memberid}, {total} linhas')
@@ -0,0 +1,93 @@
+from datetime import date
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection, transaction
+
+from PrimeFit.archive import rebuild_cutoff
+
+
+class Command(BaseCommand):
+    help = 'Reconstrói a tabela member_month_stats a partir de checkin e classbooking, mês a mês'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--from', dest='month_from',
+            help='Primeiro mês a reconstruir (YYYY-MM). Por omissão, o mês mais antigo com dados',
+        )
+        parser.add_argument(
+            '--to', dest='month_to',
+            help='Último mês a reconstruir (YYYY-MM). Por omissão, o mês atual',
+        )
+
+    def parse_month(self, value):
+        try:
+            year, month = value.split('-')
+            return date(int(year), int(month), 1)
+        except ValueError:
+            raise CommandError(f'Mês inválido: {value} (formato YYYY-MM)')
+
+    def handle(self, *args, **options):
+        today = date.today()
+        month_to = self.parse_month(options['month_to']) if options['month_to'] else today.replace(day=1)
+
+        if options['month_from']:
+            month_from = self.parse_month(options['month_from'])
+        else:
+            with connection.cursor() as cursor:
+                cursor.execute("""
+                    SELECT LEAST(
+                        (SELECT MIN(date) FROM checkin),
+                        (SELECT MIN(bookingdate)::date FROM classbooking)
+                    )
+                """)
+                oldest = cursor.fetchone()[0]
+            if oldest is None:
+                self.stdout.write('Sem dados para reconstruir.')
+                return
+            month_from = oldest.replace(day=1)
+
+        # Os meses arquivados no MongoDB já não estão em checkin/classbooking:
+        # recalculá-los apagaria o histórico
+        cutoff = rebuild_cutoff()
+        if month_from < cutoff:
+            self.stdout.write(self.style.WARNING(
+                f'Meses anteriores a {cutoff:%Y-%m} estão arquivados e não são reconstruídos'
+            ))
+            month_from = cutoff
+
+        if month_from > month_to:
+            raise CommandError('--from tem de ser anterior ou igual a --to')
+
+        month = month_from
+        while month <= month_to:
+            rows = self.rebuild_month(month)
+            self.stdout.write(f'{month:%Y-%m}: {rows} membros')
+            month = date(month.year + month.month // 12, month.month % 12 + 1, 1)
+
+        self.stdout.write(self.style.SUCCESS('member_month_stats reconstruída.'))
+
+    def rebuild_month(self, month):
+        # Cada mês numa transação própria; o lock impede que os triggers
+        # apliquem deltas enquanto o mês está a ser recalculado
+        with transaction.atomic(), connection.cursor() as cursor:
+            cursor.execute("LOCK TABLE checkin, classbooking IN SHARE MODE")
+            cursor.execute("DELETE FROM member_month_stats WHERE month = %s", [month])
+            cursor.execute("""
+                INSERT INTO member_month_stats (memberid, month, checkin_count, class_bookings, total_hours)
+                SELECT COALESCE(c.memberid, b.memberid), %(month)s,
+                       COALESCE(c.checkin_count, 0), COALESCE(b.class_bookings, 0), COALESCE(c.total_hours, 0)
+                FROM (
+                    SELECT memberid, COUNT(*) AS checkin_count,
+                           SUM(fn_checkin_hours(entrancetime, exittime)) AS total_hours
+                    FROM checkin
+                    WHERE date >= %(month)s AND date < %(month)s::date + INTERVAL '1 month'
+                    GROUP BY memberid
+                ) c
+                FULL OUTER JOIN (
+                    SELECT memberid, COUNT(*) AS class_bookings
+                    FROM classbooking
+                    WHERE bookingdate >= %(month)s AND bookingdate < %(month)s::date + INTERVAL '1 month'
+                    GROUP BY memberid
+                ) b ON b.memberid = c.memberid
+            """, {'month': month})
+            return cursor.rowcount
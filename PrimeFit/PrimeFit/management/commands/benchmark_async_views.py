@@ -0,0 +1,101 @@
+import asyncio
+import threading
+import time
+from collections import Counter
+
+from django.conf import settings
+from django.core.management.base import BaseCommand
+from django.db import connections
+from django.test import AsyncClient
+from django.test.utils import override_settings
+
+from PrimeFit.async_db import async_db
+from PrimeFit.benchmarking import summarize_latencies, format_summary
+from .benchmark_urls import Command as BenchmarkUrls
+
+# (perfil, rota WSGI síncrona, rota da versão assíncrona)
+PAGES = [
+    ('membro', '/member/home/', '/async/member/home/'),
+    ('membro', '/member/account/', '/async/member/account/'),
+    ('gestor', '/manager/dashboard/', '/async/manager/dashboard/'),
+]
+
+
+class Command(BaseCommand):
+    help = (
+        'Compara as páginas mais lidas na versão síncrona (WSGI, uma thread por pedido) com a '
+        'versão assíncrona (ASGI, queries em paralelo no pool assíncrono), a vários níveis de concorrência'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--requests', type=int, default=50, help='Pedidos por cliente concorrente')
+        parser.add_argument('--concurrency', type=int, nargs='+', default=[1, 8, 32],
+                            help='Clientes em simultâneo (threads no WSGI, tasks no ASGI)')
+        parser.add_argument('--password', default='primefit123', help='Password dos utilizadores de teste')
+
+    def handle(self, *args, **options):
+        with override_settings(ALLOWED_HOSTS=list(settings.ALLOWED_HOSTS) + ['testserver']):
+            sessions = {}
+            for role in {page[0] for page in PAGES}:
+                sessions[role] = BenchmarkUrls().login(role, options['password'])
+
+            for role, sync_path, async_path in PAGES:
+                for concurrency in options['concurrency']:
+                    self.report('wsgi', sync_path, concurrency,
+                                *self.run_wsgi(sessions[role], sync_path, concurrency, options['requests']))
+                    self.report('asgi', async_path, concurrency,
+                                *asyncio.run(self.run_asgi(sessions[role], async_path, concurrency, options['requests'])))
+
+    def run_wsgi(self, client, path, concurrency, count):
+        latencies = []
+        statuses = Counter()
+        lock = threading.Lock()
+
+        def worker():
+            for _ in range(count):
+                t0 = time.perf_counter()
+                response = client.get(path)
+                elapsed = time.perf_counter() - t0
+                with lock:
+                    latencies.append(elapsed)
+                    statuses[response.status_code] += 1
+            connections.close_all()
+
+        client.get(path)
+        threads = [threading.Thread(target=worker) for _ in range(concurrency)]
+        started = time.perf_counter()
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        return latencies, statuses, time.perf_counter() - started
+
+    async def run_asgi(self, session, path, concurrency, count):
+        client = AsyncClient()
+        client.cookies = session.cookies
+        latencies = []
+        statuses = Counter()
+
+        async def worker():
+            for _ in range(count):
+                t0 = time.perf_counter()
+                response = await client.get(path)
+                latencies.append(time.perf_counter() - t0)
+                statuses[response.status_code] += 1
+
+        try:
+            # Aquecimento: abre o pool assíncrono fora da medição
+            await client.get(path)
+            started = time.perf_counter()
+            await asyncio.gather(*(worker() for _ in range(concurrency)))
+            return latencies, statuses, time.perf_counter() - started
+        finally:
+            await async_db.close()
+
+    def report(self, mode, path, concurrency, latencies, statuses, elapsed):
+        throughput = len(latencies) / elapsed if elapsed else 0.0
+        status_text = ' '.join(f'{status}x{n}' for status, n in sorted(statuses.items()))
+        self.stdout.write(
+            f'{mode} c={concurrency:<3} {path:<26} {throughput:8.1f} req/s '
+            f'{format_summary(summarize_latencies(latencies))} [{status_text}]'
+        )
@@ -0,0 +1,59 @@
+import os
+import time
+
+from django.conf import settings
+from django.contrib.auth.hashers import make_password
+from django.core.management.base import BaseCommand
+from django.test.utils import override_settings
+
+from PrimeFit.benchmarking import summarize_latencies, format_summary
+from PrimeFit.hashing import HashingPool, _verify
+
+
+class Command(BaseCommand):
+    help = (
+        'Mede logins/s (verificação de password) por core com o hasher antigo (PBKDF2) '
+        'e com o hasher configurado, em série e através do pool de hashing'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--logins', type=int, default=200, help='Verificações por cenário')
+        parser.add_argument('--workers', type=int, default=settings.PASSWORD_HASHING_WORKERS)
+
+    def handle(self, *args, **options):
+        cores = os.cpu_count() or 1
+        self.stdout.write(f'cores={cores} workers={options["workers"]} logins={options["logins"]}')
+
+        scenarios = [('pbkdf2 (antes)', 'django.contrib.auth.hashers.PBKDF2PasswordHasher')]
+        if settings.PASSWORD_HASHERS[0] != scenarios[0][1]:
+            scenarios.append((f'{settings.PASSWORD_HASHER} (depois)', settings.PASSWORD_HASHERS[0]))
+
+        for label, hasher in scenarios:
+            hashers = [hasher] + [h for h in settings.PASSWORD_HASHERS if h != hasher]
+            with override_settings(PASSWORD_HASHERS=hashers):
+                encoded = make_password('benchmark-password')
+                self.run_scenario(label, encoded, options['logins'], options['workers'], cores)
+
+    def run_scenario(self, label, encoded, logins, workers, cores):
+        latencies = []
+        started = time.perf_counter()
+        for _ in range(logins):
+            t0 = time.perf_counter()
+            _verify('benchmark-password', encoded)
+            latencies.append(time.perf_counter() - t0)
+        serial_rate = logins / (time.perf_counter() - started)
+        self.stdout.write(
+            f'{label} série: {serial_rate:.1f} logins/s (1 core) {format_summary(summarize_latencies(latencies))}'
+        )
+
+        pool = HashingPool(workers, logins, acquire_timeout=None)
+        started = time.perf_counter()
+        futures = [pool.submit(_verify, 'benchmark-password', encoded) for _ in range(logins)]
+        for future in futures:
+            future.result()
+        pool_rate = logins / (time.perf_counter() - started)
+        used_cores = min(workers, cores)
+        self.stdout.write(
+            f'{label} pool: {pool_rate:.1f} logins/s total, {pool_rate / used_cores:.1f} logins/s/core '
+            f'({used_cores} cores)'
+        )
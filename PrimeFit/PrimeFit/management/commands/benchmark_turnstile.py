@@ -0,0 +1,128 @@
+import json
+import threading
+import time
+import uuid
+from collections import Counter
+from datetime import datetime, timedelta
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection, connections
+from django.test import Client
+from django.test.utils import override_settings
+
+from PrimeFit.benchmarking import summarize_latencies, format_summary
+
+BENCHMARK_TOKEN = 'turnstile-benchmark'
+
+
+class Command(BaseCommand):
+    help = (
+        'Envia rajadas de eventos de entrada/saída para /api/turnstile/events/ a partir de vários '
+        'torniquetes simulados e mede eventos/s sustentados e a latência ponta a ponta por pedido'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--devices', type=int, default=8, help='Torniquetes simulados (threads)')
+        parser.add_argument('--requests', type=int, default=200, help='Pedidos por torniquete')
+        parser.add_argument('--batch-size', type=int, default=10, help='Eventos por pedido')
+        parser.add_argument('--members', type=int, default=1000, help='Membros ativos a usar')
+        parser.add_argument('--direct', action='store_true', help='Sem group commit (um lote por pedido)')
+        parser.add_argument('--keep', action='store_true', help='Não apagar os check-ins e eventos criados')
+
+    def handle(self, *args, **options):
+        with connection.cursor() as cursor:
+            cursor.execute("SELECT memberid FROM member WHERE isactive = true ORDER BY memberid LIMIT %s",
+                           [options['members']])
+            memberids = [row[0] for row in cursor.fetchall()]
+        if len(memberids) < options['devices']:
+            raise CommandError('Membros ativos insuficientes; gere dados com generate_synthetic_data')
+
+        run = f'bench-{uuid.uuid4().hex[:8]}'
+        overrides = {
+            'ALLOWED_HOSTS': list(settings.ALLOWED_HOSTS) + ['testserver'],
+            'TURNSTILE_API_TOKENS': [BENCHMARK_TOKEN],
+            'TURNSTILE_GROUP_COMMIT': not options['direct'],
+        }
+        latencies = []
+        statuses = Counter()
+        errors = []
+        lock = threading.Lock()
+        # Relógio virtual: 1 ms por evento a partir da meia-noite de hoje,
+        # para que cada saída seja sempre posterior à entrada do mesmo membro
+        clock = iter(range(10 ** 9))
+        midnight = datetime.combine(datetime.now().date(), datetime.min.time())
+
+        def device(index):
+            # Cada torniquete usa uma fatia disjunta de membros: entra e depois sai
+            members = memberids[index::options['devices']]
+            inside = []
+            client = Client()
+            for _ in range(options['requests']):
+                events = []
+                for _ in range(options['batch_size']):
+                    with lock:
+                        tick = next(clock)
+                    if inside and (len(inside) == len(members) or tick % 2):
+                        memberid, direction = inside.pop(0), 'out'
+                    else:
+                        memberid = members[(tick // 2) % len(members)]
+                        if memberid in inside:
+                            continue
+                        inside.append(memberid)
+                        direction = 'in'
+                    events.append({
+                        'event_id': f'{run}-{tick}',
+                        'member_id': memberid,
+                        'direction': direction,
+                        'timestamp': (midnight + timedelta(milliseconds=tick + 1)).isoformat(),
+                        'device_id': run,
+                    })
+                if not events:
+                    continue
+                started = time.perf_counter()
+                response = client.post(
+                    '/api/turnstile/events/', json.dumps(events), content_type='application/json',
+                    HTTP_AUTHORIZATION=f'Bearer {BENCHMARK_TOKEN}',
+                )
+                elapsed = time.perf_counter() - started
+                with lock:
+                    latencies.append(elapsed)
+                    if response.status_code == 200:
+                        statuses.update(response.json()['summary'])
+                    else:
+                        errors.append(response.status_code)
+            connections.close_all()
+
+        with override_settings(**overrides):
+            threads = [threading.Thread(target=device, args=(i,)) for i in range(options['devices'])]
+            started = time.perf_counter()
+            for thread in threads:
+                thread.start()
+            for thread in threads:
+                thread.join()
+            elapsed = time.perf_counter() - started
+
+        total = sum(statuses.values())
+        self.stdout.write(
+            f'{"direto" if options["direct"] else "group commit"}: {total} eventos em {elapsed:.1f}s = '
+            f'{total / elapsed:.0f} eventos/s ({len(latencies) / elapsed:.0f} pedidos/s)'
+        )
+        self.stdout.write(f'latência por pedido: {format_summary(summarize_latencies(latencies))}')
+        self.stdout.write(f'estados: {dict(statuses)}' + (f' erros HTTP: {Counter(errors)}' if errors else ''))
+
+        if not options['keep']:
+            self.cleanup(run)
+
+    def cleanup(self, run):
+        with connection.cursor() as cursor:
+            cursor.execute("""
+                DELETE FROM checkin c
+                USING turnstileevent e
+                WHERE e.deviceid = %s AND e.eventtype = 'in'
+                  AND c.memberid = e.memberid AND c.date = e.eventtime::date
+                  AND c.entrancetime = e.eventtime::time
+            """, [run])
+            checkins = cursor.rowcount
+            cursor.execute("DELETE FROM turnstileevent WHERE deviceid = %s", [run])
+        self.stdout.write(f'Limpeza: {checkins} check-ins e {cursor.rowcount} eventos apagados')
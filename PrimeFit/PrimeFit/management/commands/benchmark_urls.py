@@ -0,0 +1,136 @@
+import json
+import subprocess
+import time
+from collections import Counter
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection
+from django.test import Client
+from django.test.utils import override_settings
+from django.urls import URLPattern, get_resolver
+
+from PrimeFit.benchmarking import summarize_latencies, format_summary
+
+ROLES = {
+    'anonimo': None,
+    'gestor': 1,
+    'instrutor': 2,
+    'membro': 3,
+}
+EXCLUDED_NAMES = {'logout'}
+
+
+def discover_urls():
+    """Rotas sem parâmetros do urls.py (exceto admin e logout), sem repetidos"""
+    paths = []
+    for pattern in get_resolver().url_patterns:
+        if not isinstance(pattern, URLPattern) or pattern.name in EXCLUDED_NAMES:
+            continue
+        if pattern.pattern.converters or pattern.pattern.regex.groups:
+            continue
+        path = '/' + str(pattern.pattern)
+        if path not in paths:
+            paths.append(path)
+    return paths
+
+
+def git_revision():
+    try:
+        return subprocess.run(
+            ['git', 'rev-parse', '--short', 'HEAD'], capture_output=True, text=True, check=True,
+            cwd=settings.BASE_DIR,
+        ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+class Command(BaseCommand):
+    help = (
+        'Percorre cada URL do urls.py com cada perfil (anónimo, gestor, instrutor, membro) '
+        'e mede pedidos/s e latência p50/p95/p99, para comparar entre commits'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--requests', type=int, default=50, help='Pedidos medidos por URL e perfil')
+        parser.add_argument('--warmup', type=int, default=5, help='Pedidos de aquecimento (não medidos)')
+        parser.add_argument('--roles', nargs='+', choices=list(ROLES), default=list(ROLES))
+        parser.add_argument('--urls', nargs='+', help='Limitar a estes caminhos (ex: /manager/members/)')
+        parser.add_argument('--password', default='primefit123', help='Password dos utilizadores de teste')
+        parser.add_argument('--json', dest='json_path', help='Gravar os resultados em JSON neste ficheiro')
+
+    def handle(self, *args, **options):
+        paths = options['urls'] or discover_urls()
+        results = []
+
+        # O Client usa o host 'testserver'
+        with override_settings(ALLOWED_HOSTS=list(settings.ALLOWED_HOSTS) + ['testserver']):
+            for role in options['roles']:
+                client = self.login(role, options['password'])
+                for path in paths:
+                    results.append(self.measure(client, role, path, options['requests'], options['warmup']))
+
+        if options['json_path']:
+            with open(options['json_path'], 'w', encoding='utf-8') as output:
+                json.dump({
+                    'revision': git_revision(),
+                    'started_at': time.strftime('%Y-%m-%dT%H:%M:%S'),
+                    'requests_per_url': options['requests'],
+                    'results': results,
+                }, output, indent=2)
+            self.stdout.write(self.style.SUCCESS(f'Resultados gravados em {options["json_path"]}'))
+
+    def login(self, role, password):
+        client = Client()
+        usertypeid = ROLES[role]
+        if usertypeid is None:
+            return client
+
+        with connection.cursor() as cursor:
+            cursor.execute("""
+                SELECT u.email
+                FROM users u
+                LEFT JOIN member m ON m.userid = u.userid
+                LEFT JOIN instructor i ON i.userid = u.userid
+                WHERE u.usertypeid = %s AND u.isactive = true
+                  AND (u.usertypeid <> 3 OR m.memberid IS NOT NULL)
+                  AND (u.usertypeid <> 2 OR i.instructorid IS NOT NULL)
+                ORDER BY u.userid
+                LIMIT 1
+            """, [usertypeid])
+            row = cursor.fetchone()
+        if row is None:
+            raise CommandError(f'Nenhum utilizador ativo com o perfil {role}; gere dados com generate_synthetic_data')
+
+        response = client.post('/login/', {'email': row[0], 'password': password})
+        if response.status_code != 302:
+            raise CommandError(f'Login falhou para {row[0]} (perfil {role}, HTTP {response.status_code})')
+        return client
+
+    def measure(self, client, role, path, count, warmup):
+        for _ in range(warmup):
+            client.get(path)
+
+        latencies = []
+        statuses = Counter()
+        started = time.perf_counter()
+        for _ in range(count):
+            t0 = time.perf_counter()
+            response = client.get(path)
+            latencies.append(time.perf_counter() - t0)
+            statuses[response.status_code] += 1
+        elapsed = time.perf_counter() - started
+
+        summary = summarize_latencies(latencies)
+        throughput = count / elapsed if elapsed else 0.0
+        status_text = ' '.join(f'{status}x{n}' for status, n in sorted(statuses.items()))
+        self.stdout.write(
+            f'{role:<10} {path:<28} {throughput:8.1f} req/s {format_summary(summary)} [{status_text}]'
+        )
+        return {
+            'role': role,
+            'path': path,
+            'requests_per_second': round(throughput, 2),
+            'statuses': {str(status): n for status, n in statuses.items()},
+            **summary,
+        }
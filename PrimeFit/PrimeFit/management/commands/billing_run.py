@@ -0,0 +1,89 @@
+import multiprocessing
+import time
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from datetime import date, datetime, timedelta
+
+from django.core.management.base import BaseCommand, CommandError
+
+from PrimeFit.billing import billing_period, bill_chunk, ensure_billing_partition, mark_overdue, subscription_chunks
+from PrimeFit.db_router import close_connections_for_fork
+
+
+def next_month():
+    today = date.today()
+    return date(today.year + today.month // 12, today.month % 12 + 1, 1)
+
+
+def _bill_chunk_worker(args):
+    # Corre num processo filho: cada processo abre a sua própria ligação
+    started = time.perf_counter()
+    created = bill_chunk(*args)
+    return args[0], args[1], created, time.perf_counter() - started
+
+
+class Command(BaseCommand):
+    help = (
+        'Gera os pagamentos do próximo ciclo de todas as subscrições ativas com INSERT ... SELECT '
+        'por intervalos de subscriptionid (em paralelo) e depois marca, num só UPDATE, os pagamentos em atraso. '
+        'Pode ser repetido: cada (subscriptionid, duedate) só é faturado uma vez'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--month', help='Mês a faturar (AAAA-MM); por omissão o próximo mês')
+        parser.add_argument('--chunk-size', type=int, default=5000, help='Subscrições por intervalo (transação)')
+        parser.add_argument('--workers', type=int, default=4, help='Processos em paralelo')
+        parser.add_argument('--shard', default='0/1',
+                            help='K/N: esta execução trata um em cada N intervalos (para várias máquinas)')
+        parser.add_argument('--grace-days', type=int, default=0,
+                            help='Dias após o vencimento até um pagamento ficar em atraso')
+
+    def handle(self, *args, **options):
+        try:
+            month = datetime.strptime(options['month'], '%Y-%m').date() if options['month'] else next_month()
+            shard, shards = (int(part) for part in options['shard'].split('/'))
+        except ValueError:
+            raise CommandError('Use --month AAAA-MM e --shard K/N')
+        if not 0 <= shard < shards:
+            raise CommandError('--shard K/N requer 0 <= K < N')
+
+        period_start, period_end = billing_period(month)
+        overdue_before = date.today() - timedelta(days=options['grace_days'])
+        ensure_billing_partition(period_start)
+        chunks = subscription_chunks(options['chunk_size'], shard, shards)
+        self.stdout.write(
+            f'A faturar {period_start:%Y-%m}: {len(chunks)} intervalos de {options["chunk_size"]} subscrições, '
+            f'{options["workers"]} processos (shard {shard}/{shards})'
+        )
+
+        tasks = [(first_id, last_id, period_start, period_end) for first_id, last_id in chunks]
+        total_created = 0
+        started = time.perf_counter()
+        if options['workers'] <= 1:
+            results = map(_bill_chunk_worker, tasks)
+            for result in results:
+                total_created = self.report(result, total_created)
+        else:
+            # As ligações (e os pools) abertos não podem ser herdados pelos processos filhos
+            close_connections_for_fork()
+            context = multiprocessing.get_context('fork')
+            with ProcessPoolExecutor(max_workers=options['workers'], mp_context=context) as executor:
+                futures = [executor.submit(_bill_chunk_worker, task) for task in tasks]
+                for future in as_completed(futures):
+                    total_created = self.report(future.result(), total_created)
+        # Os atrasos não dependem dos intervalos de subscrições: só o shard 0 os marca
+        total_overdue = mark_overdue(overdue_before) if shard == 0 else 0
+        elapsed = time.perf_counter() - started
+
+        rate = total_created / elapsed if elapsed else 0.0
+        self.stdout.write(self.style.SUCCESS(
+            f'{total_created} pagamentos criados e {total_overdue} marcados em atraso em {elapsed:.1f}s '
+            f'({rate:.0f} linhas/s)'
+        ))
+
+    def report(self, result, total_created):
+        first_id, last_id, created, elapsed = result
+        rate = created / elapsed if elapsed else 0.0
+        self.stdout.write(
+            f'  subscrições [{first_id}, {last_id}): {created} criados, {elapsed:.2f}s ({rate:.0f} linhas/s)'
+        )
+        return total_created + created
@@ -0,0 +1,225 @@
+import json
+import re
+
+from django.core.management import call_command
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection
+
+from PrimeFit.models import (
+    MemberStatsMonth, MemberScheduleClasses, MemberAccountDetails, MemberPaymentHistory,
+    MemberCheckinHistory, InstructorInfo, InstructorClasses, ClassSchedules, DashboardStats,
+    AllMembers, AllClasses, AllCheckins, Machines, Payments,
+)
+from PrimeFit.member_search import SEARCH_SQL as MEMBER_SEARCH_SQL, search_params
+from PrimeFit.pagination import DEFAULT_PAGE_SIZE
+from PrimeFit.views import MEMBER_AVAILABLE_CLASSES_SQL
+
+# Tabelas que crescem com o histórico: numa consulta de um só membro nunca
+# devem ser lidas com Seq Scan
+PER_MEMBER_TABLES = {'checkin', 'payment', 'classbooking'}
+
+
+def queryset_sql(queryset):
+    sql, params = queryset.query.sql_with_params()
+    return sql, list(params)
+
+
+# (nome, função(ids) -> (sql, params), tabelas proibidas em Seq Scan, orçamento de buffers)
+# As queries são as mesmas que as views de views.py executam.
+PLAN_CHECKS = [
+    ('member_home.stats', lambda ids: queryset_sql(
+        MemberStatsMonth.objects.filter(memberid=ids['member'])[:1]), PER_MEMBER_TABLES, 100),
+    ('member_home.schedule_classes', lambda ids: queryset_sql(
+        MemberScheduleClasses.objects.filter(memberid=ids['member']).values(
+            'class_name', 'date', 'starttime', 'endtime', 'room', 'instructor_name')),
+        PER_MEMBER_TABLES, 1500),
+    ('member_home.available_classes', lambda ids: (MEMBER_AVAILABLE_CLASSES_SQL, [ids['member']]),
+        PER_MEMBER_TABLES, 1000),
+    ('member_account.details', lambda ids: queryset_sql(
+        MemberAccountDetails.objects.filter(memberid=ids['member'])[:1]), PER_MEMBER_TABLES, 100),
+    ('member_account.payment_history', lambda ids: queryset_sql(
+        MemberPaymentHistory.objects.filter(memberid=ids['member']).order_by('-payment_date')[:10]),
+        PER_MEMBER_TABLES, 200),
+    ('member_account.checkin_history', lambda ids: queryset_sql(
+        MemberCheckinHistory.objects.filter(memberid=ids['member']).order_by(
+            '-checkin_date', '-entrancetime')[:15]),
+        PER_MEMBER_TABLES, 50),
+    ('instructor_account.info', lambda ids: queryset_sql(
+        InstructorInfo.objects.filter(instructorid=ids['instructor'])[:1]), set(), 100),
+    ('instructor_account.classes', lambda ids: queryset_sql(
+        InstructorClasses.objects.filter(instructorid=ids['instructor']).values(
+            'classid', 'name', 'room', 'capacity', 'duration_minutes')), set(), 200),
+    ('instructor_classes.schedules', lambda ids: queryset_sql(
+        ClassSchedules.objects.filter(instructorid=ids['instructor']).order_by('date', 'starttime').values(
+            'classscheduleid', 'name', 'date', 'starttime', 'endtime', 'maxparticipants', 'room')),
+        set(), 2000),
+    ('manager_dashboard.stats', lambda ids: queryset_sql(DashboardStats.objects.all()[:1]),
+        {'member', 'instructor', 'membersubscription', 'checkin'}, 50),
+    ('manager_members.first_page', lambda ids: queryset_sql(
+        AllMembers.objects.order_by('-registrationdate', '-memberid')[:DEFAULT_PAGE_SIZE + 1]), set(), 2000),
+    ('manager_classes.first_page', lambda ids: queryset_sql(
+        AllClasses.objects.order_by('date', 'starttime', 'classscheduleid')[:DEFAULT_PAGE_SIZE + 1]),
+        set(), 2000),
+    ('manager_checkins.latest', lambda ids: queryset_sql(
+        AllCheckins.objects.order_by('-date', '-entrancetime').values(
+            'checkinid', 'name', 'date', 'entrancetime', 'exittime')[:100]),
+        {'checkin'}, 2000),
+    ('manager_machines.first_page', lambda ids: queryset_sql(
+        Machines.objects.order_by('name', 'machineid')[:DEFAULT_PAGE_SIZE + 1]), set(), 500),
+    ('manager_payments.first_page', lambda ids: queryset_sql(
+        Payments.objects.order_by('-duedate', '-paymentid')[:DEFAULT_PAGE_SIZE + 1]), {'payment'}, 2000),
+    ('manager_member_search.name', lambda ids: (MEMBER_SEARCH_SQL, search_params('silva')),
+        {'member', 'users'}, 2000),
+    ('manager_member_search.phone', lambda ids: (MEMBER_SEARCH_SQL, search_params('912')),
+        {'member', 'users'}, 2000),
+]
+
+# Orçamento de latência (Execution Time do EXPLAIN ANALYZE, em ms) das queries
+# interativas: a pesquisa de membros corre a cada tecla
+LATENCY_BUDGETS_MS = {
+    'manager_member_search.name': 50,
+    'manager_member_search.phone': 50,
+}
+
+
+# Partições mensais (checkin_y2025m01) contam como a tabela mãe. As partições
+# DEFAULT ficam de fora: estão vazias (manage_partitions) e o planner lê tabelas
+# vazias com Seq Scan
+PARTITION_SUFFIX = re.compile(r'_y\d{4}m\d{2}$')
+
+
+def base_relation(name):
+    return PARTITION_SUFFIX.sub('', name) if name else name
+
+
+def walk_plan(node):
+    yield node
+    for child in node.get('Plans', []):
+        yield from walk_plan(child)
+
+
+def plan_buffers(node):
+    """Blocos partilhados tocados pela query (os nós pai já incluem os filhos)"""
+    return node.get('Shared Hit Blocks', 0) + node.get('Shared Read Blocks', 0)
+
+
+class Command(BaseCommand):
+    help = (
+        'Corre EXPLAIN (ANALYZE, BUFFERS) nas queries que as views fazem sobre os vw_* e falha '
+        'quando o plano regride: Seq Scan em checkin/payment/classbooking numa consulta por membro '
+        'ou buffers acima do orçamento/baseline e queries interativas acima do orçamento de latência'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--generate-members', type=int,
+            help='APAGA os dados e gera primeiro um dataset sintético com este número de membros',
+        )
+        parser.add_argument('--member', type=int, help='memberid a usar (omissão: o membro com mais check-ins)')
+        parser.add_argument('--instructor', type=int, help='instructorid a usar (omissão: o com mais aulas)')
+        parser.add_argument('--only', nargs='+', help='Correr só estas verificações (nome ou prefixo)')
+        parser.add_argument('--baseline', help='Ficheiro JSON com os buffers de referência por verificação')
+        parser.add_argument(
+            '--tolerance', type=float, default=1.5,
+            help='Fator acima do baseline a partir do qual os buffers contam como regressão',
+        )
+        parser.add_argument(
+            '--max-ms', type=float,
+            help='Orçamento de latência (ms) para todas as verificações, em vez de LATENCY_BUDGETS_MS',
+        )
+        parser.add_argument('--write-baseline', action='store_true', help='Gravar os buffers atuais em --baseline')
+        parser.add_argument('--show-plans', action='store_true', help='Mostrar o plano em texto de cada query')
+
+    def handle(self, *args, **options):
+        if options['generate_members']:
+            call_command('generate_synthetic_data', members=options['generate_members'], truncate=True,
+                         stdout=self.stdout)
+
+        ids = self.sample_ids(options)
+        baseline = {}
+        if options['baseline'] and not options['write_baseline']:
+            with open(options['baseline'], encoding='utf-8') as source:
+                baseline = json.load(source)
+
+        checks = PLAN_CHECKS
+        if options['only']:
+            checks = [check for check in checks if any(check[0].startswith(name) for name in options['only'])]
+
+        results = {}
+        failures = []
+        for name, build, forbidden, budget in checks:
+            sql, params = build(ids)
+            plan, text = self.explain(sql, params, options['show_plans'])
+            buffers = plan_buffers(plan['Plan'])
+            results[name] = buffers
+
+            problems = []
+            seq_scans = sorted({
+                base_relation(node['Relation Name']) for node in walk_plan(plan['Plan'])
+                if node['Node Type'] == 'Seq Scan' and base_relation(node.get('Relation Name')) in forbidden
+            })
+            if seq_scans:
+                problems.append(f'Seq Scan em {", ".join(seq_scans)}')
+            limit = budget
+            if name in baseline:
+                limit = min(budget, max(baseline[name] * options['tolerance'], 1))
+            if buffers > limit:
+                problems.append(f'{buffers} buffers > limite {limit:.0f}')
+            max_ms = options['max_ms'] if options['max_ms'] is not None else LATENCY_BUDGETS_MS.get(name)
+            if max_ms is not None and plan['Execution Time'] > max_ms:
+                problems.append(f'{plan["Execution Time"]:.2f}ms > orçamento {max_ms:.0f}ms')
+
+            status = self.style.ERROR('FALHA') if problems else self.style.SUCCESS('ok')
+            self.stdout.write(
+                f'{status:<5} {name:<36} {plan["Execution Time"]:8.2f}ms {buffers:6d} buffers'
+                + (f'  ({"; ".join(problems)})' if problems else '')
+            )
+            if options['show_plans']:
+                self.stdout.write(text)
+            if problems:
+                failures.append(name)
+
+        if options['write_baseline']:
+            if not options['baseline']:
+                raise CommandError('--write-baseline precisa de --baseline')
+            with open(options['baseline'], 'w', encoding='utf-8') as output:
+                json.dump(results, output, indent=2, sort_keys=True)
+            self.stdout.write(self.style.SUCCESS(f'Baseline gravado em {options["baseline"]}'))
+
+        if failures:
+            raise CommandError(f'{len(failures)} plano(s) regrediram: {", ".join(failures)}')
+
+    def sample_ids(self, options):
+        """Por omissão usa o membro/instrutor com mais dados: o pior caso de cada consulta"""
+        ids = {'member': options['member'], 'instructor': options['instructor']}
+        with connection.cursor() as cursor:
+            if ids['member'] is None:
+                cursor.execute("SELECT memberid FROM checkin GROUP BY memberid ORDER BY COUNT(*) DESC LIMIT 1")
+                row = cursor.fetchone()
+                ids['member'] = row[0] if row else None
+            if ids['instructor'] is None:
+                cursor.execute("""
+                    SELECT c.instructorid
+                    FROM classschedule cs
+                    JOIN class c ON c.classid = cs.classid
+                    GROUP BY c.instructorid
+                    ORDER BY COUNT(*) DESC
+                    LIMIT 1
+                """)
+                row = cursor.fetchone()
+                ids['instructor'] = row[0] if row else None
+        if ids['member'] is None or ids['instructor'] is None:
+            raise CommandError('Sem dados para testar; use --generate-members ou generate_synthetic_data')
+        return ids
+
+    def explain(self, sql, params, with_text):
+        with connection.cursor() as cursor:
+            cursor.execute('EXPLAIN (ANALYZE, BUFFERS, FORMAT JSON) ' + sql, params)
+            result = cursor.fetchone()[0]
+            if isinstance(result, str):
+                result = json.loads(result)
+            text = ''
+            if with_text:
+                cursor.execute('EXPLAIN (ANALYZE, BUFFERS) ' + sql, params)
+                text = '\n'.join(row[0] for row in cursor.fetchall())
+        return result[0], text
@@ -0,0 +1,363 @@
+import bisect
+import math
+import random
+import time
+from datetime import date, datetime, time as dtime, timedelta
+from decimal import Decimal
+
+from django.contrib.auth.hashers import make_password
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection, transaction
+from django.utils import timezone
+
+from PrimeFit.bulk import copy_rows
+
+FIRST_NAMES = [
+    'Ana', 'João', 'Maria', 'Pedro', 'Sofia', 'Rui', 'Carla', 'Miguel', 'Inês', 'Tiago',
+    'Beatriz', 'Diogo', 'Marta', 'Francisco', 'Rita', 'Gonçalo', 'Joana', 'Bruno', 'Catarina', 'Luís',
+]
+LAST_NAMES = [
+    'Silva', 'Santos', 'Ferreira', 'Pereira', 'Oliveira', 'Costa', 'Rodrigues', 'Martins', 'Sousa',
+    'Fernandes', 'Gonçalves', 'Gomes', 'Lopes', 'Marques', 'Alves', 'Almeida', 'Ribeiro', 'Pinto',
+]
+CITIES = ['Braga', 'Porto', 'Lisboa', 'Guimarães', 'Barcelos', 'Viana do Castelo', 'Coimbra', 'Aveiro']
+CLASS_TYPES = ['Yoga', 'Pilates', 'Spinning', 'CrossFit', 'Zumba', 'Body Pump', 'HIIT', 'Boxe', 'Step', 'Alongamentos']
+ROOMS = ['Sala A', 'Sala B', 'Sala C', 'Estúdio 1', 'Estúdio 2']
+MACHINE_TYPES = ['Cardio', 'Musculação', 'Funcional', 'Pesos Livres']
+MANUFACTURERS = ['Technogym', 'Life Fitness', 'Matrix', 'Precor', 'Star Trac']
+PAYMENT_METHODS = ['MB Way', 'Multibanco', 'Cartão', 'Débito Direto', 'Dinheiro']
+
+# Tabelas geradas, na ordem de carregamento (pai -> filho), com a sua chave
+TABLE_KEYS = [
+    ('users', 'userid'),
+    ('instructor', 'instructorid'),
+    ('member', 'memberid'),
+    ('membersubscription', 'subscriptionid'),
+    ('class', 'classid'),
+    ('classschedule', 'classscheduleid'),
+    ('classbooking', 'bookingid'),
+    ('checkin', 'checkinid'),
+    ('payment', 'paymentid'),
+    ('machine', 'machineid'),
+    ('machinemaintenancelog', 'logid'),
+]
+
+
+def add_months(day, months):
+    month = day.month - 1 + months
+    year = day.year + month // 12
+    month = month % 12 + 1
+    leap = year % 4 == 0 and (year % 100 != 0 or year % 400 == 0)
+    last_day = [31, 29 if leap else 28, 31, 30, 31, 30, 31, 31, 30, 31, 30, 31][month - 1]
+    return date(year, month, min(day.day, last_day))
+
+
+def minutes_to_time(minutes):
+    return dtime(minutes // 60, minutes % 60)
+
+
+class Command(BaseCommand):
+    help = (
+        'Gera dados sintéticos à escala de produção (membros, subscrições, check-ins, aulas, '
+        'reservas, pagamentos, máquinas) e carrega-os com COPY'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--members', type=int, default=10000)
+        parser.add_argument('--instructors', type=int, default=30)
+        parser.add_argument('--classes', type=int, default=60)
+        parser.add_argument('--machines', type=int, default=80)
+        parser.add_argument('--years', type=float, default=2, help='Anos de histórico')
+        parser.add_argument('--horizon-days', type=int, default=28, help='Dias de aulas futuras a agendar')
+        parser.add_argument('--visits-per-week', type=float, default=2.0, help='Média de idas ao ginásio por membro')
+        parser.add_argument(
+            '--skew', type=float, default=1.5,
+            help='Alfa da distribuição de Pareto da atividade por membro (menor = mais assimétrico)',
+        )
+        parser.add_argument('--active-ratio', type=float, default=0.85, help='Fração de membros ativos')
+        parser.add_argument('--password', default='primefit123', help='Password de todos os utilizadores gerados')
+        parser.add_argument('--seed', type=int, default=42)
+        parser.add_argument(
+            '--truncate', action='store_true',
+            help='APAGA todos os dados de utilizadores, membros, aulas, pagamentos e máquinas antes de gerar',
+        )
+
+    def handle(self, *args, **options):
+        self.rng = random.Random(options['seed'])
+        self.options = options
+        self.today = date.today()
+        self.now = timezone.localtime().replace(tzinfo=None)
+        self.start = self.today - timedelta(days=int(365 * options['years']))
+        self.password = make_password(options['password'])
+
+        with transaction.atomic(), connection.cursor() as cursor:
+            if options['truncate']:
+                self.truncate(cursor)
+
+            # checkin e payment são particionadas por mês: criar as partições do histórico gerado
+            months = (self.today.year - self.start.year) * 12 + self.today.month - self.start.month + 3
+            for table in ('checkin', 'payment'):
+                cursor.execute("SELECT fn_ensure_month_partitions(%s, %s, %s)", [table, self.start, months])
+
+            self.next_ids = {}
+            for table, key in TABLE_KEYS:
+                cursor.execute(f"SELECT COALESCE(MAX({key}), 0) + 1 FROM {table}")
+                self.next_ids[table] = cursor.fetchone()[0]
+
+            cursor.execute("SELECT planid, monthlyprice FROM plan WHERE isactive = true ORDER BY planid")
+            self.plans = cursor.fetchall()
+            if not self.plans:
+                raise CommandError('Não existem planos ativos; carregue primeiro os dados base do sq.sql')
+            self.prepare_population()
+
+            self.load(cursor, 'users',
+                      ['userid', 'email', 'password', 'name', 'usertypeid', 'isactive'], self.gen_users())
+            self.load(cursor, 'instructor',
+                      ['instructorid', 'userid', 'nif', 'phone', 'isactive'], self.gen_instructors())
+            self.load(cursor, 'member',
+                      ['memberid', 'userid', 'nif', 'phone', 'iban', 'registrationdate', 'birthdate',
+                       'gender', 'address', 'city', 'postalcode', 'isactive'], self.gen_members())
+            self.load(cursor, 'membersubscription',
+                      ['subscriptionid', 'planid', 'memberid', 'startdate', 'enddate', 'isactive'],
+                      self.gen_subscriptions())
+            self.load(cursor, 'class',
+                      ['classid', 'instructorid', 'name', 'description', 'room', 'capacity',
+                       'duration_minutes', 'isactive'], self.gen_classes())
+            self.load(cursor, 'classschedule',
+                      ['classscheduleid', 'classid', 'date', 'starttime', 'endtime', 'maxparticipants',
+                       'isactive'], self.gen_schedules())
+            # booked_count é preenchido pelo trigger do COPY de classbooking
+            self.load(cursor, 'classbooking',
+                      ['bookingid', 'memberid', 'classscheduleid', 'bookingdate'], self.gen_bookings())
+            self.load(cursor, 'checkin',
+                      ['checkinid', 'memberid', 'date', 'entrancetime', 'exittime'], self.gen_checkins())
+            self.load(cursor, 'payment',
+                      ['paymentid', 'subscriptionid', 'amount', 'ispayed', 'duedate', 'paymentdate',
+                       'paymentmethod', 'reference'], self.gen_payments())
+            self.load(cursor, 'machine',
+                      ['machineid', 'machinestatusid', 'name', 'type', 'manufacturer', 'model',
+                       'serialnumber', 'installationdate', 'maintenancedate'], self.gen_machines())
+            self.load(cursor, 'machinemaintenancelog',
+                      ['logid', 'machineid', 'maintenancedate', 'description', 'technician', 'cost',
+                       'maintenancetype'], self.gen_maintenance_logs())
+
+            for table, key in TABLE_KEYS:
+                cursor.execute(
+                    f"SELECT setval(pg_get_serial_sequence('{table}', '{key}'), "
+                    f"(SELECT COALESCE(MAX({key}), 1) FROM {table}))"
+                )
+
+        with connection.cursor() as cursor:
+            cursor.execute("ANALYZE")
+
+        self.stdout.write(self.style.SUCCESS(
+            f'Dados gerados. Login: gestor{self.manager_userid}@primefit.test / {options["password"]}'
+        ))
+
+    def truncate(self, cursor):
+        cursor.execute("""
+            TRUNCATE checkin, classbooking, payment, membersubscription, classschedule,
+                     machinemaintenancelog, class, machine, instructor, member, users,
+                     member_month_stats, dailycheckincount, hourlyoccupancy, archivewatermark
+            RESTART IDENTITY CASCADE
+        """)
+        # TRUNCATE não dispara os triggers dos contadores
+        cursor.execute("""
+            UPDATE dashboardcounters
+            SET total_members = 0, total_instructors = 0, active_memberships = 0, updated_at = CURRENT_TIMESTAMP
+        """)
+
+    def load(self, cursor, table, columns, rows):
+        started = time.perf_counter()
+        count = copy_rows(cursor, table, columns, rows)
+        elapsed = time.perf_counter() - started
+        self.stdout.write(f'{table}: {count} linhas em {elapsed:.1f}s ({count / max(elapsed, 1e-9):.0f} linhas/s)')
+
+    # População
+
+    def prepare_population(self):
+        rng = self.rng
+        opts = self.options
+        user = self.next_ids['users']
+        self.manager_userid = user
+        self.instructor_ids = list(range(self.next_ids['instructor'], self.next_ids['instructor'] + opts['instructors']))
+        self.instructor_userids = list(range(user + 1, user + 1 + opts['instructors']))
+        first_member_user = user + 1 + opts['instructors']
+
+        self.members = []
+        days = (self.today - self.start).days
+        for i in range(opts['members']):
+            # Mais registos antigos do que recentes
+            registration = self.start + timedelta(days=int(days * (1 - math.sqrt(rng.random()))))
+            self.members.append({
+                'memberid': self.next_ids['member'] + i,
+                'userid': first_member_user + i,
+                'subscriptionid': self.next_ids['membersubscription'] + i,
+                'active': rng.random() < opts['active_ratio'],
+                'registration': registration,
+                'weight': rng.paretovariate(opts['skew']),
+                'name': f'{rng.choice(FIRST_NAMES)} {rng.choice(LAST_NAMES)}',
+                'plan': rng.choice(self.plans),
+            })
+        for member in self.members:
+            if member['active']:
+                member['end'] = max(add_months(member['registration'], 12),
+                                    self.today + timedelta(days=rng.randint(30, 365)))
+            else:
+                span = max(1, (self.today - member['registration']).days)
+                member['end'] = member['registration'] + timedelta(days=rng.randint(1, span))
+
+        mean_weight = sum(m['weight'] for m in self.members) / max(1, len(self.members))
+        for member in self.members:
+            member['visits_per_week'] = opts['visits_per_week'] * member['weight'] / mean_weight
+
+        # Amostragem ponderada pela atividade para as reservas
+        self.bookable = [m for m in self.members if m['active']]
+        self.bookable_cum = []
+        total = 0.0
+        for member in self.bookable:
+            total += member['weight']
+            self.bookable_cum.append(total)
+
+    def gen_users(self):
+        yield (self.manager_userid, f'gestor{self.manager_userid}@primefit.test', self.password,
+               f'Gestor {self.manager_userid}', 1, True)
+        for userid in self.instructor_userids:
+            yield (userid, f'instrutor{userid}@primefit.test', self.password,
+                   f'{self.rng.choice(FIRST_NAMES)} {self.rng.choice(LAST_NAMES)}', 2, True)
+        for member in self.members:
+            yield (member['userid'], f'membro{member["userid"]}@primefit.test', self.password,
+                   member['name'], 3, member['active'])
+
+    def gen_instructors(self):
+        for instructorid, userid in zip(self.instructor_ids, self.instructor_userids):
+            yield (instructorid, userid, f'{900000000 + instructorid % 100000000:09d}',
+                   f'91{instructorid % 10000000:07d}', True)
+
+    def gen_members(self):
+        rng = self.rng
+        for member in self.members:
+            memberid = member['memberid']
+            birth = self.today - timedelta(days=rng.randint(16 * 365, 70 * 365))
+            yield (memberid, member['userid'], f'{800000000 + memberid % 100000000:09d}',
+                   f'93{memberid % 10000000:07d}', f'PT50{memberid:021d}', member['registration'], birth,
+                   rng.choice(['Masculino', 'Feminino', 'Outro']), f'Rua {rng.choice(LAST_NAMES)}, {rng.randint(1, 300)}',
+                   rng.choice(CITIES), f'{rng.randint(1000, 9999)}-{rng.randint(100, 999)}', member['active'])
+
+    def gen_subscriptions(self):
+        for member in self.members:
+            yield (member['subscriptionid'], member['plan'][0], member['memberid'],
+                   member['registration'], member['end'], member['active'])
+
+    def gen_classes(self):
+        rng = self.rng
+        self.classes = []
+        for i in range(self.options['classes']):
+            classid = self.next_ids['class'] + i
+            name = rng.choice(CLASS_TYPES)
+            self.classes.append({
+                'classid': classid,
+                'capacity': rng.randint(10, 30),
+                'duration': rng.choice([45, 60]),
+                'weekday': rng.randrange(7),
+                'start': rng.randint(7 * 60, 20 * 60) // 15 * 15,
+            })
+            yield (classid, rng.choice(self.instructor_ids), name, f'Aula de {name}', rng.choice(ROOMS),
+                   self.classes[-1]['capacity'], self.classes[-1]['duration'], True)
+
+    def gen_schedules(self):
+        rng = self.rng
+        self.schedules = []
+        scheduleid = self.next_ids['classschedule']
+        end = self.today + timedelta(days=self.options['horizon_days'])
+        for cls in self.classes:
+            day = self.start + timedelta(days=(cls['weekday'] - self.start.weekday()) % 7)
+            while day <= end:
+                fill = rng.uniform(0.3, 1.0) if day <= self.today else rng.uniform(0.0, 0.6)
+                booked = min(cls['capacity'], int(cls['capacity'] * fill), len(self.bookable))
+                self.schedules.append((scheduleid, day, cls['start'], booked))
+                yield (scheduleid, cls['classid'], day, minutes_to_time(cls['start']),
+                       minutes_to_time(cls['start'] + cls['duration']), cls['capacity'], True)
+                scheduleid += 1
+                day += timedelta(days=7)
+
+    def gen_bookings(self):
+        rng = self.rng
+        bookingid = self.next_ids['classbooking']
+        for scheduleid, day, start, booked in self.schedules:
+            chosen = set()
+            while len(chosen) < booked:
+                index = bisect.bisect_left(self.bookable_cum, rng.random() * self.bookable_cum[-1])
+                chosen.add(self.bookable[min(index, len(self.bookable) - 1)]['memberid'])
+            class_start = datetime.combine(day, minutes_to_time(start))
+            for memberid in chosen:
+                booked_at = min(self.now, class_start - timedelta(hours=rng.randint(1, 72)))
+                yield (bookingid, memberid, scheduleid, booked_at)
+                bookingid += 1
+
+    def gen_checkins(self):
+        rng = self.rng
+        checkinid = self.next_ids['checkin']
+        now_minutes = self.now.hour * 60 + self.now.minute
+        for member in self.members:
+            first = max(member['registration'], self.start)
+            last = min(member['end'], self.today)
+            days = (last - first).days + 1
+            if days <= 0:
+                continue
+            expected = member['visits_per_week'] * days / 7
+            visits = max(0, min(days, int(rng.gauss(expected, math.sqrt(expected)) + 0.5)))
+            for offset in sorted(rng.sample(range(days), visits)):
+                day = first + timedelta(days=offset)
+                entrance = rng.randint(6 * 60, 21 * 60 + 30)
+                exit_minutes = min(entrance + rng.randint(30, 150), 23 * 60 + 59)
+                exittime = minutes_to_time(exit_minutes)
+                if day == self.today:
+                    if entrance > now_minutes:
+                        continue
+                    if exit_minutes > now_minutes:
+                        exittime = None  # Ainda no ginásio
+                yield (checkinid, member['memberid'], day, minutes_to_time(entrance), exittime)
+                checkinid += 1
+
+    def gen_payments(self):
+        rng = self.rng
+        paymentid = self.next_ids['payment']
+        billing_end = add_months(self.today, 1)
+        for member in self.members:
+            amount = Decimal(member['plan'][1])
+            cycle = 0
+            due = member['registration']
+            while due <= min(member['end'], billing_end):
+                paid = due < self.today and rng.random() < 0.97
+                paid_on = min(due + timedelta(days=rng.randint(0, 5)), self.today) if paid else None
+                yield (paymentid, member['subscriptionid'], amount, paid, due, paid_on,
+                       rng.choice(PAYMENT_METHODS) if paid else None, f'PF{paymentid:012d}')
+                paymentid += 1
+                cycle += 1
+                due = add_months(member['registration'], cycle)
+
+    def gen_machines(self):
+        rng = self.rng
+        self.machines = []
+        for i in range(self.options['machines']):
+            machineid = self.next_ids['machine'] + i
+            installed = self.start - timedelta(days=rng.randint(0, 3 * 365))
+            self.machines.append((machineid, installed))
+            status = rng.choices([1, 2, 3], weights=[5, 90, 5])[0]
+            maintenance = installed + timedelta(days=rng.randint(0, (self.today - installed).days))
+            yield (machineid, status, f'{rng.choice(MACHINE_TYPES)} {machineid}', rng.choice(MACHINE_TYPES),
+                   rng.choice(MANUFACTURERS), f'M-{rng.randint(100, 999)}', f'SN{machineid:010d}',
+                   installed, maintenance)
+
+    def gen_maintenance_logs(self):
+        rng = self.rng
+        logid = self.next_ids['machinemaintenancelog']
+        for machineid, installed in self.machines:
+            day = installed + timedelta(days=rng.randint(30, 120))
+            while day <= self.today:
+                kind = rng.choices(['ROUTINE', 'REPAIR'], weights=[85, 15])[0]
+                yield (logid, machineid, day, 'Revisão periódica' if kind == 'ROUTINE' else 'Reparação de avaria',
+                       f'Técnico {rng.choice(LAST_NAMES)}', Decimal(rng.randint(20, 400)), kind)
+                logid += 1
+                day += timedelta(days=rng.randint(60, 120))
@@ -0,0 +1,130 @@
+import csv
+import multiprocessing
+import sys
+import time
+from concurrent.futures import ProcessPoolExecutor
+from datetime import datetime
+from itertools import islice
+
+from django.contrib.auth.hashers import make_password
+from django.core.management.base import BaseCommand, CommandError
+from django.db import DatabaseError
+
+from PrimeFit.db_router import close_connections_for_fork
+from PrimeFit.member_import import find_duplicates, load_members, read_members
+
+
+def _hash_passwords(passwords):
+    # Corre num processo filho: o hashing é CPU-bound e não deve competir pelo GIL
+    return [make_password(password) for password in passwords]
+
+
+def _chunks(iterable, size):
+    iterator = iter(iterable)
+    while chunk := list(islice(iterator, size)):
+        yield chunk
+
+
+class Command(BaseCommand):
+    help = (
+        'Importa membros de um CSV: valida as linhas, verifica os duplicados de cada lote numa só query, '
+        'calcula os hashes das passwords num pool de processos e carrega users, member e '
+        'membersubscription com COPY para staging, numa transação por lote'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('csv', help='Ficheiro CSV com cabeçalho')
+        parser.add_argument('--encoding', default='utf-8-sig', help='Codificação do CSV')
+        parser.add_argument('--chunk-size', type=int, default=1000, help='Membros por lote (transação)')
+        parser.add_argument('--workers', type=int, default=4, help='Processos para o hashing das passwords')
+        parser.add_argument('--start-date', help='Início das subscrições sem startdate (AAAA-MM-DD); por omissão hoje')
+        parser.add_argument('--report', help='CSV com as linhas não importadas (por omissão stdout)')
+
+    def handle(self, *args, **options):
+        try:
+            start_date = (datetime.strptime(options['start_date'], '%Y-%m-%d').date()
+                          if options['start_date'] else None)
+        except ValueError:
+            raise CommandError('Use --start-date AAAA-MM-DD')
+
+        report_file = open(options['report'], 'w', newline='', encoding='utf-8') if options['report'] else sys.stdout
+        writer = csv.writer(report_file)
+        writer.writerow(['line', 'email', 'reason'])
+        rejected = 0
+
+        def reject(line_no, email, reason):
+            nonlocal rejected
+            rejected += 1
+            writer.writerow([line_no, email, reason])
+
+        imported = 0
+        started = time.perf_counter()
+        try:
+            with open(options['csv'], newline='', encoding=options['encoding']) as source:
+                chunks = _chunks(read_members(source, reject, start_date), options['chunk_size'])
+                for members, hashes in self.hashed(chunks, options['workers'], reject):
+                    for member, hashed in zip(members, hashes):
+                        member['password'] = hashed
+                    created, not_loaded = load_members(members)
+                    imported += created
+                    for row in not_loaded:
+                        reject(*row)
+                    self.stderr.write(f'  {imported} membros importados, {rejected} linhas rejeitadas')
+        except ValueError as e:
+            raise CommandError(str(e))
+        except DatabaseError as e:
+            # Os lotes anteriores já foram gravados: o lote atual foi revertido
+            raise CommandError(f'Importação interrompida depois de {imported} membros: {e}')
+        finally:
+            if report_file is not sys.stdout:
+                report_file.close()
+        elapsed = time.perf_counter() - started
+
+        rate = imported / elapsed if elapsed else 0.0
+        self.stderr.write(self.style.SUCCESS(
+            f'{imported} membros importados, {rejected} linhas no relatório em {elapsed:.1f}s ({rate:.0f} linhas/s)'
+        ))
+
+    def hashed(self, chunks, workers, reject):
+        """
+        Gera (membros, hashes) por lote, sem os duplicados já existentes na base
+        de dados. Com workers > 1 os hashes do lote seguinte são calculados no
+        pool enquanto o lote atual é carregado.
+        """
+        def without_duplicates(members):
+            duplicates = find_duplicates(members)
+            for member in members:
+                if member['line_no'] in duplicates:
+                    reject(member['line_no'], member['email'], duplicates[member['line_no']])
+            return [member for member in members if member['line_no'] not in duplicates]
+
+        if workers <= 1:
+            for members in chunks:
+                members = without_duplicates(members)
+                if members:
+                    yield members, _hash_passwords([member['password'] for member in members])
+            return
+
+        # As ligações (e os pools) abertos não podem ser herdados pelos processos filhos
+        close_connections_for_fork()
+        context = multiprocessing.get_context('fork')
+        with ProcessPoolExecutor(max_workers=workers, mp_context=context) as executor:
+            # Com fork todos os processos são criados na primeira submissão:
+            # força-a antes de a verificação de duplicados reabrir a ligação
+            executor.submit(_hash_passwords, []).result()
+            pending = None
+            for members in chunks:
+                members = without_duplicates(members)
+                if not members:
+                    continue
+                # Divide as passwords do lote pelos processos
+                step = -(-len(members) // workers)
+                futures = [
+                    executor.submit(_hash_passwords, [member['password'] for member in members[i:i + step]])
+                    for i in range(0, len(members), step)
+                ]
+                if pending is not None:
+                    yield pending[0], [h for future in pending[1] for h in future.result()]
+                pending = (members, futures)
+            if pending is not None:
+                yield pending[0], [h for future in pending[1] for h in future.result()]
@@ -0,0 +1,127 @@
+import re
+from datetime import date
+
+from django.conf import settings
+from django.core.management.base import BaseCommand
+from django.db import connection, transaction
+
+from PrimeFit.archive import rebuild_cutoff
+
+# Tabela particionada -> (coluna da partição, retenção por omissão em meses)
+PARTITIONED_TABLES = {
+    # Check-ins: a mesma retenção do arquivo no MongoDB (archive_history)
+    'checkin': ('date', settings.ARCHIVE_RETENTION_MONTHS),
+    # Pagamentos são documentos contabilísticos: retenção longa por omissão
+    'payment': ('duedate', 120),
+}
+
+PARTITION_NAME = re.compile(r'^(?P<table>\w+)_y(?P<year>\d{4})m(?P<month>\d{2})$')
+
+
+def month_start(day, months_back=0):
+    month = day.year * 12 + day.month - 1 - months_back
+    return date(month // 12, month % 12 + 1, 1)
+
+
+class Command(BaseCommand):
+    help = (
+        'Cria as partições mensais futuras de checkin/payment e separa (DETACH) as partições '
+        'mais antigas que a retenção, movendo-as para um schema de arquivo ou apagando-as'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--ahead', type=int, default=3, help='Meses futuros a manter criados')
+        parser.add_argument('--checkin-retention', type=int, default=PARTITIONED_TABLES['checkin'][1],
+                            help='Meses de check-ins a manter na tabela (por omissão ARCHIVE_RETENTION_MONTHS)')
+        parser.add_argument('--payment-retention', type=int, default=PARTITIONED_TABLES['payment'][1],
+                            help='Meses de pagamentos a manter na tabela')
+        parser.add_argument('--detach', action='store_true', help='Separar as partições fora da retenção')
+        parser.add_argument('--archive-schema', default='archive',
+                            help='Schema para onde vão as partições separadas')
+        parser.add_argument('--drop', action='store_true', help='Apagar as partições separadas em vez de arquivar')
+        parser.add_argument('--dry-run', action='store_true', help='Apenas mostrar o que seria feito')
+
+    def handle(self, *args, **options):
+        today = date.today()
+        retention = {'checkin': options['checkin_retention'], 'payment': options['payment_retention']}
+
+        for table in PARTITIONED_TABLES:
+            with transaction.atomic(), connection.cursor() as cursor:
+                if options['dry_run']:
+                    self.stdout.write(f'{table}: criaria as partições até {month_start(today, -options["ahead"])}')
+                else:
+                    cursor.execute(
+                        "SELECT fn_ensure_month_partitions(%s, %s, %s)",
+                        [table, month_start(today), options['ahead'] + 1],
+                    )
+                    self.stdout.write(f'{table}: {cursor.fetchone()[0]} partição(ões) futura(s) criada(s)')
+
+                cursor.execute(f"SELECT COUNT(*) FROM {table}_default")
+                orphans = cursor.fetchone()[0]
+                if orphans:
+                    self.stdout.write(self.style.WARNING(
+                        f'{table}_default tem {orphans} linha(s) fora das partições mensais; '
+                        f'crie as partições em falta e mova essas linhas'
+                    ))
+
+            if options['detach']:
+                cutoff = month_start(today, retention[table])
+                # Meses de check-ins ainda não arquivados no MongoDB nunca saem de checkin
+                archived_before = rebuild_cutoff(['checkins']) if table == 'checkin' else None
+                for name, month in self.partitions(table):
+                    if month < cutoff:
+                        self.detach(table, name, month, archived_before, options)
+
+    def partitions(self, table):
+        with connection.cursor() as cursor:
+            cursor.execute("""
+                SELECT c.relname
+                FROM pg_inherits i
+                JOIN pg_class c ON c.oid = i.inhrelid
+                WHERE i.inhparent = %s::regclass
+                ORDER BY c.relname
+            """, [table])
+            names = [row[0] for row in cursor.fetchall()]
+        for name in names:
+            match = PARTITION_NAME.match(name)
+            if match and match['table'] == table:
+                yield name, date(int(match['year']), int(match['month']), 1)
+
+    def detach(self, table, name, month, archived_before, options):
+        quote = connection.ops.quote_name
+        with transaction.atomic(), connection.cursor() as cursor:
+            if table == 'checkin':
+                # O histórico dos membros e as exportações só leem checkin e o
+                # arquivo: a partição tem de estar arquivada (e por isso vazia)
+                if month >= archived_before:
+                    self.stdout.write(self.style.WARNING(
+                        f'{name}: mês ainda não arquivado no MongoDB (corra archive_history), mantida'
+                    ))
+                    return
+                cursor.execute(f"SELECT COUNT(*) FROM {quote(name)}")
+                unarchived = cursor.fetchone()[0]
+                if unarchived:
+                    self.stdout.write(self.style.WARNING(
+                        f'{name}: {unarchived} check-in(s) por arquivar, mantida'
+                    ))
+                    return
+            if table == 'payment':
+                # Nunca arquivar pagamentos por cobrar
+                cursor.execute(f"SELECT COUNT(*) FROM {quote(name)} WHERE ispayed = false")
+                unpaid = cursor.fetchone()[0]
+                if unpaid:
+                    self.stdout.write(self.style.WARNING(f'{name}: {unpaid} pagamento(s) por pagar, mantida'))
+                    return
+
+            action = 'apagada' if options['drop'] else f'movida para {options["archive_schema"]}'
+            if options['dry_run']:
+                self.stdout.write(f'{name}: seria separada e {action}')
+                return
+
+            cursor.execute(f"ALTER TABLE {quote(table)} DETACH PARTITION {quote(name)}")
+            if options['drop']:
+                cursor.execute(f"DROP TABLE {quote(name)}")
+            else:
+                cursor.execute(f"CREATE SCHEMA IF NOT EXISTS {quote(options['archive_schema'])}")
+                cursor.execute(f"ALTER TABLE {quote(name)} SET SCHEMA {quote(options['archive_schema'])}")
+            self.stdout.write(self.style.SUCCESS(f'{name}: separada e {action}'))
@@ -0,0 +1,68 @@
+import csv
+import sys
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+
+from PrimeFit.reconciliation import (
+    DEFAULT_METHOD, StatementError, parse_camt_statement, parse_csv_statement, reconcile_statement,
+)
+
+
+class Command(BaseCommand):
+    help = (
+        'Lê um extrato bancário (CSV ou CAMT.053 XML) em streaming, carrega-o com COPY e marca como '
+        'pagos, com um único UPDATE, todos os pagamentos cuja referência e valor correspondem. '
+        'As linhas sem correspondência vão para um relatório CSV'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('statement', help='Ficheiro do extrato')
+        parser.add_argument('--format', choices=['csv', 'camt'],
+                            help='Formato do extrato (por omissão pela extensão: .xml = camt)')
+        parser.add_argument('--encoding', default='utf-8-sig', help='Codificação do CSV')
+        parser.add_argument('--method', default=DEFAULT_METHOD,
+                            help='Método de pagamento quando o extrato não o indica')
+        parser.add_argument('--report', help='CSV com as linhas não reconciliadas (por omissão stdout)')
+
+    def handle(self, *args, **options):
+        path = options['statement']
+        fmt = options['format'] or ('camt' if path.lower().endswith('.xml') else 'csv')
+
+        report_file = open(options['report'], 'w', newline='', encoding='utf-8') if options['report'] else sys.stdout
+        writer = csv.writer(report_file)
+        writer.writerow(['line', 'reference', 'amount', 'bookingdate', 'reason'])
+        unmatched = 0
+
+        def report(line_no, reference, reason, amount='', bookingdate=''):
+            nonlocal unmatched
+            unmatched += 1
+            writer.writerow([line_no, reference, amount, bookingdate, reason])
+
+        def report_unmatched(line_no, reference, amount, bookingdate, reason):
+            report(line_no, reference, reason, amount, bookingdate)
+
+        started = time.perf_counter()
+        try:
+            if fmt == 'camt':
+                with open(path, 'rb') as statement:
+                    loaded, settled = reconcile_statement(
+                        parse_camt_statement(statement, report), report_unmatched, options['method']
+                    )
+            else:
+                with open(path, newline='', encoding=options['encoding']) as statement:
+                    loaded, settled = reconcile_statement(
+                        parse_csv_statement(statement, report), report_unmatched, options['method']
+                    )
+        except StatementError as e:
+            raise CommandError(str(e))
+        finally:
+            if report_file is not sys.stdout:
+                report_file.close()
+        elapsed = time.perf_counter() - started
+
+        rate = loaded / elapsed if elapsed else 0.0
+        self.stderr.write(self.style.SUCCESS(
+            f'{loaded} linhas carregadas, {settled} pagamentos liquidados, {unmatched} linhas no relatório '
+            f'em {elapsed:.1f}s ({rate:.0f} linhas/s)'
+        ))
@@ -0,0 +1,92 @@
+from django.core.management.base import BaseCommand
+from django.db import connection, transaction
+
+from PrimeFit.archive import rebuild_cutoff
+
+
+COUNTER_QUERIES = {
+    'total_members': "SELECT COUNT(*) FROM member WHERE isactive = true",
+    'total_instructors': "SELECT COUNT(*) FROM instructor WHERE isactive = true",
+    'active_memberships': "SELECT COUNT(*) FROM membersubscription WHERE isactive = true",
+}
+
+
+class Command(BaseCommand):
+    help = 'Recalcula os contadores do dashboard a partir das tabelas base e reporta o desvio'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--dry-run', action='store_true',
+            help='Apenas reporta o desvio, sem corrigir os contadores',
+        )
+
+    def handle(self, *args, **options):
+        dry_run = options['dry_run']
+        drift_found = False
+        # Os dias já arquivados no MongoDB não estão em checkin: o contador é a única fonte
+        cutoff = rebuild_cutoff(['checkins'])
+
+        with transaction.atomic(), connection.cursor() as cursor:
+            # SHARE bloqueia escritas nas tabelas base enquanto contamos, para
+            # que os triggers não apliquem deltas sobre valores recalculados
+            cursor.execute("LOCK TABLE member, instructor, membersubscription, checkin IN SHARE MODE")
+            cursor.execute("""
+                SELECT total_members, total_instructors, active_memberships
+                FROM dashboardcounters WHERE counterid = 1 FOR UPDATE
+            """)
+            row = cursor.fetchone()
+            stored = dict(zip(COUNTER_QUERIES, row)) if row else dict.fromkeys(COUNTER_QUERIES, 0)
+
+            actual = {}
+            for counter, query in COUNTER_QUERIES.items():
+                cursor.execute(query)
+                actual[counter] = cursor.fetchone()[0]
+                drift = stored[counter] - actual[counter]
+                if drift:
+                    drift_found = True
+                    self.stdout.write(self.style.WARNING(
+                        f'{counter}: guardado={stored[counter]} real={actual[counter]} desvio={drift:+d}'
+                    ))
+                else:
+                    self.stdout.write(f'{counter}: {actual[counter]} (ok)')
+
+            cursor.execute("""
+                SELECT COALESCE(d.date, c.date), COALESCE(d.total, 0), COALESCE(c.total, 0)
+                FROM (SELECT * FROM dailycheckincount WHERE date >= %(cutoff)s) d
+                FULL OUTER JOIN (
+                    SELECT date, COUNT(*) AS total FROM checkin WHERE date >= %(cutoff)s GROUP BY date
+                ) c ON c.date = d.date
+                WHERE COALESCE(d.total, 0) <> COALESCE(c.total, 0)
+                ORDER BY 1
+            """, {'cutoff': cutoff})
+            daily_drift = cursor.fetchall()
+            for day, stored_total, actual_total in daily_drift:
+                drift_found = True
+                self.stdout.write(self.style.WARNING(
+                    f'checkins {day}: guardado={stored_total} real={actual_total} '
+                    f'desvio={stored_total - actual_total:+d}'
+                ))
+
+            if dry_run or not drift_found:
+                self.stdout.write(self.style.SUCCESS(
+                    'Sem desvios.' if not drift_found else 'Desvio encontrado (dry-run, nada foi alterado).'
+                ))
+                return
+
+            cursor.execute("""
+                INSERT INTO dashboardcounters (counterid, total_members, total_instructors, active_memberships)
+                VALUES (1, %s, %s, %s)
+                ON CONFLICT (counterid) DO UPDATE
+                SET total_members = EXCLUDED.total_members,
+                    total_instructors = EXCLUDED.total_instructors,
+                    active_memberships = EXCLUDED.active_memberships,
+                    updated_at = CURRENT_TIMESTAMP
+            """, [actual['total_members'], actual['total_instructors'], actual['active_memberships']])
+
+            cursor.execute("DELETE FROM dailycheckincount WHERE date >= %s", [cutoff])
+            cursor.execute("""
+                INSERT INTO dailycheckincount (date, total)
+                SELECT date, COUNT(*) FROM checkin WHERE date >= %s GROUP BY date
+            """, [cutoff])
+
+        self.stdout.write(self.style.SUCCESS('Contadores reconstruídos.'))
@@ -0,0 +1,105 @@
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection, connections
+
+from PrimeFit.benchmarking import summarize_latencies, format_summary
+
+
+class Command(BaseCommand):
+    help = (
+        'Dispara chamadas concorrentes a sp_book_class contra um único horário e '
+        'verifica que não há overbooking, reportando a latência (p50/p95/p99)'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('classscheduleid', type=int)
+        parser.add_argument('--members', type=int, default=300, help='Número de membros a tentar reservar')
+        parser.add_argument('--workers', type=int, default=50, help='Ligações concorrentes à base de dados')
+        parser.add_argument(
+            '--keep', action='store_true',
+            help='Mantém as reservas criadas (por omissão são apagadas no fim)',
+        )
+
+    def handle(self, *args, **options):
+        schedule_id = options['classscheduleid']
+
+        with connection.cursor() as cursor:
+            cursor.execute("""
+                SELECT maxparticipants, booked_count FROM classschedule WHERE classscheduleid = %s
+            """, [schedule_id])
+            row = cursor.fetchone()
+            if row is None:
+                raise CommandError(f'Horário {schedule_id} não existe')
+            max_participants, booked_before = row
+
+            cursor.execute("""
+                SELECT m.memberid FROM member m
+                WHERE m.isactive = true
+                    AND NOT EXISTS (
+                        SELECT 1 FROM classbooking cb
+                        WHERE cb.memberid = m.memberid AND cb.classscheduleid = %s
+                    )
+                LIMIT %s
+            """, [schedule_id, options['members']])
+            members = [row[0] for row in cursor.fetchall()]
+
+        if not members:
+            raise CommandError('Não há membros disponíveis para o teste')
+
+        start = threading.Event()
+        results = []
+        results_lock = threading.Lock()
+
+        def book(memberid):
+            start.wait()
+            started = time.perf_counter()
+            try:
+                with connections['default'].cursor() as cursor:
+                    cursor.execute("CALL sp_book_class(%s, %s)", [memberid, schedule_id])
+                ok = True
+            except Exception:
+                ok = False
+            finally:
+                elapsed = time.perf_counter() - started
+                connections['default'].close()
+            with results_lock:
+                results.append((memberid, ok, elapsed))
+
+        self.stdout.write(
+            f'A reservar {len(members)} membros no horário {schedule_id} '
+            f'(lugares: {max_participants}, já ocupados: {booked_before}) com {options["workers"]} workers...'
+        )
+        with ThreadPoolExecutor(max_workers=options['workers']) as executor:
+            futures = [executor.submit(book, memberid) for memberid in members]
+            started = time.perf_counter()
+            start.set()
+            for future in futures:
+                future.result()
+        wall = time.perf_counter() - started
+
+        succeeded = [memberid for memberid, ok, _ in results if ok]
+        with connection.cursor() as cursor:
+            cursor.execute("""
+                SELECT cs.booked_count, (SELECT COUNT(*) FROM classbooking cb WHERE cb.classscheduleid = cs.classscheduleid)
+                FROM classschedule cs WHERE cs.classscheduleid = %s
+            """, [schedule_id])
+            booked_count, real_count = cursor.fetchone()
+
+            if succeeded and not options['keep']:
+                cursor.execute("""
+                    DELETE FROM classbooking WHERE classscheduleid = %s AND memberid = ANY(%s)
+                """, [schedule_id, succeeded])
+
+        self.stdout.write(f'Reservas aceites: {len(succeeded)}, rejeitadas: {len(results) - len(succeeded)}')
+        self.stdout.write(f'booked_count={booked_count} reservas reais={real_count} máximo={max_participants}')
+        self.stdout.write(f'Latência: {format_summary(summarize_latencies([r[2] for r in results]))}')
+        self.stdout.write(f'Débito: {len(results) / wall:.1f} chamadas/s')
+
+        # maxparticipants NULL: aula sem limite de vagas
+        overbooked = max_participants is not None and real_count > max_participants
+        if overbooked or booked_count != real_count:
+            raise CommandError('Overbooking ou contador inconsistente detetado!')
+        self.stdout.write(self.style.SUCCESS('Sem overbooking.'))
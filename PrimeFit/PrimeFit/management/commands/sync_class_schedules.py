@@ -0,0 +1,64 @@
+import time
+from datetime import date, datetime, timedelta
+
+from django.core.management.base import BaseCommand, CommandError
+
+from PrimeFit.recurrence import ScheduleConflict, sync_class_schedules
+
+
+class Command(BaseCommand):
+    help = (
+        'Expande as recorrências das aulas (CLASSRECURRENCE) num horizonte e sincroniza CLASSSCHEDULE: '
+        'cria, atualiza e cancela sessões em bulk numa só transação, depois de verificar num só '
+        'varrimento as sobreposições de sala e de instrutor'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--from', dest='first', help='Primeiro dia (AAAA-MM-DD); por omissão hoje')
+        parser.add_argument('--days', type=int, default=90, help='Dias do horizonte')
+        parser.add_argument('--class', dest='classids', type=int, action='append',
+                            help='Só as recorrências desta aula (pode ser repetido)')
+        parser.add_argument('--allow-conflicts', action='store_true',
+                            help='Aplica mesmo com sobreposições (são só reportadas)')
+        parser.add_argument('--dry-run', action='store_true', help='Mostra as alterações sem as gravar')
+
+    def handle(self, *args, **options):
+        try:
+            first = datetime.strptime(options['first'], '%Y-%m-%d').date() if options['first'] else date.today()
+        except ValueError:
+            raise CommandError('Use --from AAAA-MM-DD')
+        if options['days'] < 1:
+            raise CommandError('--days tem de ser positivo')
+        last = first + timedelta(days=options['days'] - 1)
+
+        def invalid(recurrenceid, reason):
+            self.stderr.write(self.style.WARNING(f'  recorrência {recurrenceid} ignorada: {reason}'))
+
+        started = time.perf_counter()
+        try:
+            result = sync_class_schedules(
+                first, last, options['classids'],
+                allow_conflicts=options['allow_conflicts'], dry_run=options['dry_run'], invalid=invalid,
+            )
+        except ScheduleConflict as e:
+            self.write_conflicts(e.conflicts)
+            raise CommandError(f'{e}: nada foi alterado (use --allow-conflicts para aplicar)')
+        elapsed = time.perf_counter() - started
+
+        self.write_conflicts(result['conflicts'])
+        prefix = '[dry-run] ' if options['dry_run'] else ''
+        self.stdout.write(self.style.SUCCESS(
+            f'{prefix}{first} a {last}: {result["occurrences"]} ocorrências, {result["inserted"]} criadas, '
+            f'{result["updated"]} atualizadas, {result["cancelled"]} canceladas '
+            f'({result["cancelled_with_bookings"]} com reservas) em {elapsed:.1f}s'
+        ))
+
+    def write_conflicts(self, conflicts):
+        for conflict in conflicts:
+            label = 'sala' if conflict['kind'] == 'room' else 'instrutor'
+            self.stdout.write(self.style.WARNING(
+                f'  {label} {conflict["resource"]}: {conflict["name"]} ({conflict["classid"]}) '
+                f'{conflict["starts"]:%Y-%m-%d %H:%M}-{conflict["ends"]:%H:%M} sobrepõe-se a '
+                f'{conflict["other_name"]} ({conflict["other_classid"]}) '
+                f'{conflict["other_starts"]:%H:%M}-{conflict["other_ends"]:%H:%M}'
+            ))
@@ -0,0 +1,201 @@
+import csv
+import re
+from datetime import date
+
+from django.db import connection, transaction
+from django.utils.dateparse import parse_date
+
+from .bulk import copy_rows
+from .catalog import get_catalog
+
+MEMBER_USER_TYPE = 3
+GENDERS = ('Masculino', 'Feminino', 'Outro')
+
+# Mesmas regras dos CHECK de USERS/MEMBER, para que uma linha inválida seja
+# reportada em vez de fazer falhar o COPY do lote inteiro
+EMAIL_RE = re.compile(r'^[A-Za-z0-9._%+-]+@[A-Za-z0-9.-]+\.[A-Za-z]{2,}$')
+NIF_RE = re.compile(r'^[0-9]{9}$')
+PHONE_RE = re.compile(r'^[0-9+\-\s()]+$')
+MIN_BIRTHDATE = date(1900, 1, 1)
+
+REQUIRED_COLUMNS = ('name', 'email', 'password', 'nif', 'phone', 'iban', 'birthdate',
+                    'address', 'city', 'postalcode', 'plan')
+
+STAGING_COLUMNS = ['line_no', 'name', 'email', 'password', 'nif', 'phone', 'iban', 'birthdate',
+                   'gender', 'address', 'city', 'postalcode', 'planid', 'startdate']
+
+STAGING_TABLE_SQL = """
+    CREATE TEMP TABLE import_member (
+        line_no INTEGER PRIMARY KEY,
+        name VARCHAR(120), email VARCHAR(254), password VARCHAR(255),
+        nif CHAR(9), phone VARCHAR(15), iban VARCHAR(34), birthdate DATE, gender VARCHAR(10),
+        address VARCHAR(255), city VARCHAR(100), postalcode VARCHAR(20),
+        planid INTEGER, startdate DATE,
+        userid INTEGER, memberid INTEGER
+    ) ON COMMIT DROP
+"""
+
+# Verificação de duplicados de um lote inteiro numa só query (em vez de um
+# EXISTS por linha): emails já registados (vw_email_exists) e NIFs já usados
+DUPLICATES_SQL = """
+    SELECT i.line_no, CASE WHEN v.email IS NOT NULL THEN 'duplicate_email' ELSE 'duplicate_nif' END
+    FROM unnest(%s::int[], %s::varchar[], %s::char(9)[]) AS i(line_no, email, nif)
+    LEFT JOIN vw_email_exists v ON v.email = i.email
+    LEFT JOIN member m ON m.nif = i.nif
+    WHERE v.email IS NOT NULL OR m.memberid IS NOT NULL
+"""
+
+# Entretanto (ex.: um registo pelo site) o email ou o NIF podem ter sido usados:
+# essas linhas ficam sem userid/memberid e são reportadas no fim
+INSERT_USERS_SQL = """
+    WITH inserted AS (
+        INSERT INTO users (email, password, name, usertypeid, isactive)
+        SELECT email, password, name, %s, true
+        FROM import_member
+        ORDER BY line_no
+        ON CONFLICT (email) DO NOTHING
+        RETURNING userid, email
+    )
+    UPDATE import_member s SET userid = inserted.userid
+    FROM inserted WHERE s.email = inserted.email
+"""
+
+INSERT_MEMBERS_SQL = """
+    WITH inserted AS (
+        INSERT INTO member (userid, nif, phone, iban, birthdate, gender, address, city, postalcode)
+        SELECT userid, nif, phone, iban, birthdate, gender, address, city, postalcode
+        FROM import_member
+        WHERE userid IS NOT NULL
+        ORDER BY line_no
+        ON CONFLICT (nif) DO NOTHING
+        RETURNING memberid, userid
+    )
+    UPDATE import_member s SET memberid = inserted.memberid
+    FROM inserted WHERE s.userid = inserted.userid
+"""
+
+# Utilizadores criados para linhas cujo NIF entrou em conflito
+DELETE_ORPHAN_USERS_SQL = """
+    DELETE FROM users u
+    USING import_member s
+    WHERE u.userid = s.userid AND s.memberid IS NULL
+"""
+
+INSERT_SUBSCRIPTIONS_SQL = """
+    INSERT INTO membersubscription (memberid, planid, startdate, enddate, isactive)
+    SELECT memberid, planid, startdate, (startdate + INTERVAL '1 year')::date, true
+    FROM import_member
+    WHERE memberid IS NOT NULL
+"""
+
+REJECTED_SQL = """
+    SELECT line_no, email, CASE WHEN userid IS NULL THEN 'duplicate_email' ELSE 'duplicate_nif' END
+    FROM import_member
+    WHERE memberid IS NULL
+    ORDER BY line_no
+"""
+
+
+def _resolve_plan(value, plans):
+    value = (value or '').strip()
+    for plan in plans:
+        if value == str(plan['planid']) or value.lower() == plan['name'].lower():
+            return plan['planid']
+    return None
+
+
+def _parse_date(value):
+    try:
+        return parse_date((value or '').strip())
+    except ValueError:
+        return None
+
+
+def read_members(stream, reject, default_startdate=None):
+    """
+    Gera um dict por linha válida do CSV de membros (colunas REQUIRED_COLUMNS,
+    mais gender e startdate opcionais). As linhas inválidas ou repetidas no
+    próprio ficheiro vão para reject(line_no, email, reason).
+    """
+    reader = csv.DictReader(stream)
+    missing = [column for column in REQUIRED_COLUMNS if column not in (reader.fieldnames or [])]
+    if missing:
+        raise ValueError(f'Colunas em falta no CSV: {", ".join(missing)}')
+
+    plans = get_catalog('plans')
+    seen_emails = set()
+    seen_nifs = set()
+    for line_no, row in enumerate(reader, start=2):
+        member = {key: (value or '').strip() for key, value in row.items() if key}
+        member['email'] = member['email'].lower()
+        member['line_no'] = line_no
+        member['birthdate'] = _parse_date(member['birthdate'])
+        member['startdate'] = _parse_date(member.get('startdate')) or default_startdate or date.today()
+        member['gender'] = member.get('gender') or None
+        member['planid'] = _resolve_plan(member['plan'], plans)
+
+        reason = None
+        if not member['name'] or len(member['name']) > 120:
+            reason = 'invalid_name'
+        elif not EMAIL_RE.match(member['email']) or len(member['email']) > 254:
+            reason = 'invalid_email'
+        elif len(member['password']) < 8:
+            reason = 'invalid_password'
+        elif not NIF_RE.match(member['nif']):
+            reason = 'invalid_nif'
+        elif not PHONE_RE.match(member['phone']) or len(member['phone']) > 15:
+            reason = 'invalid_phone'
+        elif not 15 <= len(member['iban']) <= 34:
+            reason = 'invalid_iban'
+        elif member['birthdate'] is None or not MIN_BIRTHDATE <= member['birthdate'] <= date.today():
+            reason = 'invalid_birthdate'
+        elif member['gender'] not in (None,) + GENDERS:
+            reason = 'invalid_gender'
+        elif (not member['address'] or len(member['address']) > 255
+              or not member['city'] or len(member['city']) > 100
+              or not member['postalcode'] or len(member['postalcode']) > 20):
+            reason = 'invalid_address'
+        elif member['planid'] is None:
+            reason = 'unknown_plan'
+        elif member['email'] in seen_emails or member['nif'] in seen_nifs:
+            reason = 'duplicate_in_file'
+
+        if reason:
+            reject(line_no, member['email'], reason)
+            continue
+        seen_emails.add(member['email'])
+        seen_nifs.add(member['nif'])
+        yield member
+
+
+def find_duplicates(members):
+    """{line_no: motivo} das linhas cujo email ou NIF já existe na base de dados"""
+    if not members:
+        return {}
+    with connection.cursor() as cursor:
+        cursor.execute(DUPLICATES_SQL, [
+            [member['line_no'] for member in members],
+            [member['email'] for member in members],
+            [member['nif'] for member in members],
+        ])
+        return dict(cursor.fetchall())
+
+
+def load_members(members):
+    """
+    Insere um lote (com as passwords já em hash) numa só transação: COPY para
+    a tabela de staging e um INSERT ... SELECT por tabela de destino.
+    Devolve (membros criados, [(line_no, email, motivo)] das linhas rejeitadas).
+    """
+    with transaction.atomic(), connection.cursor() as cursor:
+        cursor.execute(STAGING_TABLE_SQL)
+        copy_rows(cursor, 'import_member', STAGING_COLUMNS,
+                  ([member[column] for column in STAGING_COLUMNS] for member in members))
+        cursor.execute(INSERT_USERS_SQL, [MEMBER_USER_TYPE])
+        cursor.execute(INSERT_MEMBERS_SQL)
+        cursor.execute(DELETE_ORPHAN_USERS_SQL)
+        cursor.execute(INSERT_SUBSCRIPTIONS_SQL)
+        created = cursor.rowcount
+        cursor.execute(REJECTED_SQL)
+        rejected = cursor.fetchall()
+    return created, rejected
@@ -0,0 +1,93 @@
+MIN_QUERY_LENGTH = 3
+DEFAULT_LIMIT = 10
+MAX_LIMIT = 50
+
+# Os candidatos vêm de cada tabela em separado para que cada ramo use os seus
+# índices trigram (BitmapOr em USERS e em MEMBER); um OR sobre colunas das duas
+# tabelas depois do JOIN obrigaria a percorrer todos os membros. LIKE '%...%'
+# e o operador <% (word similarity, para erros de escrita) usam os índices
+# GIN ... gin_trgm_ops. Há um ramo por nível de relevância — prefixo (do
+# início ou de uma palavra do nome) > substring > só semelhança — e cada ramo
+# pára ao fim de %(limit)s linhas: um termo comum ("silva") nunca ordena o
+# conjunto inteiro de correspondências, só no máximo 5 × limit candidatos.
+SEARCH_SQL = """
+    WITH prefix_matches AS (
+        (SELECT u.userid FROM users u JOIN member m ON m.userid = u.userid
+         WHERE LOWER(u.name) LIKE %(prefix)s
+            OR LOWER(u.name) LIKE %(word_prefix)s
+            OR LOWER(u.email) LIKE %(prefix)s
+         LIMIT %(limit)s)
+        UNION ALL
+        (SELECT userid FROM member
+         WHERE nif::text LIKE %(prefix)s OR phone LIKE %(prefix)s
+         LIMIT %(limit)s)
+    ),
+    substring_matches AS (
+        (SELECT u.userid FROM users u JOIN member m ON m.userid = u.userid
+         WHERE LOWER(u.name) LIKE %(contains)s OR LOWER(u.email) LIKE %(contains)s
+         LIMIT %(limit)s)
+        UNION ALL
+        (SELECT userid FROM member
+         WHERE nif::text LIKE %(contains)s OR phone LIKE %(contains)s
+         LIMIT %(limit)s)
+    ),
+    fuzzy_matches AS (
+        SELECT u.userid FROM users u JOIN member m ON m.userid = u.userid
+        WHERE %(query)s <%% LOWER(u.name)
+        ORDER BY word_similarity(%(query)s, LOWER(u.name)) DESC
+        LIMIT %(limit)s
+    ),
+    candidates AS (
+        SELECT userid, MAX(rank) AS rank
+        FROM (
+            SELECT userid, 2 AS rank FROM prefix_matches
+            UNION ALL
+            SELECT userid, 1 FROM substring_matches
+            UNION ALL
+            SELECT userid, 0 FROM fuzzy_matches
+        ) matches
+        GROUP BY userid
+    )
+    SELECT m.memberid, u.name, u.email, m.phone, m.nif, m.isactive
+    FROM candidates c
+    JOIN member m ON m.userid = c.userid
+    JOIN users u ON u.userid = m.userid
+    ORDER BY c.rank DESC, word_similarity(%(query)s, LOWER(u.name)) DESC, u.name, m.memberid
+    LIMIT %(limit)s
+"""
+
+
+def normalize_query(text):
+    return ' '.join((text or '').split()).lower()
+
+
+def _escape_like(text):
+    return text.replace('\\', '\\\\').replace('%', '\\%').replace('_', '\\_')
+
+
+def search_params(query, limit=DEFAULT_LIMIT):
+    """Parâmetros de SEARCH_SQL para uma pesquisa já normalizada"""
+    pattern = _escape_like(query)
+    return {
+        'query': query,
+        'contains': f'%{pattern}%',
+        'prefix': f'{pattern}%',
+        'word_prefix': f'% {pattern}%',
+        'limit': max(1, min(limit, MAX_LIMIT)),
+    }
+
+
+def search_members(cursor, query, limit=DEFAULT_LIMIT):
+    """
+    Membros cujo nome, email, telefone ou NIF contém `query` (ou cujo nome é
+    parecido), ordenados por relevância. Pesquisas com menos de
+    MIN_QUERY_LENGTH caracteres não usam os índices trigram e devolvem [].
+    """
+    query = normalize_query(query)
+    if len(query) < MIN_QUERY_LENGTH:
+        return []
+    cursor.execute(SEARCH_SQL, search_params(query, limit))
+    return [
+        {'memberid': memberid, 'name': name, 'email': email, 'phone': phone, 'nif': nif, 'isactive': isactive}
+        for memberid, name, email, phone, nif, isactive in cursor.fetchall()
+    ]
@@ -0,0 +1,113 @@
+from django.db import connection
+
+SESSION_KEY = 'principal'
+
+MANAGER = 1
+INSTRUCTOR = 2
+MEMBER = 3
+
+
+class Principal:
+    """
+    Utilizador autenticado do pedido, resolvido uma única vez a partir da
+    sessão pelo PrincipalMiddleware (request.principal).
+    """
+
+    def __init__(self, userid, email, name, user_type_id, user_type, memberid=None, instructorid=None):
+        self.userid = userid
+        self.email = email
+        self.name = name
+        self.user_type_id = user_type_id
+        self.user_type = user_type
+        self.memberid = memberid
+        self.instructorid = instructorid
+
+    @property
+    def is_manager(self):
+        return self.user_type_id == MANAGER
+
+    @property
+    def is_instructor(self):
+        return self.user_type_id == INSTRUCTOR
+
+    @property
+    def is_member(self):
+        return self.user_type_id == MEMBER
+
+    def to_session(self):
+        return {
+            'userid': self.userid,
+            'email': self.email,
+            'name': self.name,
+            'user_type_id': self.user_type_id,
+            'user_type': self.user_type,
+            'memberid': self.memberid,
+            'instructorid': self.instructorid,
+        }
+
+    @classmethod
+    def from_session(cls, data):
+        return cls(
+            data['userid'], data['email'], data['name'], data['user_type_id'], data['user_type'],
+            memberid=data.get('memberid'), instructorid=data.get('instructorid'),
+        )
+
+    def as_user_data(self):
+        """Dicionário usado pelos templates (user_data)"""
+        return {
+            'userid': self.userid,
+            'email': self.email,
+            'user_name': self.name,
+            'user_type_id': self.user_type_id,
+            'user_type': self.user_type,
+            'memberid': self.memberid,
+            'instructorid': self.instructorid,
+            'is_authenticated': True
+        }
+
+    def resolve_domain_id(self):
+        """Obtém o memberid/instructorid do utilizador, se ainda não for conhecido"""
+        if self.is_member and self.memberid is None:
+            with connection.cursor() as cursor:
+                cursor.execute("SELECT memberid FROM member WHERE userid = %s", [self.userid])
+                row = cursor.fetchone()
+            self.memberid = row[0] if row else None
+            return self.memberid is not None
+        if self.is_instructor and self.instructorid is None:
+            with connection.cursor() as cursor:
+                cursor.execute("SELECT instructorid FROM instructor WHERE userid = %s", [self.userid])
+                row = cursor.fetchone()
+            self.instructorid = row[0] if row else None
+            return self.instructorid is not None
+        return False
+
+
+def login_principal(request, principal):
+    request.session.cycle_key()
+    request.session[SESSION_KEY] = principal.to_session()
+    request.principal = principal
+
+
+class PrincipalMiddleware:
+    """
+    Lê o utilizador da sessão uma vez por pedido e disponibiliza-o em
+    request.principal (None se não estiver autenticado).
+    """
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        request.principal = None
+        data = request.session.get(SESSION_KEY)
+        if data:
+            try:
+                principal = Principal.from_session(data)
+            except KeyError:
+                # Sessão num formato antigo: obriga a novo login
+                request.session.flush()
+            else:
+                if principal.resolve_domain_id():
+                    request.session[SESSION_KEY] = principal.to_session()
+                request.principal = principal
+        return self.get_response(request)
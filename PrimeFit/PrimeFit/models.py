@@ -50,13 +50,14 @@ class MemberStatsMonth(models.Model):
 
 # Model for vw_member_schedule_classes
 class MemberScheduleClasses(models.Model):
+    bookingid = models.IntegerField(primary_key=True)
     class_name = models.CharField(max_length=100)
     date = models.DateField()
     starttime = models.TimeField()
     endtime = models.TimeField()
     room = models.CharField(max_length=50)
     instructor_name = models.CharField(max_length=100)
-    userid = models.IntegerField()
+    memberid = models.IntegerField()
     
     class Meta:
         managed = False
@@ -71,7 +72,7 @@ class MemberAvailableClasses(models.Model):
     endtime = models.TimeField()
     room = models.CharField(max_length=50)
     instructor_name = models.CharField(max_length=100)
-    available_spots = models.IntegerField()
+    available_spots = models.IntegerField(null=True, blank=True)
     
     class Meta:
         managed = False
@@ -125,7 +126,6 @@ class InstructorClasses(models.Model):
     capacity = models.IntegerField()
     duration_minutes = models.IntegerField()
     instructorid = models.IntegerField()
-    userid = models.IntegerField()
     
     class Meta:
         managed = False
@@ -138,10 +138,9 @@ class ClassSchedules(models.Model):
     date = models.DateField()
     starttime = models.TimeField()
     endtime = models.TimeField()
-    maxparticipants = models.IntegerField()
+    maxparticipants = models.IntegerField(null=True, blank=True)
     room = models.CharField(max_length=50)
     instructorid = models.IntegerField()
-    userid = models.IntegerField()
     
     class Meta:
         managed = False
@@ -149,6 +148,7 @@ class ClassSchedules(models.Model):
 
 # Model for vw_dashboard_stats
 class DashboardStats(models.Model):
+    counterid = models.IntegerField(primary_key=True)
     total_members = models.IntegerField()
     total_instructors = models.IntegerField()
     active_memberships = models.IntegerField()
@@ -183,7 +183,7 @@ class AllClasses(models.Model):
     starttime = models.TimeField()
     endtime = models.TimeField()
     room = models.CharField(max_length=50)
-    maxparticipants = models.IntegerField()
+    maxparticipants = models.IntegerField(null=True, blank=True)
     
     class Meta:
         managed = False
@@ -226,6 +226,7 @@ class Payments(models.Model):
     paymentdate = models.DateField(null=True, blank=True)
     ispayed = models.BooleanField()
     paymentmethod = models.CharField(max_length=50, null=True, blank=True)
+    isoverdue = models.BooleanField()
     
     class Meta:
         managed = False
@@ -253,7 +254,6 @@ class MemberPaymentHistory(models.Model):
     payment_status = models.CharField(max_length=20)
     paymentdate = models.DateField(null=True, blank=True)
     memberid = models.IntegerField()
-    userid = models.IntegerField()
     
     class Meta:
         managed = False
@@ -268,7 +268,6 @@ class MemberCheckinHistory(models.Model):
     duration_hours = models.FloatField(null=True, blank=True)
     duration_formatted = models.CharField(max_length=50, null=True, blank=True)
     memberid = models.IntegerField()
-    userid = models.IntegerField()
     
     class Meta:
         managed = False
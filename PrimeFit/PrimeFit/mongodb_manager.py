@@ -1,61 +1,275 @@
 from django.conf import settings
+from django.core.exceptions import ImproperlyConfigured
 from pymongo import MongoClient
-from pymongo.errors import ConnectionFailure
+from pymongo.errors import PyMongoError
+from .async_db import on_server_loop
+from contextlib import asynccontextmanager
+import asyncio
+import inspect
 import logging
+import threading
+import time
 
 logger = logging.getLogger(__name__)
 
+
+def get_mongodb_settings():
+    mongodb_settings = getattr(settings, 'MONGODB_SETTINGS', {})
+    return {
+        'url': mongodb_settings.get('url', 'mongodb://localhost:27017/'),
+        'db': mongodb_settings.get('db', 'ProjetoBD2'),
+        'client_options': {
+            'maxPoolSize': mongodb_settings.get('max_pool_size', 50),
+            'minPoolSize': mongodb_settings.get('min_pool_size', 0),
+            'maxIdleTimeMS': mongodb_settings.get('max_idle_time_ms', 300000),
+            'serverSelectionTimeoutMS': mongodb_settings.get('server_selection_timeout_ms', 2000),
+            'connectTimeoutMS': mongodb_settings.get('connect_timeout_ms', 2000),
+        },
+        'breaker_threshold': mongodb_settings.get('breaker_threshold', 3),
+        'breaker_backoff': mongodb_settings.get('breaker_backoff', 1.0),
+        'breaker_max_backoff': mongodb_settings.get('breaker_max_backoff', 60.0),
+    }
+
+
+class CircuitBreaker:
+    """
+    Depois de `threshold` falhas seguidas o circuito abre e os pedidos falham
+    logo, sem tentar o MongoDB. Ao fim do back-off (exponencial: backoff,
+    2*backoff, ... até max_backoff) deixa passar uma tentativa de teste
+    (half-open): se correr bem fecha, se falhar volta a abrir por mais tempo.
+    """
+
+    CLOSED, OPEN, HALF_OPEN = 'closed', 'open', 'half-open'
+
+    def __init__(self, threshold=3, backoff=1.0, max_backoff=60.0):
+        self.threshold = threshold
+        self.backoff = backoff
+        self.max_backoff = max_backoff
+        self._lock = threading.Lock()
+        self._failures = 0
+        self._opened = 0
+        self._retry_at = 0.0
+        self._probing = False
+
+    @property
+    def state(self):
+        with self._lock:
+            if self._failures < self.threshold:
+                return self.CLOSED
+            return self.HALF_OPEN if time.monotonic() >= self._retry_at else self.OPEN
+
+    def allow(self):
+        """True se o pedido pode tentar o MongoDB (no máximo um teste em half-open)"""
+        with self._lock:
+            if self._failures < self.threshold:
+                return True
+            if time.monotonic() < self._retry_at or self._probing:
+                return False
+            self._probing = True
+            return True
+
+    def record_success(self):
+        with self._lock:
+            self._failures = 0
+            self._opened = 0
+            self._probing = False
+
+    def record_failure(self):
+        with self._lock:
+            self._failures += 1
+            self._probing = False
+            if self._failures >= self.threshold:
+                delay = min(self.backoff * (2 ** self._opened), self.max_backoff)
+                self._opened += 1
+                self._retry_at = time.monotonic() + delay
+                logger.warning('MongoDB circuit open for %.1fs after %d failures', delay, self._failures)
+
+
 class MongoDBManager:
     """
-    Classe para gerenciar conexões e operações com MongoDB
+    Classe para gerenciar conexões e operações com MongoDB.
+
+    A ligação é feita no primeiro uso (não no import) e o MongoClient mantém um
+    pool configurável em MONGODB_SETTINGS. Enquanto o circuito estiver aberto,
+    get_database() devolve None de imediato em vez de esperar pelo timeout.
     """
     _instance = None
     _client = None
     _db = None
-    
+
     def __new__(cls):
         if cls._instance is None:
             cls._instance = super(MongoDBManager, cls).__new__(cls)
+            cls._instance._lock = threading.Lock()
+            cls._instance._verified = False
+            cls._instance.config = get_mongodb_settings()
+            cls._instance.breaker = CircuitBreaker(
+                cls._instance.config['breaker_threshold'],
+                cls._instance.config['breaker_backoff'],
+                cls._instance.config['breaker_max_backoff'],
+            )
         return cls._instance
-    
-    def __init__(self):
-        if self._client is None:
-            self.connect()
-    
+
     def connect(self):
-        """Conecta ao MongoDB"""
+        """Cria o cliente (sem bloquear) e confirma a ligação com um ping"""
+        with self._lock:
+            if self._client is None:
+                self._client = MongoClient(self.config['url'], **self.config['client_options'])
+                self._db = self._client[self.config['db']]
         try:
-            mongodb_settings = getattr(settings, 'MONGODB_SETTINGS', {})
-            url = mongodb_settings.get('url', 'mongodb://localhost:27017/')
-            db_name = mongodb_settings.get('db', 'ProjetoBD2')
-            
-            self._client = MongoClient(url, serverSelectionTimeoutMS=5000)
-            # Testa a conexão
             self._client.admin.command('ping')
-            self._db = self._client[db_name]
-            logger.info(f"MongoDB connected successfully to {db_name}")
-            
-        except ConnectionFailure as e:
+        except PyMongoError as e:
             logger.error(f"Failed to connect to MongoDB: {e}")
-            self._client = None
-            self._db = None
-    
+            self._verified = False
+            self.breaker.record_failure()
+            return False
+        if not self._verified:
+            logger.info(f"MongoDB connected successfully to {self.config['db']}")
+        self._verified = True
+        self.breaker.record_success()
+        return True
+
     def get_database(self):
-        """Retorna a instância do banco MongoDB"""
-        if self._db is None:
-            self.connect()
+        """Retorna a instância do banco MongoDB, ou None se estiver indisponível"""
+        if not self.breaker.allow():
+            return None
+        if not self._verified or self.breaker.state != CircuitBreaker.CLOSED:
+            if not self.connect():
+                return None
         return self._db
-    
+
     def get_collection(self, collection_name):
         """Retorna uma coleção específica"""
         db = self.get_database()
         if db is not None:
             return db[collection_name]
         return None
-    
+
+    def report_failure(self, error):
+        """Chamado por quem usa as coleções quando uma operação falha"""
+        logger.warning(f"MongoDB operation failed: {error}")
+        self._verified = False
+        self.breaker.record_failure()
+
     def is_connected(self):
         """Verifica se está conectado ao MongoDB"""
-        return self._db is not None
+        return self._verified and self.breaker.state == CircuitBreaker.CLOSED
+
+    def close(self):
+        with self._lock:
+            if self._client is not None:
+                self._client.close()
+            self._client = None
+            self._db = None
+            self._verified = False
+
+
+def _async_client_class():
+    try:
+        from motor.motor_asyncio import AsyncIOMotorClient
+        return AsyncIOMotorClient
+    except ImportError:
+        pass
+    try:
+        from pymongo import AsyncMongoClient
+        return AsyncMongoClient
+    except ImportError:
+        raise ImproperlyConfigured(
+            'O cliente MongoDB assíncrono requer o motor ou pymongo >= 4.10'
+        )
+
+
+class AsyncMongoDBManager:
+    """
+    Variante assíncrona (motor, ou o AsyncMongoClient do pymongo) para as views
+    ASGI. Mesmas definições e o mesmo circuit breaker por instância; o cliente
+    é criado no primeiro uso, dentro do event loop que o vai usar.
+    """
+
+    def __init__(self):
+        self.config = get_mongodb_settings()
+        self.breaker = CircuitBreaker(
+            self.config['breaker_threshold'],
+            self.config['breaker_backoff'],
+            self.config['breaker_max_backoff'],
+        )
+        self._client = None
+        self._db = None
+        self._loop = None
+        self._verified = False
+
+    def _new_client(self):
+        return _async_client_class()(self.config['url'], **self.config['client_options'])
+
+    def _close_client(self, client, loop):
+        # motor fecha de forma síncrona; o AsyncMongoClient devolve uma corrotina,
+        # que tem de correr no loop a que o cliente pertence
+        result = client.close()
+        if inspect.isawaitable(result):
+            if loop is not None and not loop.is_closed() and loop.is_running():
+                asyncio.run_coroutine_threadsafe(result, loop)
+            else:
+                result.close()
+                logger.warning('Event loop do cliente MongoDB assíncrono terminou sem o fechar')
+
+    def _ensure_client(self):
+        loop = asyncio.get_running_loop()
+        if self._client is None or self._loop is not loop:
+            if self._client is not None:
+                self._close_client(self._client, self._loop)
+            self._client = self._new_client()
+            self._db = self._client[self.config['db']]
+            self._loop = loop
+            self._verified = False
+
+    async def get_database(self):
+        if not self.breaker.allow():
+            return None
+        self._ensure_client()
+        if not self._verified or self.breaker.state != CircuitBreaker.CLOSED:
+            try:
+                await self._client.admin.command('ping')
+            except PyMongoError as e:
+                logger.error(f"Failed to connect to MongoDB: {e}")
+                self.breaker.record_failure()
+                return None
+            self._verified = True
+            self.breaker.record_success()
+        return self._db
+
+    async def get_collection(self, collection_name):
+        db = await self.get_database()
+        if db is not None:
+            return db[collection_name]
+        return None
+
+    @asynccontextmanager
+    async def collection(self, collection_name):
+        """
+        Coleção para usar dentro do bloco (None se o MongoDB estiver em baixo).
+        No loop do servidor ASGI usa o cliente partilhado; noutro loop (ex.:
+        async_to_sync em WSGI, um loop por pedido) usa um cliente temporário,
+        fechado no fim do bloco.
+        """
+        if on_server_loop.get():
+            yield await self.get_collection(collection_name)
+            return
+        if not self.breaker.allow():
+            yield None
+            return
+        client = self._new_client()
+        try:
+            yield client[self.config['db']][collection_name]
+        finally:
+            result = client.close()
+            if inspect.isawaitable(result):
+                await result
+
+    def report_failure(self, error):
+        logger.warning(f"MongoDB operation failed: {error}")
+        self._verified = False
+        self.breaker.record_failure()
 
-# Instância global do gerenciador MongoDB
-mongo_manager = MongoDBManager()
\ No newline at end of file
+# Instâncias globais (não ligam ao MongoDB até ao primeiro uso)
+mongo_manager = MongoDBManager()
+async_mongo_manager = AsyncMongoDBManager()
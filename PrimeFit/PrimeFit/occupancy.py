@@ -0,0 +1,181 @@
+import asyncio
+import json
+import logging
+import queue
+import threading
+import time
+from datetime import date
+
+from django.conf import settings
+
+from .pg_listen import open_listen_connection, wait_for_notifies
+
+logger = logging.getLogger(__name__)
+
+CHANNEL = 'occupancy'
+
+OCCUPANCY_SQL = "SELECT hour, entries, exits, occupancy FROM vw_occupancy_today ORDER BY hour"
+
+
+def read_occupancy(cursor):
+    """Estado atual: pessoas no ginásio e a série por hora de hoje"""
+    cursor.execute(OCCUPANCY_SQL)
+    hours = [
+        {'hour': hour, 'entries': entries, 'exits': exits, 'occupancy': occupancy}
+        for hour, entries, exits, occupancy in cursor.fetchall()
+    ]
+    return {
+        'date': date.today().isoformat(),
+        'current': hours[-1]['occupancy'] if hours else 0,
+        'hours': hours,
+    }
+
+
+def _offer_latest(target, snapshot):
+    # Fila de tamanho 1: um cliente lento recebe só o estado mais recente
+    try:
+        target.get_nowait()
+    except (asyncio.QueueEmpty, queue.Empty):
+        pass
+    target.put_nowait(snapshot)
+
+
+class OccupancyBroadcaster:
+    """
+    Uma única ligação por processo faz LISTEN occupancy (o NOTIFY vem dos
+    triggers de CHECKIN) e relê o estado uma vez por rajada de notificações;
+    o resultado é entregue a todos os clientes SSE ligados, sem queries por
+    cliente. A thread só corre enquanto houver clientes.
+    """
+
+    def __init__(self, alias='default', min_interval=0.25, refresh=60.0):
+        self.alias = alias
+        self.min_interval = min_interval
+        self.refresh = refresh
+        self._subscribers = {}
+        self._lock = threading.Lock()
+        self._thread = None
+        self._latest = None
+
+    @property
+    def latest(self):
+        return self._latest
+
+    def subscribe(self):
+        """Fila (asyncio dentro de um event loop, senão queue.Queue) com o estado mais recente"""
+        try:
+            loop = asyncio.get_running_loop()
+            target = asyncio.Queue(maxsize=1)
+        except RuntimeError:
+            loop = None
+            target = queue.Queue(maxsize=1)
+        with self._lock:
+            self._subscribers[target] = loop
+            if self._latest is not None:
+                _offer_latest(target, self._latest)
+            if self._thread is None:
+                self._thread = threading.Thread(target=self._run, name='occupancy-listener', daemon=True)
+                self._thread.start()
+        return target
+
+    def unsubscribe(self, target):
+        with self._lock:
+            self._subscribers.pop(target, None)
+
+    @property
+    def subscriber_count(self):
+        return len(self._subscribers)
+
+    def publish(self, snapshot):
+        with self._lock:
+            self._latest = snapshot
+            subscribers = list(self._subscribers.items())
+        for target, loop in subscribers:
+            if loop is None:
+                _offer_latest(target, snapshot)
+                continue
+            try:
+                loop.call_soon_threadsafe(_offer_latest, target, snapshot)
+            except RuntimeError:
+                # Event loop já fechado: o cliente desligou-se sem unsubscribe
+                self.unsubscribe(target)
+
+    def _run(self):
+        backoff = 1.0
+        while True:
+            with self._lock:
+                if not self._subscribers:
+                    self._thread = None
+                    return
+            conn = None
+            try:
+                conn = open_listen_connection(self.alias, [CHANNEL])
+                self._listen(conn)
+                backoff = 1.0
+            except Exception as e:
+                logger.error(f"Occupancy listener failed: {e}")
+                time.sleep(backoff)
+                backoff = min(backoff * 2, 30.0)
+            finally:
+                if conn is not None:
+                    conn.close()
+
+    def _listen(self, conn):
+        # Lê o estado logo após o LISTEN para não perder alterações intermédias
+        with conn.cursor() as cursor:
+            self.publish(read_occupancy(cursor))
+        last_read = time.monotonic()
+        while self.subscriber_count:
+            notified = wait_for_notifies(conn, min(self.refresh, 5.0))
+            now = time.monotonic()
+            if not notified and now - last_read < self.refresh:
+                continue
+            if notified:
+                # Agrupa a rajada (ex.: um flush dos torniquetes) numa só leitura
+                time.sleep(max(0.0, self.min_interval - (now - last_read)))
+                wait_for_notifies(conn, 0)
+            with conn.cursor() as cursor:
+                self.publish(read_occupancy(cursor))
+            last_read = time.monotonic()
+
+
+occupancy_broadcaster = OccupancyBroadcaster(
+    min_interval=getattr(settings, 'OCCUPANCY_MIN_INTERVAL_MS', 250) / 1000,
+    refresh=getattr(settings, 'OCCUPANCY_REFRESH_SECONDS', 60),
+)
+
+
+def sse_message(snapshot, event='occupancy'):
+    return f'event: {event}\ndata: {json.dumps(snapshot)}\n\n'
+
+
+async def occupancy_stream(keepalive):
+    """Gerador SSE para servidores ASGI"""
+    target = occupancy_broadcaster.subscribe()
+    try:
+        yield 'retry: 5000\n\n'
+        while True:
+            try:
+                snapshot = await asyncio.wait_for(target.get(), keepalive)
+            except asyncio.TimeoutError:
+                yield ': keep-alive\n\n'
+                continue
+            yield sse_message(snapshot)
+    finally:
+        occupancy_broadcaster.unsubscribe(target)
+
+
+def occupancy_stream_sync(keepalive):
+    """Mesmo fluxo para WSGI (ocupa um worker por cliente; usar de preferência o ASGI)"""
+    target = occupancy_broadcaster.subscribe()
+    try:
+        yield 'retry: 5000\n\n'
+        while True:
+            try:
+                snapshot = target.get(timeout=keepalive)
+            except queue.Empty:
+                yield ': keep-alive\n\n'
+                continue
+            yield sse_message(snapshot)
+    finally:
+        occupancy_broadcaster.unsubscribe(target)
@@ -0,0 +1,138 @@
+from django.core import signing
+from django.core.exceptions import ValidationError
+from django.db.models import Q
+
+DEFAULT_PAGE_SIZE = 50
+MAX_PAGE_SIZE = 200
+CURSOR_SALT = 'primefit.keyset'
+
+
+class KeysetPage:
+    """
+    Uma página de resultados paginada por cursor (keyset).
+
+    Os cursores são opacos (assinados) e guardam os valores das colunas de
+    ordenação da primeira/última linha da página, por isso continuam estáveis
+    mesmo quando entram novas linhas na tabela.
+    """
+
+    def __init__(self, items, next_cursor=None, prev_cursor=None, page_size=DEFAULT_PAGE_SIZE):
+        self.items = items
+        self.next_cursor = next_cursor
+        self.prev_cursor = prev_cursor
+        self.page_size = page_size
+
+    @property
+    def has_next(self):
+        return self.next_cursor is not None
+
+    @property
+    def has_prev(self):
+        return self.prev_cursor is not None
+
+    def __iter__(self):
+        return iter(self.items)
+
+    def __len__(self):
+        return len(self.items)
+
+
+def get_page_size(request, default=DEFAULT_PAGE_SIZE):
+    """Lê o tamanho da página do pedido, limitado a MAX_PAGE_SIZE"""
+    try:
+        size = int(request.GET.get('page_size', default))
+    except (TypeError, ValueError):
+        return default
+    return max(1, min(size, MAX_PAGE_SIZE))
+
+
+def _parse_ordering(ordering):
+    return [(field.lstrip('-'), field.startswith('-')) for field in ordering]
+
+
+def _encode_value(value):
+    return value.isoformat() if hasattr(value, 'isoformat') else value
+
+
+def _encode_cursor(row, fields, direction):
+    return signing.dumps(
+        {'d': direction, 'k': [_encode_value(row[name]) for name, _ in fields]},
+        salt=CURSOR_SALT,
+        compress=True,
+    )
+
+
+def _decode_cursor(cursor, model, fields):
+    """Devolve (direção, valores) ou (None, None) se o cursor for inválido"""
+    try:
+        data = signing.loads(cursor, salt=CURSOR_SALT)
+        direction = data['d']
+        raw_values = data['k']
+        if direction not in ('next', 'prev') or len(raw_values) != len(fields):
+            return None, None
+        values = [
+            model._meta.get_field(name).to_python(raw)
+            for (name, _), raw in zip(fields, raw_values)
+        ]
+    except (signing.BadSignature, KeyError, TypeError, ValueError, ValidationError):
+        return None, None
+    return direction, values
+
+
+def _keyset_filter(fields, values, backwards):
+    """
+    Constrói a condição "linhas depois da posição" equivalente a uma
+    comparação de tuplos (a, b, c) > (x, y, z), respeitando a direção de
+    cada coluna. Expandida em ORs para o PostgreSQL poder usar o índice
+    composto sobre as colunas de ordenação.
+    """
+    condition = Q()
+    equal_prefix = Q()
+    for (name, descending), value in zip(fields, values):
+        lookup = 'lt' if descending != backwards else 'gt'
+        condition |= equal_prefix & Q(**{f'{name}__{lookup}': value})
+        equal_prefix &= Q(**{name: value})
+    return condition
+
+
+def keyset_paginate(queryset, ordering, cursor=None, page_size=DEFAULT_PAGE_SIZE):
+    """
+    Devolve uma única página do queryset, ordenada por `ordering`.
+
+    `ordering` segue a sintaxe de order_by (ex.: ['-duedate', '-paymentid']) e
+    o último campo tem de ser único para que o cursor seja determinístico.
+    O queryset deve ser um .values(...) que inclua todos os campos de ordenação.
+    Só são lidas page_size + 1 linhas, independentemente do tamanho da tabela.
+    """
+    fields = _parse_ordering(ordering)
+    direction, position = (None, None)
+    if cursor:
+        direction, position = _decode_cursor(cursor, queryset.model, fields)
+    backwards = direction == 'prev'
+
+    if position is not None:
+        queryset = queryset.filter(_keyset_filter(fields, position, backwards))
+
+    if backwards:
+        order = [name if descending else f'-{name}' for name, descending in fields]
+    else:
+        order = list(ordering)
+
+    rows = list(queryset.order_by(*order)[:page_size + 1])
+    has_more = len(rows) > page_size
+    rows = rows[:page_size]
+    if backwards:
+        rows.reverse()
+
+    if not rows:
+        return KeysetPage([], page_size=page_size)
+
+    has_next = has_more if not backwards else True
+    has_prev = position is not None if not backwards else has_more
+
+    return KeysetPage(
+        rows,
+        next_cursor=_encode_cursor(rows[-1], fields, 'next') if has_next else None,
+        prev_cursor=_encode_cursor(rows[0], fields, 'prev') if has_prev else None,
+        page_size=page_size,
+    )
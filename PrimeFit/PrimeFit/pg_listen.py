@@ -0,0 +1,31 @@
+import select
+
+from django.db import connections
+
+
+def open_listen_connection(alias, channels):
+    """
+    Ligação dedicada (fora do pool e das ligações do Django) em autocommit,
+    com LISTEN nos canais indicados: o LISTEN tem de sobreviver entre pedidos.
+    """
+    wrapper = connections[alias]
+    conn = wrapper.Database.connect(**wrapper.get_connection_params())
+    conn.autocommit = True
+    with conn.cursor() as cursor:
+        for channel in channels:
+            cursor.execute(f'LISTEN {channel}')
+    return conn
+
+
+def wait_for_notifies(conn, timeout):
+    """Espera até `timeout` segundos; devolve as notificações recebidas como (canal, payload)"""
+    if hasattr(conn, 'poll'):
+        # psycopg2
+        if select.select([conn], [], [], timeout) == ([], [], []):
+            return []
+        conn.poll()
+        notifies = [(notify.channel, notify.payload) for notify in conn.notifies]
+        conn.notifies.clear()
+        return notifies
+    # psycopg 3
+    return [(notify.channel, notify.payload) for notify in conn.notifies(timeout=timeout)]
@@ -0,0 +1,247 @@
+import csv
+import io
+from datetime import date
+from decimal import Decimal, InvalidOperation
+from xml.etree.ElementTree import iterparse
+
+from django.db import connection, transaction
+from django.utils.dateparse import parse_date
+
+from .bulk import copy_rows
+
+DEFAULT_METHOD = 'Transferência'
+
+# Nomes aceites para as colunas do extrato em CSV
+CSV_COLUMNS = {
+    'reference': ('reference', 'referencia', 'referência', 'ref'),
+    'amount': ('amount', 'montante', 'valor'),
+    'date': ('date', 'data', 'booking_date', 'data_movimento', 'data_valor'),
+    'method': ('method', 'metodo', 'método', 'paymentmethod'),
+}
+
+STATEMENT_COLUMNS = ['line_no', 'reference', 'amount', 'bookingdate', 'method']
+
+STATEMENT_TABLE_SQL = """
+    CREATE TEMP TABLE statement_line (
+        line_no INTEGER PRIMARY KEY,
+        reference VARCHAR(100) NOT NULL,
+        amount DECIMAL(10,2) NOT NULL,
+        bookingdate DATE NOT NULL,
+        method VARCHAR(50),
+        matched BOOLEAN NOT NULL DEFAULT FALSE
+    ) ON COMMIT DROP
+"""
+
+# Cada linha paga o pagamento por pagar mais antigo com a mesma referência e
+# valor (UQ_PAYMENT_REFERENCE começa por REFERENCE); se duas linhas apontarem
+# ao mesmo pagamento fica a primeira. PAYMENTDATE não pode ser anterior a
+# DUEDATE (CHK_PAYMENT_DATE), daí o GREATEST para pagamentos antecipados; um
+# pagamento liquidado deixa de estar em atraso (CHK_PAYMENT_OVERDUE).
+SETTLE_PAYMENTS_SQL = """
+    WITH candidates AS (
+        SELECT DISTINCT ON (s.line_no) s.line_no, p.paymentid, p.duedate, s.bookingdate, s.method
+        FROM statement_line s
+        JOIN payment p ON p.reference = s.reference AND p.amount = s.amount AND p.ispayed = false
+        ORDER BY s.line_no, p.duedate
+    ),
+    settled AS (
+        UPDATE payment p
+        SET ispayed = true,
+            paymentdate = GREATEST(m.bookingdate, p.duedate),
+            paymentmethod = COALESCE(m.method, %s),
+            isoverdue = false
+        FROM (
+            SELECT DISTINCT ON (paymentid, duedate) *
+            FROM candidates
+            ORDER BY paymentid, duedate, line_no
+        ) m
+        WHERE p.paymentid = m.paymentid AND p.duedate = m.duedate AND p.ispayed = false
+        RETURNING m.line_no
+    )
+    UPDATE statement_line s SET matched = true
+    FROM settled WHERE s.line_no = settled.line_no
+"""
+
+UNMATCHED_SQL = """
+    SELECT s.line_no, s.reference, s.amount, s.bookingdate,
+           CASE
+               WHEN r.unpaid_same_amount THEN 'duplicate_line'
+               WHEN r.unpaid THEN 'amount_mismatch'
+               WHEN r.found THEN 'already_paid'
+               ELSE 'unknown_reference'
+           END AS reason
+    FROM statement_line s
+    CROSS JOIN LATERAL (
+        SELECT COUNT(*) > 0 AS found,
+               COALESCE(bool_or(NOT p.ispayed), false) AS unpaid,
+               COALESCE(bool_or(NOT p.ispayed AND p.amount = s.amount), false) AS unpaid_same_amount
+        FROM payment p WHERE p.reference = s.reference
+    ) r
+    WHERE NOT s.matched
+    ORDER BY s.line_no
+"""
+
+
+class StatementError(ValueError):
+    pass
+
+
+def _parse_amount(value):
+    text = (value or '').strip().replace(' ', '')
+    if ',' in text:
+        # Formato português: 1.234,56
+        text = text.replace('.', '').replace(',', '.')
+    try:
+        return Decimal(text)
+    except InvalidOperation:
+        return None
+
+
+def _statement_line(line_no, reference, amount, booked, method, invalid):
+    """Valida uma linha com os limites das colunas de statement_line/payment"""
+    if not reference or len(reference) > 100:
+        invalid(line_no, reference, 'invalid_reference')
+    elif amount is None or not 0 < amount < 10 ** 8:
+        invalid(line_no, reference, 'invalid_amount')
+    elif booked is None:
+        invalid(line_no, reference, 'invalid_date')
+    else:
+        return line_no, reference, amount, booked, method
+    return None
+
+
+def _pick_column(fieldnames, key):
+    names = {name.strip().lower(): name for name in fieldnames or []}
+    for candidate in CSV_COLUMNS[key]:
+        if candidate in names:
+            return names[candidate]
+    return None
+
+
+def parse_csv_statement(stream, invalid):
+    """
+    Gera (line_no, reference, amount, bookingdate, method) a partir de um
+    extrato CSV com cabeçalho (',' ou ';'). As linhas inválidas são passadas
+    a invalid(line_no, reference, reason) e não são geradas.
+    """
+    sample = stream.read(4096)
+    try:
+        dialect = csv.Sniffer().sniff(sample, delimiters=',;\t')
+    except csv.Error:
+        raise StatementError('Não foi possível identificar o separador do CSV')
+    reader = csv.DictReader(_chain(sample, stream), dialect=dialect)
+    columns = {key: _pick_column(reader.fieldnames, key) for key in CSV_COLUMNS}
+    if columns['reference'] is None or columns['amount'] is None or columns['date'] is None:
+        raise StatementError('O CSV tem de ter colunas de referência, valor e data')
+
+    for line_no, row in enumerate(reader, start=2):
+        reference = (row.get(columns['reference']) or '').strip()
+        amount = _parse_amount(row.get(columns['amount']))
+        booked = _parse_statement_date(row.get(columns['date']))
+        method = None
+        if columns['method']:
+            method = (row.get(columns['method']) or '').strip()[:50] or None
+        line = _statement_line(line_no, reference, amount, booked, method, invalid)
+        if line:
+            yield line
+
+
+def _chain(sample, stream):
+    # Volta a juntar o início já lido pelo Sniffer ao resto do ficheiro, linha a linha
+    yield from io.StringIO(sample + stream.readline())
+    yield from stream
+
+
+def _parse_statement_date(value):
+    text = (value or '').strip()
+    if len(text) == 10 and text[2] in '/-' and text[5] in '/-':
+        # DD/MM/AAAA
+        try:
+            return date(int(text[6:]), int(text[3:5]), int(text[:2]))
+        except ValueError:
+            return None
+    try:
+        return parse_date(text[:10])
+    except ValueError:
+        return None
+
+
+def _local(tag):
+    return tag.rsplit('}', 1)[-1]
+
+
+def _find(element, *path):
+    for name in path:
+        if element is None:
+            return None
+        element = next((child for child in element if _local(child.tag) == name), None)
+    return element
+
+
+def _text(element, *path):
+    found = _find(element, *path)
+    return found.text.strip() if found is not None and found.text else None
+
+
+def parse_camt_statement(stream, invalid):
+    """
+    Gera as entradas a crédito (<Ntry>) de um extrato CAMT.053/054. O XML é
+    lido com iterparse e cada entrada é descartada depois de processada, por
+    isso a memória não cresce com o tamanho do ficheiro. A referência vem da
+    referência estruturada do credor ou, na falta dela, do texto livre.
+    """
+    line_no = 0
+    parents = []
+    for event, element in iterparse(stream, events=('start', 'end')):
+        if event == 'start':
+            parents.append(element)
+            continue
+        parents.pop()
+        if _local(element.tag) != 'Ntry':
+            continue
+
+        line_no += 1
+        details = _find(element, 'NtryDtls', 'TxDtls')
+        reference = (
+            _text(details, 'RmtInf', 'Strd', 'CdtrRefInf', 'Ref')
+            or _text(details, 'RmtInf', 'Ustrd')
+            or _text(element, 'NtryRef')
+            or ''
+        )
+        amount = _parse_amount(_text(element, 'Amt'))
+        booked = _parse_statement_date(_text(element, 'BookgDt', 'Dt') or _text(element, 'BookgDt', 'DtTm'))
+        credit = _text(element, 'CdtDbtInd') in (None, 'CRDT')
+
+        if not credit:
+            invalid(line_no, reference, 'debit_entry')
+        else:
+            line = _statement_line(line_no, reference, amount, booked, None, invalid)
+            if line:
+                yield line
+
+        # Retira a entrada já tratada da árvore
+        parents[-1].remove(element)
+
+
+def reconcile_statement(lines, report=None, default_method=DEFAULT_METHOD):
+    """
+    Carrega as linhas do extrato numa tabela temporária com COPY e liquida
+    todos os pagamentos correspondentes com um único UPDATE ... FROM. As
+    linhas sem correspondência são passadas a report(line_no, reference,
+    amount, bookingdate, reason), lidas com um cursor do lado do servidor.
+    Devolve (linhas carregadas, pagamentos liquidados).
+    """
+    with transaction.atomic():
+        with connection.cursor() as cursor:
+            cursor.execute(STATEMENT_TABLE_SQL)
+            loaded = copy_rows(cursor, 'statement_line', STATEMENT_COLUMNS, lines)
+            cursor.execute('ANALYZE statement_line')
+            cursor.execute(SETTLE_PAYMENTS_SQL, [default_method])
+            settled = cursor.rowcount
+
+        if report is not None:
+            with connection.chunked_cursor() as cursor:
+                cursor.execute(UNMATCHED_SQL)
+                for row in cursor:
+                    report(*row)
+    return loaded, settled
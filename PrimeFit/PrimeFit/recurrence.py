@@ -0,0 +1,379 @@
+import calendar
+from datetime import date, datetime, timedelta
+
+from django.db import connection, transaction
+
+from .bulk import copy_rows
+
+WEEKDAYS = {'MO': 0, 'TU': 1, 'WE': 2, 'TH': 3, 'FR': 4, 'SA': 5, 'SU': 6}
+FREQUENCIES = ('DAILY', 'WEEKLY', 'MONTHLY')
+
+# Limite de segurança para regras sem COUNT nem UNTIL
+MAX_OCCURRENCES = 10000
+# Períodos seguidos sem nenhuma data (ex.: BYMONTHDAY=30 só em fevereiro) até
+# a regra ser considerada inválida
+MAX_EMPTY_PERIODS = 1000
+
+RECURRENCES_SQL = """
+    SELECT r.recurrenceid, r.classid, r.rrule, r.dtstart, r.starttime,
+           COALESCE(r.endtime, (r.starttime + c.duration_minutes * INTERVAL '1 minute')::time) AS endtime,
+           COALESCE(r.maxparticipants, c.capacity) AS maxparticipants,
+           r.exdates, r.isactive AND c.isactive AS isactive
+    FROM classrecurrence r
+    JOIN class c ON c.classid = r.classid
+    WHERE %(classids)s::int[] IS NULL OR r.classid = ANY(%(classids)s::int[])
+    ORDER BY r.recurrenceid
+"""
+
+OCCURRENCE_COLUMNS = ['recurrenceid', 'classid', 'date', 'starttime', 'endtime', 'maxparticipants']
+
+OCCURRENCE_TABLE_SQL = """
+    CREATE TEMP TABLE schedule_occurrence (
+        recurrenceid INTEGER NOT NULL,
+        classid INTEGER NOT NULL,
+        date DATE NOT NULL,
+        starttime TIME NOT NULL,
+        endtime TIME NOT NULL,
+        maxparticipants INTEGER NOT NULL,
+        PRIMARY KEY (classid, date, starttime)
+    ) ON COMMIT DROP
+"""
+
+# Agenda resultante no horizonte: as ocorrências geradas mais as sessões
+# ativas que não são substituídas (mesma chave de UQ_CLASS_DATETIME) nem
+# canceladas (geradas por uma das recorrências sincronizadas). Cada sessão
+# conta uma vez por sala e outra por instrutor. Ordenadas por início dentro
+# de cada recurso, uma sessão sobrepõe-se a uma anterior quando começa antes
+# do maior fim visto até aí: um só varrimento (window function) em vez de
+# comparar todos os pares.
+CONFLICTS_SQL = """
+    WITH slots AS (
+        SELECT o.classid, o.date, o.starttime, o.endtime
+        FROM schedule_occurrence o
+        UNION ALL
+        SELECT cs.classid, cs.date, cs.starttime, cs.endtime
+        FROM classschedule cs
+        WHERE cs.isactive = true
+          AND cs.date BETWEEN %(first)s AND %(last)s
+          AND (cs.recurrenceid IS NULL OR NOT cs.recurrenceid = ANY(%(recurrenceids)s::int[]))
+          AND NOT EXISTS (
+              SELECT 1 FROM schedule_occurrence o
+              WHERE o.classid = cs.classid AND o.date = cs.date AND o.starttime = cs.starttime
+          )
+    ),
+    resources AS (
+        SELECT 'room' AS kind, c.room AS resource, s.classid, c.name,
+               s.date + s.starttime AS starts, s.date + s.endtime AS ends
+        FROM slots s JOIN class c ON c.classid = s.classid
+        UNION ALL
+        SELECT 'instructor', c.instructorid::text, s.classid, c.name,
+               s.date + s.starttime, s.date + s.endtime
+        FROM slots s JOIN class c ON c.classid = s.classid
+    ),
+    swept AS (
+        SELECT *, MAX(ends) OVER (
+            PARTITION BY kind, resource ORDER BY starts, ends, classid
+            ROWS BETWEEN UNBOUNDED PRECEDING AND 1 PRECEDING
+        ) AS previous_end
+        FROM resources
+    )
+    SELECT DISTINCT ON (s.kind, s.resource, s.starts, s.classid)
+           s.kind, s.resource, s.starts, s.ends, s.classid, s.name,
+           p.starts, p.ends, p.classid, p.name
+    FROM swept s
+    JOIN swept p ON p.kind = s.kind AND p.resource = s.resource
+                AND p.ends = s.previous_end AND p.starts <= s.starts
+                AND (p.starts, p.ends, p.classid) < (s.starts, s.ends, s.classid)
+    WHERE s.previous_end > s.starts
+    ORDER BY s.kind, s.resource, s.starts, s.classid, p.starts
+"""
+
+# Sessões já existentes com a mesma chave são reaproveitadas (também as
+# criadas à mão), sem baixar a lotação abaixo das reservas já feitas
+UPDATE_OCCURRENCES_SQL = """
+    UPDATE classschedule cs
+    SET endtime = o.endtime,
+        maxparticipants = GREATEST(o.maxparticipants, cs.booked_count),
+        isactive = true,
+        recurrenceid = o.recurrenceid
+    FROM schedule_occurrence o
+    WHERE cs.classid = o.classid AND cs.date = o.date AND cs.starttime = o.starttime
+      AND (cs.endtime, cs.maxparticipants, cs.isactive, cs.recurrenceid)
+          IS DISTINCT FROM (o.endtime, GREATEST(o.maxparticipants, cs.booked_count), true, o.recurrenceid)
+"""
+
+INSERT_OCCURRENCES_SQL = """
+    INSERT INTO classschedule (classid, date, starttime, endtime, maxparticipants, recurrenceid)
+    SELECT o.classid, o.date, o.starttime, o.endtime, o.maxparticipants, o.recurrenceid
+    FROM schedule_occurrence o
+    WHERE NOT EXISTS (
+        SELECT 1 FROM classschedule cs
+        WHERE cs.classid = o.classid AND cs.date = o.date AND cs.starttime = o.starttime
+    )
+    ORDER BY o.date, o.starttime
+    ON CONFLICT (classid, date, starttime) DO NOTHING
+"""
+
+# Ocorrências que a regra deixou de gerar (servido por IDX_CLASSSCHEDULE_RECURRENCE);
+# as reservas ficam associadas à sessão cancelada
+CANCEL_OCCURRENCES_SQL = """
+    WITH cancelled AS (
+        UPDATE classschedule cs
+        SET isactive = false
+        WHERE cs.recurrenceid = ANY(%(recurrenceids)s::int[])
+          AND cs.date BETWEEN %(first)s AND %(last)s
+          AND cs.isactive = true
+          AND NOT EXISTS (
+              SELECT 1 FROM schedule_occurrence o
+              WHERE o.classid = cs.classid AND o.date = cs.date AND o.starttime = cs.starttime
+          )
+        RETURNING cs.booked_count
+    )
+    SELECT COUNT(*), COUNT(*) FILTER (WHERE booked_count > 0) FROM cancelled
+"""
+
+
+class RecurrenceError(ValueError):
+    pass
+
+
+class ScheduleConflict(Exception):
+    """A agenda resultante tem sobreposições de sala ou de instrutor"""
+
+    def __init__(self, conflicts):
+        super().__init__(f'{len(conflicts)} sobreposições na agenda')
+        self.conflicts = conflicts
+
+
+def _parse_byday(value):
+    days = []
+    for item in value.split(','):
+        item = item.strip().upper()
+        weekday = WEEKDAYS.get(item[-2:])
+        ordinal = item[:-2]
+        if weekday is None or (ordinal and not ordinal.lstrip('+-').isdigit()):
+            raise RecurrenceError(f'BYDAY inválido: {item}')
+        days.append((int(ordinal) if ordinal else None, weekday))
+    return days
+
+
+def parse_rrule(text):
+    """
+    Converte uma regra 'FREQ=WEEKLY;INTERVAL=2;BYDAY=MO,WE;UNTIL=20261231'
+    num dict com freq, interval, byday [(ordinal, dia)], bymonthday, count e until.
+    """
+    rule = {'freq': None, 'interval': 1, 'byday': [], 'bymonthday': [], 'count': None, 'until': None}
+    for part in (text or '').strip().upper().removeprefix('RRULE:').split(';'):
+        if not part:
+            continue
+        key, _, value = part.partition('=')
+        try:
+            if key == 'FREQ':
+                if value not in FREQUENCIES:
+                    raise RecurrenceError(f'FREQ não suportada: {value}')
+                rule['freq'] = value
+            elif key == 'INTERVAL':
+                rule['interval'] = int(value)
+            elif key == 'BYDAY':
+                rule['byday'] = _parse_byday(value)
+            elif key == 'BYMONTHDAY':
+                rule['bymonthday'] = [int(day) for day in value.split(',')]
+            elif key == 'COUNT':
+                rule['count'] = int(value)
+            elif key == 'UNTIL':
+                rule['until'] = datetime.strptime(value[:8], '%Y%m%d').date()
+            elif key != 'WKST':
+                raise RecurrenceError(f'Parte da regra não suportada: {key}')
+        except RecurrenceError:
+            raise
+        except ValueError:
+            raise RecurrenceError(f'Valor inválido em {part}')
+    if rule['freq'] is None:
+        raise RecurrenceError('A regra tem de indicar FREQ')
+    if rule['interval'] < 1 or (rule['count'] is not None and rule['count'] < 1):
+        raise RecurrenceError('INTERVAL e COUNT têm de ser positivos')
+    if any(ordinal is not None for ordinal, _ in rule['byday']) and rule['freq'] != 'MONTHLY':
+        raise RecurrenceError('BYDAY com ordinal (ex.: 1MO, -1FR) só em FREQ=MONTHLY')
+    if any(not 1 <= abs(day) <= 31 for day in rule['bymonthday']):
+        raise RecurrenceError('BYMONTHDAY tem de estar entre 1 e 31 (ou -31 e -1)')
+    return rule
+
+
+def _month_days(year, month, rule, dtstart):
+    days_in_month = calendar.monthrange(year, month)[1]
+    days = set()
+    for day in rule['bymonthday']:
+        day = day if day > 0 else days_in_month + day + 1
+        if 1 <= day <= days_in_month:
+            days.add(day)
+    for ordinal, weekday in rule['byday']:
+        matching = [day for day in range(1, days_in_month + 1) if calendar.weekday(year, month, day) == weekday]
+        if ordinal is None:
+            days.update(matching)
+        elif 1 <= abs(ordinal) <= len(matching):
+            days.add(matching[ordinal - 1 if ordinal > 0 else ordinal])
+    if not rule['bymonthday'] and not rule['byday'] and dtstart.day <= days_in_month:
+        # Como no RFC 5545, os meses sem esse dia (ex.: 31) são saltados
+        days.add(dtstart.day)
+    return [date(year, month, day) for day in sorted(days)]
+
+
+def _periods(rule, dtstart):
+    # Gera (início do período, datas do período) por ordem, a partir do período de dtstart
+    interval = rule['interval']
+    weekdays = sorted({weekday for _, weekday in rule['byday']})
+    if rule['freq'] == 'DAILY':
+        day = dtstart
+        while True:
+            yield day, [day] if not weekdays or day.weekday() in weekdays else []
+            day += timedelta(days=interval)
+    elif rule['freq'] == 'WEEKLY':
+        week = dtstart - timedelta(days=dtstart.weekday())
+        while True:
+            yield week, [week + timedelta(days=weekday) for weekday in weekdays or [dtstart.weekday()]]
+            week += timedelta(weeks=interval)
+    else:
+        year, month = dtstart.year, dtstart.month
+        while True:
+            yield date(year, month, 1), _month_days(year, month, rule, dtstart)
+            month += interval
+            year, month = year + (month - 1) // 12, (month - 1) % 12 + 1
+
+
+def _candidates(rule, dtstart, until):
+    """
+    Datas da regra por ordem até ao período que começa depois de `until`. O fim
+    é verificado por período, não por data, para terminar mesmo quando os
+    períodos não geram datas.
+    """
+    empty = 0
+    try:
+        for start, days in _periods(rule, dtstart):
+            if start > until:
+                return
+            if days:
+                empty = 0
+                yield from days
+            else:
+                empty += 1
+                if empty >= MAX_EMPTY_PERIODS:
+                    raise RecurrenceError(f'A regra não gera datas em {MAX_EMPTY_PERIODS} períodos seguidos')
+    except OverflowError:
+        # Passou de date.max: não há mais datas possíveis
+        return
+
+
+def expand(rule, dtstart, first, last, exdates=()):
+    """
+    Datas da regra entre first e last (inclusive). COUNT conta a partir de
+    dtstart, como no RFC 5545; as datas de exdates são retiradas depois.
+    """
+    until = min(filter(None, (rule['until'], last)))
+    exdates = set(exdates or ())
+    dates = []
+    generated = 0
+    for day in _candidates(rule, dtstart, until):
+        if day < dtstart:
+            continue
+        if day > until or generated == (rule['count'] or MAX_OCCURRENCES):
+            break
+        generated += 1
+        if day >= first and day not in exdates:
+            dates.append(day)
+    return dates
+
+
+def load_recurrences(classids=None):
+    with connection.cursor() as cursor:
+        cursor.execute(RECURRENCES_SQL, {'classids': classids})
+        columns = [column[0] for column in cursor.description]
+        return [dict(zip(columns, row)) for row in cursor.fetchall()]
+
+
+def expand_recurrences(recurrences, first, last, invalid):
+    """
+    Gera as linhas de schedule_occurrence das recorrências ativas. As regras
+    inválidas são passadas a invalid(recurrenceid, reason); as suas sessões
+    não são geradas nem canceladas.
+    """
+    seen = set()
+    for recurrence in recurrences:
+        if not recurrence['isactive']:
+            continue
+        if recurrence['endtime'] is None or recurrence['endtime'] <= recurrence['starttime']:
+            invalid(recurrence['recurrenceid'], 'A aula não tem duração ou termina depois da meia-noite')
+            continue
+        try:
+            rule = parse_rrule(recurrence['rrule'])
+            days = expand(rule, recurrence['dtstart'], first, last, recurrence['exdates'])
+        except RecurrenceError as e:
+            invalid(recurrence['recurrenceid'], str(e))
+            continue
+        for day in days:
+            key = (recurrence['classid'], day, recurrence['starttime'])
+            if key in seen:
+                # Duas recorrências da mesma aula à mesma hora: fica a primeira
+                continue
+            seen.add(key)
+            yield (recurrence['recurrenceid'], recurrence['classid'], day,
+                   recurrence['starttime'], recurrence['endtime'], recurrence['maxparticipants'])
+
+
+def sync_class_schedules(first, last, classids=None, allow_conflicts=False, dry_run=False, invalid=None):
+    """
+    Expande as recorrências entre first e last e aplica a diferença em
+    CLASSSCHEDULE numa só transação: COPY das ocorrências para uma tabela
+    temporária e um UPDATE, um INSERT e um cancelamento (isactive = false)
+    set-based. As sobreposições de sala/instrutor da agenda resultante são
+    verificadas antes; se existirem levanta ScheduleConflict (a não ser com
+    allow_conflicts). Devolve um dict com as contagens e as sobreposições.
+    """
+    invalid_ids = []
+
+    def report_invalid(recurrenceid, reason):
+        invalid_ids.append(recurrenceid)
+        if invalid is not None:
+            invalid(recurrenceid, reason)
+
+    recurrences = load_recurrences(classids)
+    with transaction.atomic(), connection.cursor() as cursor:
+        cursor.execute(OCCURRENCE_TABLE_SQL)
+        occurrences = copy_rows(cursor, 'schedule_occurrence', OCCURRENCE_COLUMNS,
+                                expand_recurrences(recurrences, first, last, report_invalid))
+        cursor.execute('ANALYZE schedule_occurrence')
+
+        params = {
+            'first': first,
+            'last': last,
+            'recurrenceids': [r['recurrenceid'] for r in recurrences if r['recurrenceid'] not in invalid_ids],
+        }
+        cursor.execute(CONFLICTS_SQL, params)
+        conflicts = [
+            {
+                'kind': row[0], 'resource': row[1],
+                'starts': row[2], 'ends': row[3], 'classid': row[4], 'name': row[5],
+                'other_starts': row[6], 'other_ends': row[7], 'other_classid': row[8], 'other_name': row[9],
+            }
+            for row in cursor.fetchall()
+        ]
+        if conflicts and not allow_conflicts:
+            raise ScheduleConflict(conflicts)
+
+        cursor.execute(UPDATE_OCCURRENCES_SQL)
+        updated = cursor.rowcount
+        cursor.execute(INSERT_OCCURRENCES_SQL)
+        inserted = cursor.rowcount
+        cursor.execute(CANCEL_OCCURRENCES_SQL, params)
+        cancelled, cancelled_with_bookings = cursor.fetchone()
+
+        if dry_run:
+            transaction.set_rollback(True)
+
+    return {
+        'occurrences': occurrences,
+        'inserted': inserted,
+        'updated': updated,
+        'cancelled': cancelled,
+        'cancelled_with_bookings': cancelled_with_bookings,
+        'conflicts': conflicts,
+    }
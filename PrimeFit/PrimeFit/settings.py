@@ -25,7 +25,7 @@ def get_env(key, default=None, cast=None):
     value = os.getenv(key, default)
     if cast and value is not None:
         if cast == bool:
-            return value.lower() in ('true', '1', 'yes', 'on')
+            return str(value).lower() in ('true', '1', 'yes', 'on')
         return cast(value)
     return value
 
@@ -63,12 +63,15 @@ INSTALLED_APPS = [
 ]
 
 MIDDLEWARE = [
+    'PrimeFit.instrumentation.InstrumentationMiddleware',
     'django.middleware.security.SecurityMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
     'django.middleware.common.CommonMiddleware',
     'django.middleware.csrf.CsrfViewMiddleware',
     'django.contrib.auth.middleware.AuthenticationMiddleware',
     'django.contrib.messages.middleware.MessageMiddleware',
+    'PrimeFit.middleware.PrincipalMiddleware',
+    'PrimeFit.db_router.DatabaseAliasMiddleware',
     'django.middleware.clickjacking.XFrameOptionsMiddleware',
 ]
 
@@ -84,6 +87,7 @@ TEMPLATES = [
                 'django.template.context_processors.request',
                 'django.contrib.auth.context_processors.auth',
                 'django.contrib.messages.context_processors.messages',
+                'PrimeFit.instrumentation.render_timer',
             ],
         },
     },
@@ -96,41 +100,54 @@ WSGI_APPLICATION = 'PrimeFit.wsgi.application'
 # https://docs.djangoproject.com/en/5.2/ref/settings/#databases
 
 # Configuração PostgreSQL
-DATABASES = {
-    'default': {
-        'ENGINE': 'django.db.backends.postgresql',
-        'NAME': get_env('POSTGRES_DB', 'primefit_db'),
-        'USER': get_env('POSTGRES_USER'),
-        'PASSWORD': get_env('POSTGRES_PASSWORD'),
-        'HOST': get_env('POSTGRES_HOST'),
-        'PORT': get_env('POSTGRES_PORT'),
-    },
-    'instructor': {
-        'ENGINE': 'django.db.backends.postgresql',
-        'NAME': get_env('POSTGRES_DB', 'primefit_db'),
-        'USER': get_env('POSTGRES_USERINSTRUCTOR'),
-        'PASSWORD': get_env('POSTGRES_PASSWORD'),
-        'HOST': get_env('POSTGRES_HOST'),
-        'PORT': get_env('POSTGRES_PORT'),
-    },
-    'member': {
-        'ENGINE': 'django.db.backends.postgresql',
-        'NAME': get_env('POSTGRES_DB', 'primefit_db'),
-        'USER': get_env('POSTGRES_USERINSTRUCTOR'),
-        'PASSWORD': get_env('POSTGRES_PASSWORD'),
-        'HOST': get_env('POSTGRES_HOST'),
-        'PORT': get_env('POSTGRES_PORT'),
-    },
-    'admin': {
+# Cada perfil (gestor/instrutor/membro) usa o seu alias e o seu utilizador de BD;
+# o alias é escolhido por pedido pelo PrimeFit.db_router.
+# Com DB_POOL ativo (requer psycopg 3 + psycopg_pool) cada alias tem um pool
+# limitado e verificado antes de cada uso; sem pool, as ligações persistem
+# CONN_MAX_AGE segundos por worker.
+DB_POOL = get_env('DB_POOL', False, cast=bool)
+
+def database_settings(alias, user):
+    config = {
         'ENGINE': 'django.db.backends.postgresql',
         'NAME': get_env('POSTGRES_DB', 'primefit_db'),
-        'USER': get_env('POSTGRES_USERADMIN'),
+        'USER': user,
         'PASSWORD': get_env('POSTGRES_PASSWORD', ''),
         'HOST': get_env('POSTGRES_HOST'),
         'PORT': get_env('POSTGRES_PORT'),
+        'CONN_HEALTH_CHECKS': True,
+        'CONN_MAX_AGE': 0 if DB_POOL else get_env('DB_CONN_MAX_AGE', 60, cast=int),
+        'OPTIONS': {},
     }
+    if DB_POOL:
+        suffix = alias.upper()
+        config['OPTIONS']['pool'] = {
+            'min_size': get_env(f'DB_POOL_MIN_SIZE_{suffix}', get_env('DB_POOL_MIN_SIZE', 2), cast=int),
+            'max_size': get_env(f'DB_POOL_MAX_SIZE_{suffix}', get_env('DB_POOL_MAX_SIZE', 10), cast=int),
+            'max_idle': get_env(f'DB_POOL_MAX_IDLE_{suffix}', get_env('DB_POOL_MAX_IDLE', 300), cast=float),
+            'timeout': get_env('DB_POOL_TIMEOUT', 10, cast=float),
+        }
+    return config
+
+DATABASES = {
+    'default': database_settings('default', get_env('POSTGRES_USER')),
+    'instructor': database_settings('instructor', get_env('POSTGRES_USERINSTRUCTOR')),
+    'member': database_settings('member', get_env('POSTGRES_USERMEMBER', get_env('POSTGRES_USERINSTRUCTOR'))),
+    'admin': database_settings('admin', get_env('POSTGRES_USERADMIN')),
 }
 
+DATABASE_ROUTERS = ['PrimeFit.db_router.RoleDatabaseRouter']
+
+# Views assíncronas (PrimeFit.async_db, só sob ASGI)
+# Usam um AsyncConnectionPool do psycopg 3 por alias, separado das ligações do
+# Django, para lançar em paralelo as queries independentes de cada página.
+# Com ASYNC_VIEWS as rotas principais apontam para as versões assíncronas;
+# estas estão sempre disponíveis também em /async/...
+ASYNC_VIEWS = get_env('ASYNC_VIEWS', False, cast=bool)
+ASYNC_DB_POOL_MIN_SIZE = get_env('ASYNC_DB_POOL_MIN_SIZE', 1, cast=int)
+ASYNC_DB_POOL_MAX_SIZE = get_env('ASYNC_DB_POOL_MAX_SIZE', 10, cast=int)
+ASYNC_DB_POOL_TIMEOUT = get_env('ASYNC_DB_POOL_TIMEOUT', 10, cast=float)
+
 
 # Password validation
 # https://docs.djangoproject.com/en/5.2/ref/settings/#auth-password-validators
@@ -150,11 +167,133 @@ AUTH_PASSWORD_VALIDATORS = [
     },
 ]
 
+# Password hashing
+# PASSWORD_HASHER escolhe o algoritmo dos novos hashes ('pbkdf2', 'scrypt' ou
+# 'argon2', este último requer argon2-cffi). Os restantes continuam na lista para
+# verificar hashes antigos, que são refeitos com o algoritmo atual no login.
+PASSWORD_HASHER = get_env('PASSWORD_HASHER', 'pbkdf2')
+PASSWORD_HASHER_CLASSES = {
+    'pbkdf2': 'django.contrib.auth.hashers.PBKDF2PasswordHasher',
+    'scrypt': 'PrimeFit.hashing.TunedScryptPasswordHasher',
+    'argon2': 'PrimeFit.hashing.TunedArgon2PasswordHasher',
+}
+PASSWORD_HASHERS = [PASSWORD_HASHER_CLASSES[PASSWORD_HASHER]] + [
+    hasher for name, hasher in PASSWORD_HASHER_CLASSES.items() if name != PASSWORD_HASHER
+] + ['django.contrib.auth.hashers.PBKDF2SHA1PasswordHasher']
+
+ARGON2_TIME_COST = get_env('ARGON2_TIME_COST', 2, cast=int)
+ARGON2_MEMORY_COST = get_env('ARGON2_MEMORY_COST', 65536, cast=int)  # KiB
+ARGON2_PARALLELISM = get_env('ARGON2_PARALLELISM', 1, cast=int)
+SCRYPT_WORK_FACTOR = get_env('SCRYPT_WORK_FACTOR', 2 ** 14, cast=int)
+
+# Pool de hashing: no máximo WORKERS hashes em paralelo e MAX_PENDING em fila;
+# acima disso o login/registo responde 503 em vez de acumular pedidos
+PASSWORD_HASHING_WORKERS = get_env('PASSWORD_HASHING_WORKERS', os.cpu_count() or 1, cast=int)
+PASSWORD_HASHING_MAX_PENDING = get_env('PASSWORD_HASHING_MAX_PENDING', PASSWORD_HASHING_WORKERS * 4, cast=int)
+
 # Authentication settings
 LOGIN_URL = '/login/'
 LOGIN_REDIRECT_URL = '/member/home/'
 LOGOUT_REDIRECT_URL = '/login/'
 
+# Cache
+# CACHE_BACKEND: 'locmem' (LRU em memória, por processo), 'memcached' ou 'redis'
+# (partilhado entre workers, CACHE_LOCATION = endereço do servidor)
+CACHE_BACKENDS = {
+    'locmem': 'django.core.cache.backends.locmem.LocMemCache',
+    'memcached': 'django.core.cache.backends.memcached.PyMemcacheCache',
+    'redis': 'django.core.cache.backends.redis.RedisCache',
+}
+CACHE_BACKEND = get_env('CACHE_BACKEND', 'locmem')
+
+CACHES = {
+    'default': {
+        'BACKEND': CACHE_BACKENDS[CACHE_BACKEND],
+        'LOCATION': get_env('CACHE_LOCATION', 'primefit-default'),
+    },
+    'sessions': {
+        'BACKEND': CACHE_BACKENDS[CACHE_BACKEND],
+        'LOCATION': get_env('CACHE_LOCATION', 'primefit-sessions'),
+        'KEY_PREFIX': 'session',
+        'TIMEOUT': None,
+        'OPTIONS': {'MAX_ENTRIES': get_env('SESSION_CACHE_MAX_ENTRIES', 10000, cast=int)}
+            if CACHE_BACKEND == 'locmem' else {},
+    },
+}
+
+# Sessões
+# SESSION_STORE:
+#   'db'             - tabela django_session (um SELECT por pedido)
+#   'cache'          - só na cache (sem acesso à BD; perde-se se a cache for limpa)
+#   'cached_db'      - leitura pela cache com write-through para a BD
+#   'signed_cookies' - sessão assinada no próprio cookie (sem estado no servidor)
+# Com CACHE_BACKEND='locmem' a cache é por processo: 'cache' e 'cached_db' só
+# são seguros com um único worker (ou sticky sessions). Para vários workers
+# usar memcached/redis.
+SESSION_ENGINES = {
+    'db': 'django.contrib.sessions.backends.db',
+    'cache': 'django.contrib.sessions.backends.cache',
+    'cached_db': 'django.contrib.sessions.backends.cached_db',
+    'signed_cookies': 'django.contrib.sessions.backends.signed_cookies',
+}
+SESSION_ENGINE = SESSION_ENGINES[get_env('SESSION_STORE', 'db')]
+SESSION_CACHE_ALIAS = 'sessions'
+SESSION_COOKIE_HTTPONLY = True
+
+# last_login em write-behind: os logins são agrupados e gravados num único
+# UPDATE a cada LAST_LOGIN_FLUSH_INTERVAL segundos ou LAST_LOGIN_FLUSH_MAX_ENTRIES logins
+LAST_LOGIN_WRITE_BEHIND = get_env('LAST_LOGIN_WRITE_BEHIND', True, cast=bool)
+LAST_LOGIN_FLUSH_INTERVAL = get_env('LAST_LOGIN_FLUSH_INTERVAL', 5, cast=float)
+LAST_LOGIN_FLUSH_MAX_ENTRIES = get_env('LAST_LOGIN_FLUSH_MAX_ENTRIES', 500, cast=int)
+# Limites com a base de dados em baixo: utilizadores pendentes em memória e
+# flushes falhados até um timestamp ser descartado
+LAST_LOGIN_MAX_PENDING = get_env('LAST_LOGIN_MAX_PENDING', 10000, cast=int)
+LAST_LOGIN_FLUSH_MAX_ATTEMPTS = get_env('LAST_LOGIN_FLUSH_MAX_ATTEMPTS', 5, cast=int)
+
+# MongoDB (PrimeFit.mongodb_manager): arquivo do histórico frio
+# Liga no primeiro uso, com pool do MongoClient; depois de breaker_threshold
+# falhas seguidas o circuito abre e as chamadas falham logo durante um
+# back-off exponencial (breaker_backoff ... breaker_max_backoff segundos)
+MONGODB_SETTINGS = {
+    'url': get_env('MONGODB_URL', 'mongodb://localhost:27017/'),
+    'db': get_env('MONGODB_DB', 'ProjetoBD2'),
+    'max_pool_size': get_env('MONGODB_MAX_POOL_SIZE', 50, cast=int),
+    'min_pool_size': get_env('MONGODB_MIN_POOL_SIZE', 0, cast=int),
+    'max_idle_time_ms': get_env('MONGODB_MAX_IDLE_TIME_MS', 300000, cast=int),
+    'server_selection_timeout_ms': get_env('MONGODB_SERVER_SELECTION_TIMEOUT_MS', 2000, cast=int),
+    'connect_timeout_ms': get_env('MONGODB_CONNECT_TIMEOUT_MS', 2000, cast=int),
+    'breaker_threshold': get_env('MONGODB_BREAKER_THRESHOLD', 3, cast=int),
+    'breaker_backoff': get_env('MONGODB_BREAKER_BACKOFF', 1.0, cast=float),
+    'breaker_max_backoff': get_env('MONGODB_BREAKER_MAX_BACKOFF', 60.0, cast=float),
+}
+# Check-ins e reservas com mais de ARCHIVE_RETENTION_MONTHS meses passam
+# para o MongoDB (comando archive_history)
+ARCHIVE_RETENTION_MONTHS = get_env('ARCHIVE_RETENTION_MONTHS', 24, cast=int)
+
+# API dos torniquetes (PrimeFit.turnstile)
+# Os dispositivos autenticam-se com "Authorization: Bearer <token>"; sem tokens a API fica desligada.
+# Em group commit os eventos de pedidos concorrentes são gravados juntos a cada
+# TURNSTILE_FLUSH_INTERVAL_MS ms ou quando há TURNSTILE_FLUSH_MAX_EVENTS pendentes.
+TURNSTILE_API_TOKENS = [token for token in get_env('TURNSTILE_API_TOKENS', '').split(',') if token]
+TURNSTILE_GROUP_COMMIT = get_env('TURNSTILE_GROUP_COMMIT', True, cast=bool)
+TURNSTILE_FLUSH_INTERVAL_MS = get_env('TURNSTILE_FLUSH_INTERVAL_MS', 20, cast=float)
+TURNSTILE_FLUSH_MAX_EVENTS = get_env('TURNSTILE_FLUSH_MAX_EVENTS', 2000, cast=int)
+TURNSTILE_MAX_EVENTS_PER_REQUEST = get_env('TURNSTILE_MAX_EVENTS_PER_REQUEST', 5000, cast=int)
+
+# Cache dos catálogos (planos, tipos de utilizador, estados das máquinas; PrimeFit.catalog)
+# Invalidada em todos os workers por LISTEN/NOTIFY; o TTL só conta se uma
+# notificação se perder (ex.: listener desligado).
+CATALOG_CACHE_TTL = get_env('CATALOG_CACHE_TTL', 300, cast=float)
+
+# Ocupação em tempo real (PrimeFit.occupancy)
+# Uma thread por processo faz LISTEN occupancy e distribui o estado a todos os
+# dashboards ligados por SSE; notificações seguidas são agrupadas em
+# OCCUPANCY_MIN_INTERVAL_MS ms e o estado é relido a cada OCCUPANCY_REFRESH_SECONDS
+# (mudança de dia). OCCUPANCY_KEEPALIVE_SECONDS mantém as ligações SSE abertas nos proxies.
+OCCUPANCY_MIN_INTERVAL_MS = get_env('OCCUPANCY_MIN_INTERVAL_MS', 250, cast=float)
+OCCUPANCY_REFRESH_SECONDS = get_env('OCCUPANCY_REFRESH_SECONDS', 60, cast=float)
+OCCUPANCY_KEEPALIVE_SECONDS = get_env('OCCUPANCY_KEEPALIVE_SECONDS', 15, cast=float)
+
 # Desabilitar migrações automáticas para tabelas que já existem
 MIGRATION_MODULES = {
     'auth': None,
@@ -182,6 +321,42 @@ STATICFILES_DIRS = [
 ]
 STATIC_ROOT = BASE_DIR / 'staticfiles'
 
+# Instrumentação por pedido (PrimeFit.instrumentation)
+# INSTRUMENTATION_SAMPLE_RATE: fração dos pedidos com queries instrumentadas (0 a 1)
+# Pedidos acima de SLOW_REQUEST_THRESHOLD_MS são escritos em SLOW_REQUEST_LOG (rotativo)
+INSTRUMENTATION_SAMPLE_RATE = get_env('INSTRUMENTATION_SAMPLE_RATE', 0.1, cast=float)
+SLOW_REQUEST_THRESHOLD_MS = get_env('SLOW_REQUEST_THRESHOLD_MS', 500, cast=float)
+SLOW_REQUEST_LOG = get_env('SLOW_REQUEST_LOG', str(BASE_DIR / 'slow_requests.log'))
+METRICS_ALLOWED_IPS = get_env('METRICS_ALLOWED_IPS', '127.0.0.1,::1').split(',')
+
+LOGGING = {
+    'version': 1,
+    'disable_existing_loggers': False,
+    'handlers': {
+        'console': {
+            'class': 'logging.StreamHandler',
+        },
+        'slow_requests': {
+            'class': 'logging.handlers.RotatingFileHandler',
+            'filename': SLOW_REQUEST_LOG,
+            'maxBytes': get_env('SLOW_REQUEST_LOG_MAX_BYTES', 10 * 1024 * 1024, cast=int),
+            'backupCount': get_env('SLOW_REQUEST_LOG_BACKUPS', 5, cast=int),
+            'delay': True,
+        },
+    },
+    'loggers': {
+        'PrimeFit': {
+            'handlers': ['console'],
+            'level': 'INFO',
+        },
+        'PrimeFit.slow_requests': {
+            'handlers': ['slow_requests'],
+            'level': 'WARNING',
+            'propagate': False,
+        },
+    },
+}
+
 # Default primary key field type
 # https://docs.djangoproject.com/en/5.2/ref/settings/#default-auto-field
 
@@ -0,0 +1,70 @@
+from datetime import date
+
+from django.test import SimpleTestCase
+
+from PrimeFit.recurrence import RecurrenceError, expand, parse_rrule
+
+
+class ParseRruleTests(SimpleTestCase):
+    def test_weekly_rule(self):
+        rule = parse_rrule('RRULE:FREQ=WEEKLY;INTERVAL=2;BYDAY=MO,WE;UNTIL=20261231T000000Z')
+        self.assertEqual(rule['freq'], 'WEEKLY')
+        self.assertEqual(rule['interval'], 2)
+        self.assertEqual(rule['byday'], [(None, 0), (None, 2)])
+        self.assertEqual(rule['until'], date(2026, 12, 31))
+
+    def test_monthly_ordinal_byday(self):
+        rule = parse_rrule('FREQ=MONTHLY;BYDAY=-1FR')
+        self.assertEqual(rule['byday'], [(-1, 4)])
+
+    def test_invalid_rules(self):
+        for text in ('', 'INTERVAL=2', 'FREQ=YEARLY', 'FREQ=WEEKLY;INTERVAL=0', 'FREQ=WEEKLY;BYDAY=1MO',
+                     'FREQ=MONTHLY;BYMONTHDAY=32', 'FREQ=DAILY;BYDAY=XX', 'FREQ=DAILY;BYHOUR=9',
+                     'FREQ=DAILY;COUNT=abc'):
+            with self.subTest(text=text), self.assertRaises(RecurrenceError):
+                parse_rrule(text)
+
+
+class ExpandTests(SimpleTestCase):
+    def test_weekly_with_interval(self):
+        rule = parse_rrule('FREQ=WEEKLY;INTERVAL=2;BYDAY=MO,WE')
+        dates = expand(rule, date(2026, 1, 5), date(2026, 1, 1), date(2026, 1, 31))
+        self.assertEqual(dates, [date(2026, 1, 5), date(2026, 1, 7), date(2026, 1, 19), date(2026, 1, 21)])
+
+    def test_last_friday_of_month(self):
+        rule = parse_rrule('FREQ=MONTHLY;BYDAY=-1FR')
+        dates = expand(rule, date(2026, 1, 1), date(2026, 1, 1), date(2026, 3, 31))
+        self.assertEqual(dates, [date(2026, 1, 30), date(2026, 2, 27), date(2026, 3, 27)])
+
+    def test_monthly_skips_months_without_the_day(self):
+        rule = parse_rrule('FREQ=MONTHLY')
+        dates = expand(rule, date(2026, 1, 31), date(2026, 1, 1), date(2026, 5, 31))
+        self.assertEqual(dates, [date(2026, 1, 31), date(2026, 3, 31), date(2026, 5, 31)])
+
+    def test_count_until_and_exdates(self):
+        rule = parse_rrule('FREQ=DAILY;COUNT=5')
+        dates = expand(rule, date(2026, 1, 1), date(2026, 1, 3), date(2026, 1, 31), [date(2026, 1, 4)])
+        self.assertEqual(dates, [date(2026, 1, 3), date(2026, 1, 5)])
+        rule = parse_rrule('FREQ=DAILY;UNTIL=20260103')
+        self.assertEqual(expand(rule, date(2026, 1, 1), date(2026, 1, 1), date(2026, 1, 31)),
+                         [date(2026, 1, 1), date(2026, 1, 2), date(2026, 1, 3)])
+
+    def test_periods_without_dates_stop_at_until(self):
+        # Só fevereiros, que nunca têm dia 30: antes ficava em ciclo infinito
+        rule = parse_rrule('FREQ=MONTHLY;INTERVAL=12;BYMONTHDAY=30')
+        self.assertEqual(expand(rule, date(2026, 2, 1), date(2026, 1, 1), date(2030, 12, 31)), [])
+
+    def test_daily_interval_never_matching_byday(self):
+        # Segundas-feiras de 7 em 7 dias nunca são terças: antes dava OverflowError
+        rule = parse_rrule('FREQ=DAILY;INTERVAL=7;BYDAY=TU')
+        self.assertEqual(expand(rule, date(2026, 1, 5), date(2026, 1, 1), date(2026, 12, 31)), [])
+
+    def test_rule_without_dates_is_rejected_on_long_horizons(self):
+        rule = parse_rrule('FREQ=DAILY;INTERVAL=7;BYDAY=TU')
+        with self.assertRaises(RecurrenceError):
+            expand(rule, date(2026, 1, 5), date(2026, 1, 1), date.max)
+
+    def test_no_overflow_near_date_max(self):
+        rule = parse_rrule('FREQ=WEEKLY')
+        dates = expand(rule, date(9999, 12, 1), date(9999, 12, 1), date.max)
+        self.assertEqual(dates[-1], date(9999, 12, 29))
@@ -0,0 +1,288 @@
+import atexit
+import logging
+import threading
+from concurrent.futures import Future
+
+from django.conf import settings
+from django.db import connections, transaction
+from django.utils import timezone
+from django.utils.dateparse import parse_datetime
+
+logger = logging.getLogger(__name__)
+
+EVENT_TYPES = ('in', 'out')
+
+# Estados devolvidos por evento
+ACCEPTED = 'accepted'
+DUPLICATE = 'duplicate'
+UNKNOWN_MEMBER = 'unknown_member'
+UNMATCHED_EXIT = 'unmatched_exit'
+
+
+# Limites das colunas de turnstile_batch/TURNSTILEEVENT (INTEGER, VARCHAR):
+# um valor fora deles faria falhar o lote inteiro do group commit
+MAX_MEMBERID = 2 ** 31 - 1
+
+
+class InvalidEvent(ValueError):
+    pass
+
+
+def parse_event(data):
+    """
+    Valida um evento do torniquete:
+    {"event_id": "...", "member_id": 12 | "card": "...", "timestamp": ISO 8601,
+     "direction": "in" | "out", "device_id": "..."}
+    Devolve (eventid, memberid, cardnumber, eventtype, eventtime, deviceid).
+    """
+    if not isinstance(data, dict):
+        raise InvalidEvent('O evento tem de ser um objeto JSON')
+
+    eventid = data.get('event_id')
+    if not isinstance(eventid, str) or not 0 < len(eventid) <= 64:
+        raise InvalidEvent('event_id obrigatório (texto até 64 caracteres)')
+
+    memberid = data.get('member_id')
+    card = data.get('card')
+    if memberid is not None:
+        if not isinstance(memberid, int) or isinstance(memberid, bool) or not 0 < memberid <= MAX_MEMBERID:
+            raise InvalidEvent('member_id tem de ser inteiro positivo')
+        card = None
+    elif not isinstance(card, str) or not card:
+        raise InvalidEvent('member_id ou card obrigatório')
+    elif len(card) > 32:
+        raise InvalidEvent('card tem no máximo 32 caracteres')
+
+    eventtype = data.get('direction')
+    if eventtype not in EVENT_TYPES:
+        raise InvalidEvent('direction tem de ser "in" ou "out"')
+
+    eventtime = parse_datetime(data.get('timestamp') or '') if isinstance(data.get('timestamp'), str) else None
+    if eventtime is None:
+        raise InvalidEvent('timestamp ISO 8601 obrigatório')
+    if timezone.is_aware(eventtime):
+        # checkin guarda data/hora locais
+        eventtime = timezone.make_naive(eventtime)
+
+    deviceid = data.get('device_id')
+    if deviceid is not None and (not isinstance(deviceid, str) or len(deviceid) > 50):
+        raise InvalidEvent('device_id tem de ser texto até 50 caracteres')
+
+    return eventid, memberid, card, eventtype, eventtime, deviceid
+
+
+BATCH_TABLE_SQL = """
+    CREATE TEMP TABLE IF NOT EXISTS turnstile_batch (
+        eventid VARCHAR(64), memberid INTEGER, cardnumber VARCHAR(32), eventtype VARCHAR(3),
+        eventtime TIMESTAMP, deviceid VARCHAR(50),
+        is_new BOOLEAN NOT NULL DEFAULT FALSE, matched BOOLEAN NOT NULL DEFAULT FALSE
+    ) ON COMMIT DELETE ROWS
+"""
+
+LOAD_BATCH_SQL = """
+    INSERT INTO turnstile_batch (eventid, memberid, cardnumber, eventtype, eventtime, deviceid)
+    SELECT * FROM unnest(%s::varchar[], %s::integer[], %s::varchar[], %s::varchar[], %s::timestamp[], %s::varchar[])
+"""
+
+# Cartão -> membro; depois anula os membros inexistentes ou inativos
+RESOLVE_CARDS_SQL = """
+    UPDATE turnstile_batch b SET memberid = m.memberid
+    FROM member m
+    WHERE b.memberid IS NULL AND m.cardnumber = b.cardnumber
+"""
+
+REJECT_UNKNOWN_SQL = """
+    UPDATE turnstile_batch b SET memberid = NULL
+    WHERE b.memberid IS NOT NULL
+      AND NOT EXISTS (SELECT 1 FROM member m WHERE m.memberid = b.memberid AND m.isactive = true)
+"""
+
+# Idempotência: só os eventos que entram em turnstileevent são processados
+RECORD_EVENTS_SQL = """
+    WITH inserted AS (
+        INSERT INTO turnstileevent (eventid, memberid, eventtype, eventtime, deviceid)
+        SELECT eventid, memberid, eventtype, eventtime, deviceid
+        FROM turnstile_batch
+        WHERE memberid IS NOT NULL
+        ON CONFLICT (eventid) DO NOTHING
+        RETURNING eventid
+    )
+    UPDATE turnstile_batch b SET is_new = true
+    FROM inserted i WHERE b.eventid = i.eventid
+"""
+
+INSERT_ENTRIES_SQL = """
+    INSERT INTO checkin (memberid, date, entrancetime)
+    SELECT memberid, eventtime::date, eventtime::time
+    FROM turnstile_batch
+    WHERE is_new AND eventtype = 'in'
+    ORDER BY eventtime
+"""
+
+# Cada saída fecha o check-in aberto mais recente do membro nesse dia que
+# começou antes dela (IDX_CHECKIN_MEMBER_DATE); se duas saídas apontarem ao
+# mesmo check-in ganha a primeira
+CLOSE_EXITS_SQL = """
+    WITH closed AS (
+        UPDATE checkin c
+        SET exittime = x.exittime
+        FROM (
+            SELECT DISTINCT ON (o.checkinid) o.checkinid, o.date, e.eventtime::time AS exittime, e.eventid
+            FROM turnstile_batch e
+            JOIN LATERAL (
+                SELECT c.checkinid, c.date
+                FROM checkin c
+                WHERE c.memberid = e.memberid
+                  AND c.date = e.eventtime::date
+                  AND c.exittime IS NULL
+                  AND c.entrancetime < e.eventtime::time
+                ORDER BY c.entrancetime DESC
+                LIMIT 1
+            ) o ON true
+            WHERE e.is_new AND e.eventtype = 'out'
+            ORDER BY o.checkinid, e.eventtime
+        ) x
+        WHERE c.checkinid = x.checkinid AND c.date = x.date
+        RETURNING x.eventid
+    )
+    UPDATE turnstile_batch b SET matched = true
+    FROM closed WHERE b.eventid = closed.eventid
+"""
+
+BATCH_RESULT_SQL = "SELECT eventid, memberid IS NOT NULL, is_new, eventtype, matched FROM turnstile_batch"
+
+
+def ingest_events(events, using='default'):
+    """
+    Grava um lote de eventos já validados com um número fixo de statements,
+    seja qual for o tamanho do lote. Devolve o estado de cada evento, pela
+    mesma ordem (um event_id repetido no lote conta como duplicado).
+    """
+    statuses = [DUPLICATE] * len(events)
+    first_index = {}
+    for index, event in enumerate(events):
+        first_index.setdefault(event[0], index)
+    unique = [events[index] for index in first_index.values()]
+    if not unique:
+        return statuses
+
+    columns = [list(column) for column in zip(*unique)]
+    connection = connections[using]
+    with transaction.atomic(using=using), connection.cursor() as cursor:
+        cursor.execute(BATCH_TABLE_SQL)
+        cursor.execute(LOAD_BATCH_SQL, columns)
+        cursor.execute(RESOLVE_CARDS_SQL)
+        cursor.execute(REJECT_UNKNOWN_SQL)
+        cursor.execute(RECORD_EVENTS_SQL)
+        cursor.execute(INSERT_ENTRIES_SQL)
+        cursor.execute(CLOSE_EXITS_SQL)
+        cursor.execute(BATCH_RESULT_SQL)
+        rows = cursor.fetchall()
+
+    for eventid, known, is_new, eventtype, matched in rows:
+        if not known:
+            status = UNKNOWN_MEMBER
+        elif not is_new:
+            status = DUPLICATE
+        elif eventtype == 'out' and not matched:
+            status = UNMATCHED_EXIT
+        else:
+            status = ACCEPTED
+        statuses[first_index[eventid]] = status
+    return statuses
+
+
+class TurnstileIngestor:
+    """
+    Agrupa os eventos de vários pedidos concorrentes (group commit).
+
+    Cada pedido entrega os seus eventos e espera pelo Future; uma thread de
+    fundo grava tudo o que chegou num único ingest_events() a cada
+    `interval` segundos, ou mais cedo quando há `max_batch` eventos. O pedido
+    só responde depois de os eventos estarem gravados.
+    """
+
+    def __init__(self, interval=0.02, max_batch=2000, using='default'):
+        self.interval = interval
+        self.max_batch = max_batch
+        self.using = using
+        self._pending = []
+        self._pending_events = 0
+        self._lock = threading.Lock()
+        self._wakeup = threading.Event()
+        self._stopped = threading.Event()
+        self._thread = None
+
+    def submit(self, events):
+        future = Future()
+        with self._lock:
+            self._pending.append((events, future))
+            self._pending_events += len(events)
+            pending = self._pending_events
+        self._ensure_started()
+        if pending >= self.max_batch:
+            self._wakeup.set()
+        return future
+
+    def _ensure_started(self):
+        if self._thread is not None:
+            return
+        with self._lock:
+            if self._thread is None:
+                self._thread = threading.Thread(
+                    target=self._run, name='turnstile-ingestor', daemon=True
+                )
+                self._thread.start()
+                atexit.register(self.stop)
+
+    def _run(self):
+        while not self._stopped.is_set():
+            self._wakeup.wait(self.interval)
+            self._wakeup.clear()
+            self.flush()
+        connections[self.using].close()
+
+    def flush(self):
+        with self._lock:
+            batch, self._pending = self._pending, []
+            self._pending_events = 0
+        if not batch:
+            return 0
+
+        events = [event for request_events, _ in batch for event in request_events]
+        try:
+            connections[self.using].close_if_unusable_or_obsolete()
+            statuses = ingest_events(events, using=self.using)
+        except Exception as e:
+            logger.error(f"Failed to ingest {len(events)} turnstile events: {e}")
+            for _, future in batch:
+                future.set_exception(e)
+            return 0
+
+        offset = 0
+        for request_events, future in batch:
+            future.set_result(statuses[offset:offset + len(request_events)])
+            offset += len(request_events)
+        return len(events)
+
+    def stop(self):
+        self._stopped.set()
+        self._wakeup.set()
+        if self._thread is not None and self._thread is not threading.current_thread():
+            self._thread.join(timeout=self.interval + 5)
+        self.flush()
+
+
+turnstile_ingestor = TurnstileIngestor(
+    interval=getattr(settings, 'TURNSTILE_FLUSH_INTERVAL_MS', 20) / 1000,
+    max_batch=getattr(settings, 'TURNSTILE_FLUSH_MAX_EVENTS', 2000),
+)
+
+
+def submit_events(events):
+    """Grava os eventos (em group commit ou diretamente) e devolve os estados"""
+    if getattr(settings, 'TURNSTILE_GROUP_COMMIT', True):
+        return turnstile_ingestor.submit(events).result(
+            timeout=getattr(settings, 'TURNSTILE_TIMEOUT', 10)
+        )
+    return ingest_events(events)
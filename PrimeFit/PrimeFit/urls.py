@@ -15,6 +15,7 @@ Including another URLconf
     2. Add a URL to urlpatterns:  path('blog/', include('blog.urls'))
 """
 from django.contrib import admin
+from django.conf import settings
 from django.urls import path
 from . import views
 
@@ -28,19 +29,35 @@ urlpatterns = [
     
     # Member URLs
     path('', views.member_home, name='member_home'),
-    path('member/home/', views.member_home, name='member_home'),
-    path('member/account/', views.member_account, name='member_account'),
+    path('member/home/', views.member_home_async if settings.ASYNC_VIEWS else views.member_home, name='member_home'),
+    path('member/account/', views.member_account_async if settings.ASYNC_VIEWS else views.member_account, name='member_account'),
     
     # Instructor URLs
     path('instructor/account/', views.instructor_account, name='instructor_account'),
     path('instructor/classes/', views.instructor_class_management, name='instructor_classes'),
     
     # Manager URLs
-    path('manager/dashboard/', views.manager_dashboard, name='manager_dashboard'),
+    path('manager/dashboard/', views.manager_dashboard_async if settings.ASYNC_VIEWS else views.manager_dashboard, name='manager_dashboard'),
     path('manager/members/', views.manager_members, name='manager_members'),
+    path('manager/members/search/', views.manager_member_search, name='manager_member_search'),
     path('manager/classes/', views.manager_classes, name='manager_classes'),
     path('manager/checkins/', views.manager_checkins, name='manager_checkins'),
     path('manager/machines/', views.manager_machines, name='manager_machines'),
     path('manager/payments/', views.manager_payments, name='manager_payments'),
     path('manager/plans/', views.manager_plans, name='manager_plans'),
+    path('manager/export/<str:dataset>/', views.manager_export, name='manager_export'),
+    path('manager/db-pool-stats/', views.manager_db_pool_stats, name='manager_db_pool_stats'),
+    path('manager/occupancy/', views.manager_occupancy, name='manager_occupancy'),
+    path('manager/occupancy/stream/', views.manager_occupancy_stream, name='manager_occupancy_stream'),
+
+    # Versões assíncronas (ASGI) das páginas mais lidas
+    path('async/member/home/', views.member_home_async, name='member_home_async'),
+    path('async/member/account/', views.member_account_async, name='member_account_async'),
+    path('async/manager/dashboard/', views.manager_dashboard_async, name='manager_dashboard_async'),
+
+    # Torniquetes
+    path('api/turnstile/events/', views.turnstile_events, name='turnstile_events'),
+
+    # Monitorização
+    path('metrics/', views.metrics_view, name='metrics'),
 ]
@@ -1,14 +1,36 @@
+import asyncio
+import hmac
+import json
+from collections import Counter
+from datetime import date
+from types import SimpleNamespace
 from django.shortcuts import render, redirect
 from django.contrib import messages
-from django.db import connection
-from django.contrib.auth.hashers import make_password, check_password
+from django.conf import settings
+from django.http import JsonResponse, HttpResponse, StreamingHttpResponse
+from django.core.handlers.asgi import ASGIRequest
+from django.views.decorators.csrf import csrf_exempt
+from django.utils.dateparse import parse_date
 from .models import (
-    UserAuthentication, Plan, EmailExists, MemberStatsMonth, 
+    UserAuthentication, EmailExists, MemberStatsMonth, 
     MemberScheduleClasses, MemberAvailableClasses, MemberAccountDetails,
     InstructorInfo, InstructorClasses, ClassSchedules, DashboardStats,
-    AllMembers, AllClasses, AllCheckins, Machines, Payments, Plans,
+    AllMembers, AllClasses, AllCheckins, Machines, Payments,
     MemberPaymentHistory, MemberCheckinHistory
 )
+from .pagination import keyset_paginate, get_page_size
+from .exports import stream_export
+from .archive import archived_checkins, archived_checkins_async
+from .async_db import async_db, on_server_loop
+from .catalog import catalog_cache, get_catalog
+from .turnstile import InvalidEvent, parse_event, submit_events
+from .member_search import DEFAULT_LIMIT as MEMBER_SEARCH_LIMIT, search_members
+from .occupancy import OCCUPANCY_SQL, read_occupancy, occupancy_stream, occupancy_stream_sync
+from .db_router import get_db_alias, get_db_connection, get_pool_stats
+from .middleware import Principal, login_principal
+from .last_login import update_last_login
+from .hashing import verify_password, hash_password, HashingPoolBusy
+from .instrumentation import request_metrics
 
 
 # Autenticação usando tabela USERS do PostgreSQL
@@ -24,19 +46,24 @@ def login_view(request):
         # Verificar credenciais usando o model UserAuthentication
         try:
             user_data = UserAuthentication.objects.filter(email=email).first()
+            valid, new_hash = verify_password(password, user_data.password) if user_data else (False, None)
             
-            if user_data and check_password(password, user_data.password):
+            if valid:
+                # Hash antigo (algoritmo/custo anterior): substituir pelo atual
+                if new_hash:
+                    with get_db_connection(request).cursor() as cursor:
+                        cursor.execute("CALL sp_update_password_hash(%s, %s)", [user_data.userid, new_hash])
+                
                 # Criar sessão de usuário
-                request.session['user_id'] = user_data.userid
-                request.session['email'] = user_data.email
-                request.session['user_name'] = user_data.name
-                request.session['user_type_id'] = user_data.usertypeid
-                request.session['user_type'] = user_data.user_type_label
-                request.session['is_authenticated'] = True
+                principal = Principal(
+                    user_data.userid, user_data.email, user_data.name,
+                    user_data.usertypeid, user_data.user_type_label
+                )
+                principal.resolve_domain_id()
+                login_principal(request, principal)
                 
-                # Atualizar last_login usando procedimento armazenado
-                with connection.cursor() as cursor:
-                    cursor.execute("CALL sp_update_last_login(%s)", [user_data.userid])
+                # Atualizar last_login (em buffer, gravado em lote fora do pedido)
+                update_last_login(user_data.userid)
                 
                 # Redirecionar baseado no tipo de usuário
                 if user_data.usertypeid == 1:  # Gestor
@@ -47,6 +74,10 @@ def login_view(request):
                     return redirect('member_home')
             else:
                 messages.error(request, 'Email ou password incorretos.')
+        
+        except HashingPoolBusy:
+            messages.error(request, 'Servidor ocupado. Tente novamente dentro de momentos.')
+            return render(request, 'auth/login.html', status=503)
                     
         except Exception as e:
             messages.error(request, f'Erro no login: {str(e)}')
@@ -61,7 +92,7 @@ def logout_view(request):
 
 def register_view(request):
     try:
-        plans = list(Plan.objects.values('planid', 'name', 'monthlyprice', 'access24h'))
+        plans = get_catalog('plans')
     except Exception as e:
         plans = []
         messages.error(request, f'Erro ao carregar planos: {str(e)}')
@@ -93,13 +124,17 @@ def register_view(request):
                 return render(request, 'auth/register.html', context)
             
             # Criar novo usuário
-            hashed_password = make_password(password)
-            with connection.cursor() as cursor:
+            hashed_password = hash_password(password)
+            with get_db_connection(request).cursor() as cursor:
                 cursor.execute("CALL sp_create_member(%s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s)", 
                              [name, hashed_password, nif, email, phone, iban, birth_date, gender, address, city, postal_code, plan])
             messages.success(request, 'Conta criada com sucesso! Pode fazer login.')
             return redirect('login')
                 
+        except HashingPoolBusy:
+            messages.error(request, 'Servidor ocupado. Tente novamente dentro de momentos.')
+            return render(request, 'auth/register.html', context, status=503)
+
         except Exception as e:
             messages.error(request, f'Erro ao criar conta: {str(e)}')
             return render(request, 'auth/register.html', context)
@@ -109,63 +144,189 @@ def register_view(request):
 # Decorator customizado para verificar autenticação
 def custom_login_required(function):
     def wrap(request, *args, **kwargs):
-        if not request.session.get('is_authenticated'):
+        if getattr(request, 'principal', None) is None:
             messages.error(request, 'É necessário fazer login para aceder a esta página.')
             return redirect('login')
         return function(request, *args, **kwargs)
     return wrap
 
-# Helper para obter dados do usuário da sessão
+# Versão do decorator para as views assíncronas
+def async_login_required(function):
+    async def wrap(request, *args, **kwargs):
+        if getattr(request, 'principal', None) is None:
+            messages.error(request, 'É necessário fazer login para aceder a esta página.')
+            return redirect('login')
+        # Pools/clientes partilhados só no loop do servidor ASGI (PrimeFit.async_db)
+        token = on_server_loop.set(isinstance(request, ASGIRequest))
+        try:
+            return await function(request, *args, **kwargs)
+        finally:
+            on_server_loop.reset(token)
+    return wrap
+
+# Helper para obter dados do usuário (resolvidos pelo PrincipalMiddleware)
 def get_user_data(request):
-    if request.session.get('is_authenticated'):
-        return {
-            'userid': request.session.get('user_id'),
-            'email': request.session.get('email'),
-            'user_name': request.session.get('user_name'),
-            'user_type_id': request.session.get('user_type_id'),
-            'user_type': request.session.get('user_type'),
-            'is_authenticated': True
-        }
+    principal = getattr(request, 'principal', None)
+    if principal is not None:
+        return principal.as_user_data()
+    return None
+
+# Aulas de hoje ainda com vagas que o membro não reservou
+# (também usada pelo comando check_query_plans)
+MEMBER_AVAILABLE_CLASSES_SQL = """
+    SELECT classscheduleid, class_name, date, starttime, endtime, room, instructor_name, available_spots
+    FROM vw_member_available_classes vac
+    WHERE NOT EXISTS (
+        SELECT 1 FROM classbooking cb 
+        WHERE cb.classscheduleid = vac.classscheduleid 
+        AND cb.memberid = %s
+    )
+"""
+
+# Helpers para os filtros das listagens do gestor (aplicados em SQL)
+def get_date_param(request, key):
+    value = request.GET.get(key)
+    if not value:
+        return None
+    try:
+        return parse_date(value)
+    except ValueError:
+        return None
+
+def get_bool_param(request, key):
+    value = request.GET.get(key, '').lower()
+    if value in ('true', '1', 'sim'):
+        return True
+    if value in ('false', '0', 'nao'):
+        return False
     return None
 
+def get_list_filters(request):
+    return {
+        'status': request.GET.get('status', ''),
+        'plan': request.GET.get('plan', ''),
+        'date_from': request.GET.get('date_from', ''),
+        'date_to': request.GET.get('date_to', ''),
+        'ispayed': request.GET.get('ispayed', ''),
+        'instructor': request.GET.get('instructor', ''),
+        'room': request.GET.get('room', ''),
+    }
+
+# Filtros aplicados na query (servidos pelos índices de MEMBER)
+def filter_members(request, members):
+    status = request.GET.get('status')
+    if status == 'ativo':
+        members = members.filter(isactive=True)
+    elif status == 'inativo':
+        members = members.filter(isactive=False)
+    if request.GET.get('plan'):
+        members = members.filter(plan_name=request.GET['plan'])
+    date_from = get_date_param(request, 'date_from')
+    if date_from:
+        members = members.filter(registrationdate__gte=date_from)
+    date_to = get_date_param(request, 'date_to')
+    if date_to:
+        members = members.filter(registrationdate__lte=date_to)
+    return members
+
+# Filtros aplicados na query (IDX_CLASSSCHEDULE_DATE_TIME para as datas)
+def filter_classes(request, classes):
+    date_from = get_date_param(request, 'date_from')
+    if date_from:
+        classes = classes.filter(date__gte=date_from)
+    date_to = get_date_param(request, 'date_to')
+    if date_to:
+        classes = classes.filter(date__lte=date_to)
+    if request.GET.get('instructor'):
+        classes = classes.filter(instructor_name=request.GET['instructor'])
+    if request.GET.get('room'):
+        classes = classes.filter(room=request.GET['room'])
+    return classes
+
+# Opções dos filtros da página de aulas (tabelas pequenas: CLASS, INSTRUCTOR)
+CLASS_FILTER_ROOMS_SQL = "SELECT DISTINCT room FROM class WHERE isactive = true ORDER BY room"
+CLASS_FILTER_INSTRUCTORS_SQL = """
+    SELECT DISTINCT u.name
+    FROM class c
+    JOIN instructor i ON i.instructorid = c.instructorid
+    JOIN users u ON u.userid = i.userid
+    WHERE c.isactive = true
+    ORDER BY u.name
+"""
+
+# Filtros aplicados na query (IDX_PAYMENT_DUE_DATE / IDX_PAYMENT_UNPAID_DUE)
+def filter_payments(request, payments):
+    ispayed = get_bool_param(request, 'ispayed')
+    if ispayed is not None:
+        payments = payments.filter(ispayed=ispayed)
+    status = request.GET.get('status')
+    if status == 'pago':
+        payments = payments.filter(ispayed=True)
+    elif status == 'pendente':
+        payments = payments.filter(ispayed=False, isoverdue=False)
+    elif status == 'atraso':
+        payments = payments.filter(isoverdue=True)
+    if request.GET.get('plan'):
+        payments = payments.filter(plan_name=request.GET['plan'])
+    date_from = get_date_param(request, 'date_from')
+    if date_from:
+        payments = payments.filter(duedate__gte=date_from)
+    date_to = get_date_param(request, 'date_to')
+    if date_to:
+        payments = payments.filter(duedate__lte=date_to)
+    return payments
+
+# Filtros aplicados na query (IDX_CHECKIN_DATE)
+def filter_checkins(request, checkins):
+    date_from = get_date_param(request, 'date_from')
+    if date_from:
+        checkins = checkins.filter(date__gte=date_from)
+    date_to = get_date_param(request, 'date_to')
+    if date_to:
+        checkins = checkins.filter(date__lte=date_to)
+    return checkins
+
 # Member Views
+# Resumo do mês do membro a partir de uma linha de vw_member_stats_month
+def build_member_resume(stats):
+    if not stats:
+        return {
+            'recent_checkins': 0,
+            'month_classes_frequented': 0,
+            'total_hours': 0,
+            'next_payment': "",
+            'payment_price': ""
+        }
+    return {
+        'recent_checkins': stats.checkin_count or 0,
+        'month_classes_frequented': stats.class_bookings or 0,
+        'total_hours': round(stats.total_hours or 0),
+        'next_payment': stats.next_payment if stats.next_payment else "Pagamento em dia",
+        'payment_price': f"{round(stats.payment_price, 2)}€" if stats.next_payment and stats.payment_price else "0.00€"
+    }
+
 @custom_login_required
 def member_home(request):
     user_data = get_user_data(request)
-    recent_checkins = month_classes_frequented = total_hours = 0
-    next_payment = ""
-    payment_price = ""
+    member_resume = build_member_resume(None)
     schedule_classes = []
     available_classes = []
     is_booking = False
     
     try:
         # Buscar estatísticas usando model
-        stats = MemberStatsMonth.objects.filter(userid=user_data['userid']).first()
-        if stats:
-            recent_checkins = stats.checkin_count or 0
-            month_classes_frequented = stats.class_bookings or 0
-            total_hours = round(stats.total_hours or 0)
-            next_payment = stats.next_payment if stats.next_payment else "Pagamento em dia"
-            payment_price = f"{round(stats.payment_price, 2)}€" if stats.next_payment and stats.payment_price else "0.00€"
+        stats = MemberStatsMonth.objects.filter(memberid=user_data['memberid']).first()
+        member_resume = build_member_resume(stats)
 
         # Buscar aulas agendadas usando model
-        schedule_classes_data = MemberScheduleClasses.objects.filter(userid=user_data['userid'])
+        schedule_classes_data = MemberScheduleClasses.objects.filter(memberid=user_data['memberid'])
         schedule_classes = list(schedule_classes_data.values(
             'class_name', 'date', 'starttime', 'endtime', 'room', 'instructor_name'
         ))
 
         # Buscar aulas disponíveis usando raw query (mais complexa)
-        with connection.cursor() as cursor:
-            cursor.execute("""
-                SELECT classscheduleid, class_name, date, starttime, endtime, room, instructor_name, available_spots
-                FROM vw_member_available_classes vac
-                WHERE NOT EXISTS (
-                    SELECT 1 FROM classbooking cb 
-                    WHERE cb.classscheduleid = vac.classscheduleid 
-                    AND cb.memberid = (SELECT memberid FROM member WHERE userid = %s)
-                )
-            """, [user_data['userid']])
+        with get_db_connection(request).cursor() as cursor:
+            cursor.execute(MEMBER_AVAILABLE_CLASSES_SQL, [user_data['memberid']])
 
             available_classes_raw = cursor.fetchall()
             available_classes = []
@@ -188,8 +349,8 @@ def member_home(request):
         is_booking = True
         classscheduleid = request.POST.get('classscheduleid')
         try:
-            with connection.cursor() as cursor:
-                cursor.execute("CALL sp_book_class(%s, %s)", [user_data['userid'], classscheduleid])
+            with get_db_connection(request).cursor() as cursor:
+                cursor.execute("CALL sp_book_class(%s, %s)", [user_data['memberid'], classscheduleid])
                 messages.success(request, 'Aula reservada com sucesso!')
                 return redirect('member_home')
         except Exception as e:
@@ -197,13 +358,7 @@ def member_home(request):
 
     context = {
         'user_data': user_data,
-        'member_resume': {
-            'recent_checkins': recent_checkins,
-            'month_classes_frequented': month_classes_frequented,
-            'total_hours': total_hours,
-            'next_payment': next_payment,
-            'payment_price': payment_price
-        },
+        'member_resume': member_resume,
         'schedule_classes': schedule_classes,
         'available_classes': available_classes,
         'is_booking': is_booking
@@ -220,17 +375,20 @@ def member_account(request):
     
     try:
         # Using Django ORM with the model
-        member_details = MemberAccountDetails.objects.filter(userid=user_data['userid']).first()
+        member_details = MemberAccountDetails.objects.filter(memberid=user_data['memberid']).first()
         
         # Buscar histórico de pagamentos do membro
         payment_history = MemberPaymentHistory.objects.filter(
-            userid=user_data['userid']
+            memberid=user_data['memberid']
         ).order_by('-payment_date')[:10]  # Últimos 10 pagamentos
         
         # Buscar histórico de check-ins do membro
-        checkin_history = MemberCheckinHistory.objects.filter(
-            userid=user_data['userid']
-        ).order_by('-checkin_date', '-entrancetime')[:15]  # Últimos 15 check-ins
+        checkin_history = list(MemberCheckinHistory.objects.filter(
+            memberid=user_data['memberid']
+        ).order_by('-checkin_date', '-entrancetime')[:15])  # Últimos 15 check-ins
+        # Os check-ins antigos estão no arquivo (MongoDB): completar a partir daí
+        if len(checkin_history) < 15:
+            checkin_history += archived_checkins(user_data['memberid'], 15 - len(checkin_history))
     
     except Exception as e:
         member_details = None
@@ -257,10 +415,10 @@ def instructor_account(request):
 
     try:
         # Buscar informações do instrutor usando model
-        instructor_info = InstructorInfo.objects.filter(userid=user_data['userid']).first()
+        instructor_info = InstructorInfo.objects.filter(instructorid=user_data['instructorid']).first()
         
         # Buscar aulas do instrutor usando model
-        classes = InstructorClasses.objects.filter(userid=user_data['userid']).values(
+        classes = InstructorClasses.objects.filter(instructorid=user_data['instructorid']).values(
             'classid', 'name', 'room', 'capacity', 'duration_minutes'
         )
     
@@ -283,7 +441,7 @@ def instructor_class_management(request):
     try:
         # Buscar horários das aulas do instrutor usando model
         class_schedules = ClassSchedules.objects.filter(
-            userid=user_data['userid']
+            instructorid=user_data['instructorid']
         ).order_by('date', 'starttime').values(
             'classscheduleid', 'name', 'date', 'starttime', 'endtime', 'maxparticipants', 'room'
         )
@@ -302,10 +460,13 @@ def instructor_class_management(request):
 @custom_login_required
 def manager_dashboard(request):
     user_data = get_user_data(request)
+    occupancy = None
     
     try:
         # Buscar estatísticas usando model
         stats = DashboardStats.objects.first()
+        with get_db_connection(request).cursor() as cursor:
+            occupancy = read_occupancy(cursor)
         if stats:
             total_members = stats.total_members
             total_instructors = stats.total_instructors
@@ -323,7 +484,8 @@ def manager_dashboard(request):
         'total_members': total_members,
         'total_instructors': total_instructors,
         'active_memberships': active_memberships,
-        'today_checkins_count': today_checkins_count
+        'today_checkins_count': today_checkins_count,
+        'occupancy': occupancy
     }
     return render(request, 'Manager/Dashboard.html', context)
 
@@ -331,11 +493,23 @@ def manager_dashboard(request):
 def manager_members(request):
     user_data = get_user_data(request)
 
+    page = None
+    plans = []
+    
     try:
-        members = AllMembers.objects.order_by('-registrationdate').values(
-            'memberid', 'name', 'email', 'phone', 'registrationdate', 'isactive',
-            'startdate', 'enddate', 'plan_name'
+        plans = get_catalog('plans')
+        members = filter_members(request, AllMembers.objects.all())
+
+        page = keyset_paginate(
+            members.values(
+                'memberid', 'name', 'email', 'phone', 'registrationdate', 'isactive',
+                'startdate', 'enddate', 'plan_name'
+            ),
+            ['-registrationdate', '-memberid'],
+            cursor=request.GET.get('cursor'),
+            page_size=get_page_size(request),
         )
+        members = page.items
     
     except Exception as e:
         members = []
@@ -343,18 +517,58 @@ def manager_members(request):
     
     context = {
         'user_data': user_data,
-        'members': list(members)
+        'members': members,
+        'plans': plans,
+        'page': page,
+        'filters': get_list_filters(request)
     }
     return render(request, 'Manager/Members.html', context)
 
+# Pesquisa de membros para o type-ahead da página de membros (índices trigram,
+# ver PrimeFit.member_search): devolve só os primeiros resultados por relevância
+@custom_login_required
+def manager_member_search(request):
+    user_data = get_user_data(request)
+
+    if user_data['user_type_id'] != 1:
+        return JsonResponse({'error': 'Acesso negado.'}, status=403)
+
+    query = request.GET.get('q', '')
+    try:
+        limit = int(request.GET.get('limit', MEMBER_SEARCH_LIMIT))
+    except ValueError:
+        limit = MEMBER_SEARCH_LIMIT
+
+    with get_db_connection(request).cursor() as cursor:
+        results = search_members(cursor, query, limit)
+    return JsonResponse({'query': query, 'results': results})
+
 @custom_login_required
 def manager_classes(request):
     user_data = get_user_data(request)
     
+    page = None
+    rooms = []
+    instructors = []
+    
     try:
-        classes = AllClasses.objects.order_by('date', 'starttime').values(
-            'classscheduleid', 'name', 'instructor_name', 'date', 'starttime', 'endtime', 'room', 'maxparticipants'
+        with get_db_connection(request).cursor() as cursor:
+            cursor.execute(CLASS_FILTER_ROOMS_SQL)
+            rooms = [row[0] for row in cursor.fetchall()]
+            cursor.execute(CLASS_FILTER_INSTRUCTORS_SQL)
+            instructors = [row[0] for row in cursor.fetchall()]
+
+        classes = filter_classes(request, AllClasses.objects.all())
+
+        page = keyset_paginate(
+            classes.values(
+                'classscheduleid', 'name', 'instructor_name', 'date', 'starttime', 'endtime', 'room', 'maxparticipants'
+            ),
+            ['date', 'starttime', 'classscheduleid'],
+            cursor=request.GET.get('cursor'),
+            page_size=get_page_size(request),
         )
+        classes = page.items
     
     except Exception as e:
         classes = []
@@ -362,7 +576,11 @@ def manager_classes(request):
     
     context = {
         'user_data': user_data,
-        'classes': list(classes)
+        'classes': classes,
+        'rooms': rooms,
+        'instructors': instructors,
+        'page': page,
+        'filters': get_list_filters(request)
     }
     return render(request, 'Manager/Classes.html', context)
 
@@ -393,10 +611,25 @@ def manager_checkins(request):
 def manager_machines(request):
     user_data = get_user_data(request)
     
+    page = None
+    machine_statuses = []
+    
     try:
-        machines = Machines.objects.order_by('name').values(
-            'machineid', 'name', 'type', 'manufacturer', 'model', 'status', 'installationdate', 'maintenancedate'
+        machine_statuses = get_catalog('machinestatuses')
+        machines = Machines.objects.all()
+
+        if request.GET.get('status'):
+            machines = machines.filter(status=request.GET['status'])
+
+        page = keyset_paginate(
+            machines.values(
+                'machineid', 'name', 'type', 'manufacturer', 'model', 'status', 'installationdate', 'maintenancedate'
+            ),
+            ['name', 'machineid'],
+            cursor=request.GET.get('cursor'),
+            page_size=get_page_size(request),
         )
+        machines = page.items
     
     except Exception as e:
         machines = []
@@ -404,7 +637,10 @@ def manager_machines(request):
     
     context = {
         'user_data': user_data,
-        'machines': list(machines)
+        'machines': machines,
+        'machine_statuses': machine_statuses,
+        'page': page,
+        'filters': get_list_filters(request)
     }
     return render(request, 'Manager/Machines.html', context)
 
@@ -412,10 +648,22 @@ def manager_machines(request):
 def manager_payments(request):
     user_data = get_user_data(request)
     
+    page = None
+    plans = []
+    
     try:
-        payments = Payments.objects.order_by('-duedate').values(
-            'paymentid', 'member_name', 'plan_name', 'amount', 'duedate', 'paymentdate', 'ispayed', 'paymentmethod'
+        plans = get_catalog('plans')
+        payments = filter_payments(request, Payments.objects.all())
+
+        page = keyset_paginate(
+            payments.values(
+                'paymentid', 'member_name', 'plan_name', 'amount', 'duedate', 'paymentdate', 'ispayed', 'paymentmethod'
+            ),
+            ['-duedate', '-paymentid'],
+            cursor=request.GET.get('cursor'),
+            page_size=get_page_size(request),
         )
+        payments = page.items
     
     except Exception as e:
         payments = []
@@ -423,18 +671,61 @@ def manager_payments(request):
     
     context = {
         'user_data': user_data,
-        'payments': list(payments)
+        'payments': payments,
+        'plans': plans,
+        'page': page,
+        'filters': get_list_filters(request)
     }
     return render(request, 'Manager/Payments.html', context)
 
+# Exportações do gestor: (model, filtros, colunas, ordenação)
+EXPORT_DATASETS = {
+    'payments': (
+        Payments, filter_payments,
+        ['paymentid', 'member_name', 'plan_name', 'amount', 'duedate', 'paymentdate', 'ispayed', 'paymentmethod'],
+        ['-duedate', '-paymentid'],
+    ),
+    'checkins': (
+        AllCheckins, filter_checkins,
+        ['checkinid', 'name', 'date', 'entrancetime', 'exittime'],
+        ['-date', '-entrancetime', '-checkinid'],
+    ),
+    'members': (
+        AllMembers, filter_members,
+        ['memberid', 'name', 'email', 'phone', 'registrationdate', 'isactive', 'startdate', 'enddate', 'plan_name'],
+        ['-registrationdate', '-memberid'],
+    ),
+}
+
+@custom_login_required
+def manager_export(request, dataset):
+    user_data = get_user_data(request)
+
+    if user_data['user_type_id'] != 1:
+        return HttpResponse('Acesso negado.', status=403)
+
+    if dataset not in EXPORT_DATASETS:
+        return HttpResponse('Exportação desconhecida.', status=404)
+
+    fmt = request.GET.get('format', 'csv')
+    if fmt not in ('csv', 'ndjson'):
+        return HttpResponse('Formato inválido (csv ou ndjson).', status=400)
+
+    model, apply_filters, columns, ordering = EXPORT_DATASETS[dataset]
+    # O stream é lido depois de a view terminar: fixar já o alias do perfil
+    queryset = apply_filters(request, model.objects.using(get_db_alias(request)).order_by(*ordering))
+    return stream_export(
+        queryset, columns, f'{dataset}-{date.today().isoformat()}',
+        fmt=fmt, compress=get_bool_param(request, 'gzip') or False,
+        asynchronous=isinstance(request, ASGIRequest),
+    )
+
 @custom_login_required
 def manager_plans(request):
     user_data = get_user_data(request)
     
     try:
-        plans = Plans.objects.order_by('monthlyprice').values(
-            'planid', 'name', 'monthlyprice', 'access24h', 'description', 'isactive'
-        )
+        plans = get_catalog('plans_detail')
     
     except Exception as e:
         plans = []
@@ -442,6 +733,224 @@ def manager_plans(request):
     
     context = {
         'user_data': user_data,
-        'plans': list(plans)
+        'plans': plans
     }
     return render(request, 'Manager/Plans.html', context)
+
+@custom_login_required
+def manager_db_pool_stats(request):
+    user_data = get_user_data(request)
+
+    if user_data['user_type_id'] != 1:
+        return JsonResponse({'error': 'Acesso negado.'}, status=403)
+
+    return JsonResponse({**get_pool_stats(), 'async': async_db.stats()})
+
+# Views assíncronas (ASGI): as mesmas páginas, com as queries independentes
+# lançadas em paralelo no pool assíncrono do alias do utilizador (PrimeFit.async_db)
+MEMBER_STATS_SQL = """
+    SELECT checkin_count, class_bookings, total_hours, next_payment, payment_price
+    FROM vw_member_stats_month WHERE memberid = %s LIMIT 1
+"""
+
+MEMBER_SCHEDULE_CLASSES_SQL = """
+    SELECT class_name, date, starttime, endtime, room, instructor_name
+    FROM vw_member_schedule_classes WHERE memberid = %s
+"""
+
+MEMBER_ACCOUNT_DETAILS_SQL = "SELECT * FROM vw_member_account_details WHERE memberid = %s LIMIT 1"
+
+MEMBER_PAYMENT_HISTORY_SQL = """
+    SELECT * FROM vw_member_payment_history WHERE memberid = %s
+    ORDER BY payment_date DESC LIMIT 10
+"""
+
+MEMBER_CHECKIN_HISTORY_SQL = """
+    SELECT * FROM vw_member_checkin_history WHERE memberid = %s
+    ORDER BY checkin_date DESC, entrancetime DESC LIMIT 15
+"""
+
+@async_login_required
+async def member_home_async(request):
+    user_data = get_user_data(request)
+    alias = get_db_alias(request)
+    member_resume = build_member_resume(None)
+    schedule_classes = []
+    available_classes = []
+    is_booking = False
+
+    if request.method == 'POST':
+        is_booking = True
+        classscheduleid = request.POST.get('classscheduleid')
+        try:
+            await async_db.execute(alias, "CALL sp_book_class(%s, %s)", [user_data['memberid'], classscheduleid])
+            messages.success(request, 'Aula reservada com sucesso!')
+            return redirect('member_home')
+        except Exception as e:
+            messages.error(request, f'Erro ao reservar aula: {str(e)}')
+
+    try:
+        stats, schedule_classes, available_classes = await asyncio.gather(
+            async_db.fetchone(alias, MEMBER_STATS_SQL, [user_data['memberid']]),
+            async_db.fetchall(alias, MEMBER_SCHEDULE_CLASSES_SQL, [user_data['memberid']]),
+            async_db.fetchall(alias, MEMBER_AVAILABLE_CLASSES_SQL, [user_data['memberid']]),
+        )
+        member_resume = build_member_resume(SimpleNamespace(**stats) if stats else None)
+    except Exception as e:
+        messages.error(request, f'Erro ao carregar dados: {str(e)}')
+
+    context = {
+        'user_data': user_data,
+        'member_resume': member_resume,
+        'schedule_classes': schedule_classes,
+        'available_classes': available_classes,
+        'is_booking': is_booking
+    }
+    return render(request, 'Member/HomePage.html', context)
+
+@async_login_required
+async def member_account_async(request):
+    user_data = get_user_data(request)
+
+    if user_data['user_type_id'] != 3:
+        messages.error(request, 'Acesso negado. Apenas membros podem aceder à conta de membro.')
+        return redirect('login')
+
+    alias = get_db_alias(request)
+    try:
+        member_details, payment_history, checkin_history = await asyncio.gather(
+            async_db.fetchone(alias, MEMBER_ACCOUNT_DETAILS_SQL, [user_data['memberid']]),
+            async_db.fetchall(alias, MEMBER_PAYMENT_HISTORY_SQL, [user_data['memberid']]),
+            async_db.fetchall(alias, MEMBER_CHECKIN_HISTORY_SQL, [user_data['memberid']]),
+        )
+        if len(checkin_history) < 15:
+            checkin_history += await archived_checkins_async(user_data['memberid'], 15 - len(checkin_history))
+
+    except Exception as e:
+        member_details = None
+        payment_history = []
+        checkin_history = []
+        messages.error(request, f'Erro ao carregar dados da conta: {str(e)}')
+
+    context = {
+        'user_data': user_data,
+        'member_details': member_details,
+        'payment_history': payment_history,
+        'checkin_history': checkin_history
+    }
+    return render(request, 'Member/Account.html', context)
+
+@async_login_required
+async def manager_dashboard_async(request):
+    user_data = get_user_data(request)
+    alias = get_db_alias(request)
+    occupancy = None
+
+    try:
+        stats, occupancy_hours = await asyncio.gather(
+            async_db.fetchone(alias, "SELECT * FROM vw_dashboard_stats"),
+            async_db.fetchall(alias, OCCUPANCY_SQL),
+        )
+        stats = stats or {}
+        occupancy = {
+            'current': occupancy_hours[-1]['occupancy'] if occupancy_hours else 0,
+            'hours': occupancy_hours,
+        }
+    except Exception as e:
+        stats = {}
+        messages.error(request, f'Erro ao carregar estatísticas: {str(e)}')
+
+    context = {
+        'user_data': user_data,
+        'total_members': stats.get('total_members', 0),
+        'total_instructors': stats.get('total_instructors', 0),
+        'active_memberships': stats.get('active_memberships', 0),
+        'today_checkins_count': stats.get('today_checkins', 0),
+        'occupancy': occupancy
+    }
+    return render(request, 'Manager/Dashboard.html', context)
+
+# Ocupação atual do ginásio (contadores mantidos pelos triggers de CHECKIN)
+@custom_login_required
+def manager_occupancy(request):
+    user_data = get_user_data(request)
+
+    if user_data['user_type_id'] != 1:
+        return JsonResponse({'error': 'Acesso negado.'}, status=403)
+
+    with get_db_connection(request).cursor() as cursor:
+        return JsonResponse(read_occupancy(cursor))
+
+# Atualizações da ocupação por server-sent events; todos os clientes do processo
+# partilham a mesma ligação LISTEN (PrimeFit.occupancy)
+@custom_login_required
+def manager_occupancy_stream(request):
+    user_data = get_user_data(request)
+
+    if user_data['user_type_id'] != 1:
+        return HttpResponse('Acesso negado.', status=403)
+
+    keepalive = settings.OCCUPANCY_KEEPALIVE_SECONDS
+    if isinstance(request, ASGIRequest):
+        stream = occupancy_stream(keepalive)
+    else:
+        stream = occupancy_stream_sync(keepalive)
+    response = StreamingHttpResponse(stream, content_type='text/event-stream')
+    response['Cache-Control'] = 'no-cache'
+    response['X-Accel-Buffering'] = 'no'
+    return response
+
+# Métricas de pedidos deste processo (formato de texto do Prometheus)
+def metrics_view(request):
+    principal = getattr(request, 'principal', None)
+    allowed = request.META.get('REMOTE_ADDR') in settings.METRICS_ALLOWED_IPS
+    if not allowed and not (principal and principal.is_manager):
+        return HttpResponse('Acesso negado.', status=403)
+
+    return HttpResponse(
+        request_metrics.render_prometheus() + catalog_cache.render_prometheus(),
+        content_type='text/plain; version=0.0.4'
+    )
+
+# Ingestão de eventos dos torniquetes (um evento, uma lista ou {"events": [...]})
+def is_turnstile_device(request):
+    header = request.META.get('HTTP_AUTHORIZATION', '')
+    token = header[7:] if header.startswith('Bearer ') else ''
+    return bool(token) and any(
+        hmac.compare_digest(token, allowed) for allowed in settings.TURNSTILE_API_TOKENS
+    )
+
+@csrf_exempt
+def turnstile_events(request):
+    if request.method != 'POST':
+        return JsonResponse({'error': 'Use POST.'}, status=405)
+    if not is_turnstile_device(request):
+        return JsonResponse({'error': 'Dispositivo não autorizado.'}, status=401)
+
+    try:
+        payload = json.loads(request.body)
+    except ValueError:
+        return JsonResponse({'error': 'JSON inválido.'}, status=400)
+    if isinstance(payload, dict) and 'events' in payload:
+        payload = payload['events']
+    raw_events = payload if isinstance(payload, list) else [payload]
+
+    if len(raw_events) > settings.TURNSTILE_MAX_EVENTS_PER_REQUEST:
+        return JsonResponse({'error': 'Demasiados eventos num só pedido.'}, status=413)
+
+    events = []
+    for index, raw in enumerate(raw_events):
+        try:
+            events.append(parse_event(raw))
+        except InvalidEvent as e:
+            return JsonResponse({'error': str(e), 'index': index}, status=400)
+
+    try:
+        statuses = submit_events(events)
+    except Exception as e:
+        return JsonResponse({'error': f'Erro ao gravar eventos: {str(e)}'}, status=503)
+
+    return JsonResponse({
+        'summary': Counter(statuses),
+        'events': [{'event_id': event[0], 'status': status} for event, status in zip(events, statuses)],
+    })
@@ -1,6 +1,7 @@
 DROP PROCEDURE IF EXISTS sp_create_member;
 DROP PROCEDURE IF EXISTS sp_book_class;
 DROP PROCEDURE IF EXISTS sp_update_last_login;
+DROP PROCEDURE IF EXISTS sp_update_password_hash;
 
 CREATE OR REPLACE PROCEDURE sp_create_member(
     p_name VARCHAR(100),
@@ -36,29 +37,39 @@ BEGIN
 END;
 $$;
 
+-- Takes the memberid resolved at login (no userid -> member lookup per call);
+-- an unknown member is rejected by FK_CLASSBOOKING_MEMBER
 CREATE OR REPLACE PROCEDURE sp_book_class(
-    IN p_userid INTEGER,
+    IN p_memberid INTEGER,
     IN p_classscheduleid INTEGER
 )
 LANGUAGE plpgsql AS $$
-DECLARE
-    v_memberid INTEGER;
 BEGIN
-    -- Get memberid from userid
-    SELECT m.memberid INTO v_memberid 
-    FROM member m 
-    WHERE m.userid = p_userid;
+    IF p_memberid IS NULL THEN
+        RAISE EXCEPTION 'Member ID is required';
+    END IF;
     
-    -- Check if member exists
-    IF v_memberid IS NULL THEN
-        RAISE EXCEPTION 'Member not found for user ID %', p_userid;
+    -- Check for a free seat under the schedule's row lock: concurrent bookings
+    -- of the same class are serialised here. BOOKED_COUNT itself is updated by
+    -- the CLASSBOOKING insert trigger (fn_classschedule_booked_count), which
+    -- also gives the seat back when the booking is deleted.
+    -- A NULL MAXPARTICIPANTS means the class has no limit.
+    PERFORM 1
+    FROM CLASSSCHEDULE
+    WHERE classscheduleid = p_classscheduleid
+        AND isactive = true
+        AND (maxparticipants IS NULL OR booked_count < maxparticipants)
+    FOR UPDATE;
+
+    IF NOT FOUND THEN
+        RAISE EXCEPTION 'Class schedule % is full or not available', p_classscheduleid;
     END IF;
     
-    -- Insert the class booking
+    -- Insert the class booking (the trigger takes the seat)
     INSERT INTO CLASSBOOKING (memberid, classscheduleid, bookingdate)
-    VALUES (v_memberid, p_classscheduleid, CURRENT_TIMESTAMP);
+    VALUES (p_memberid, p_classscheduleid, CURRENT_TIMESTAMP);
     
-    RAISE NOTICE 'Class booking created successfully for member % in class schedule %', v_memberid, p_classscheduleid;
+    RAISE NOTICE 'Class booking created successfully for member % in class schedule %', p_memberid, p_classscheduleid;
     
 EXCEPTION
     WHEN unique_violation THEN
@@ -93,3 +104,23 @@ $$;
 
 -- Comment: This procedure safely updates the last_login timestamp for a user
 -- It includes error handling to ensure the user exists and provides meaningful error messages
+
+-- Stored procedure to replace a password hash made with an outdated hasher/cost.
+-- Called after a successful login; PASSWORD_CHANGED_AT is left untouched because
+-- the password itself did not change
+CREATE OR REPLACE PROCEDURE sp_update_password_hash(
+    IN p_userid INTEGER,
+    IN p_password VARCHAR(255)
+)
+LANGUAGE plpgsql
+AS $$
+BEGIN
+    UPDATE users 
+    SET password = p_password 
+    WHERE userid = p_userid;
+    
+    IF NOT FOUND THEN
+        RAISE EXCEPTION 'User with ID % not found', p_userid;
+    END IF;
+END;
+$$;
@@ -5,11 +5,18 @@
 
 -- DROP TABLES AND INDEXES IN DEPENDENCY ORDER (child to parent)
 -- First drop foreign key constraints to avoid dependency issues
+DROP TABLE IF EXISTS TURNSTILEEVENT CASCADE;
+DROP TABLE IF EXISTS MEMBER_MONTH_STATS CASCADE;
+DROP TABLE IF EXISTS HOURLYOCCUPANCY CASCADE;
+DROP TABLE IF EXISTS DAILYCHECKINCOUNT CASCADE;
+DROP TABLE IF EXISTS DASHBOARDCOUNTERS CASCADE;
+DROP TABLE IF EXISTS ARCHIVEWATERMARK CASCADE;
 DROP TABLE IF EXISTS CHECKIN CASCADE;
 DROP TABLE IF EXISTS CLASSBOOKING CASCADE;
 DROP TABLE IF EXISTS PAYMENT CASCADE;
 DROP TABLE IF EXISTS MEMBERSUBSCRIPTION CASCADE;
 DROP TABLE IF EXISTS CLASSSCHEDULE CASCADE;
+DROP TABLE IF EXISTS CLASSRECURRENCE CASCADE;
 DROP TABLE IF EXISTS MACHINEMAINTENANCELOG CASCADE;
 DROP TABLE IF EXISTS CLASS CASCADE;
 DROP TABLE IF EXISTS MACHINE CASCADE;
@@ -20,6 +27,9 @@ DROP TABLE IF EXISTS PLAN CASCADE;
 DROP TABLE IF EXISTS MACHINESTATUS CASCADE;
 DROP TABLE IF EXISTS USERTYPE CASCADE;
 
+-- Trigram indexes for the member search (PrimeFit.member_search)
+CREATE EXTENSION IF NOT EXISTS pg_trgm;
+
 -- CREATE TABLES IN DEPENDENCY ORDER (parent to child)
 
 /*==============================================================*/
@@ -104,6 +114,7 @@ CREATE TABLE MEMBER (
    ADDRESS              VARCHAR(255)         NOT NULL,
    CITY                 VARCHAR(100)         NOT NULL,
    POSTALCODE           VARCHAR(20)          NOT NULL,
+   CARDNUMBER           VARCHAR(32)          UNIQUE,
    ISACTIVE             BOOLEAN              NOT NULL DEFAULT TRUE,
    CREATED_AT           TIMESTAMP            DEFAULT CURRENT_TIMESTAMP,
    UPDATED_AT           TIMESTAMP            DEFAULT CURRENT_TIMESTAMP,
@@ -149,6 +160,30 @@ CREATE TABLE CLASS (
       REFERENCES INSTRUCTOR (INSTRUCTORID) ON DELETE RESTRICT ON UPDATE CASCADE
 );
 
+/*==============================================================*/
+/* Table: CLASSRECURRENCE                                       */
+/*==============================================================*/
+-- Recurring definition of a class, expanded into CLASSSCHEDULE rows by
+-- sync_class_schedules (PrimeFit.recurrence). RRULE is a subset of RFC 5545:
+-- FREQ=DAILY|WEEKLY|MONTHLY, INTERVAL, BYDAY, BYMONTHDAY, COUNT and UNTIL.
+-- ENDTIME and MAXPARTICIPANTS default to the class duration and capacity.
+CREATE TABLE CLASSRECURRENCE (
+   RECURRENCEID         SERIAL               PRIMARY KEY,
+   CLASSID              INTEGER              NOT NULL,
+   RRULE                VARCHAR(255)         NOT NULL CHECK (RRULE ~ '^FREQ=(DAILY|WEEKLY|MONTHLY)'),
+   DTSTART              DATE                 NOT NULL DEFAULT CURRENT_DATE,
+   STARTTIME            TIME                 NOT NULL,
+   ENDTIME              TIME,
+   MAXPARTICIPANTS      INTEGER              CHECK (MAXPARTICIPANTS > 0),
+   EXDATES              DATE[]               NOT NULL DEFAULT '{}',
+   ISACTIVE             BOOLEAN              NOT NULL DEFAULT TRUE,
+   CREATED_AT           TIMESTAMP            DEFAULT CURRENT_TIMESTAMP,
+   UPDATED_AT           TIMESTAMP            DEFAULT CURRENT_TIMESTAMP,
+   CONSTRAINT FK_CLASSRECURRENCE_CLASS FOREIGN KEY (CLASSID) 
+      REFERENCES CLASS (CLASSID) ON DELETE CASCADE ON UPDATE CASCADE,
+   CONSTRAINT CHK_RECURRENCE_TIMES CHECK (ENDTIME IS NULL OR ENDTIME > STARTTIME)
+);
+
 /*==============================================================*/
 /* Table: MEMBERSUBSCRIPTION                                    */
 /*==============================================================*/
@@ -180,11 +215,16 @@ CREATE TABLE CLASSSCHEDULE (
    STARTTIME            TIME                 NOT NULL,
    ENDTIME              TIME                 NOT NULL,
    MAXPARTICIPANTS      INTEGER              CHECK (MAXPARTICIPANTS > 0),
+   BOOKED_COUNT         INTEGER              NOT NULL DEFAULT 0,
    ISACTIVE             BOOLEAN              NOT NULL DEFAULT TRUE,
+   RECURRENCEID         INTEGER,
    CREATED_AT           TIMESTAMP            DEFAULT CURRENT_TIMESTAMP,
    UPDATED_AT           TIMESTAMP            DEFAULT CURRENT_TIMESTAMP,
+   CONSTRAINT CHK_SCHEDULE_BOOKED_COUNT CHECK (BOOKED_COUNT >= 0 AND (MAXPARTICIPANTS IS NULL OR BOOKED_COUNT <= MAXPARTICIPANTS)),
    CONSTRAINT FK_CLASSSCHEDULE_CLASS FOREIGN KEY (CLASSID) 
       REFERENCES CLASS (CLASSID) ON DELETE RESTRICT ON UPDATE CASCADE,
+   CONSTRAINT FK_CLASSSCHEDULE_RECURRENCE FOREIGN KEY (RECURRENCEID) 
+      REFERENCES CLASSRECURRENCE (RECURRENCEID) ON DELETE SET NULL ON UPDATE CASCADE,
    CONSTRAINT CHK_SCHEDULE_TIMES CHECK (ENDTIME > STARTTIME),
    CONSTRAINT UQ_CLASS_DATETIME UNIQUE (CLASSID, DATE, STARTTIME)
 );
@@ -208,21 +248,30 @@ CREATE TABLE MACHINEMAINTENANCELOG (
 /*==============================================================*/
 /* Table: PAYMENT                                               */
 /*==============================================================*/
+-- Partitioned by month of DUEDATE (see fn_ensure_month_partitions below).
+-- Unique constraints on a partitioned table must include the partition key,
+-- hence PRIMARY KEY (PAYMENTID, DUEDATE) and UQ_PAYMENT_REFERENCE.
 CREATE TABLE PAYMENT (
-   PAYMENTID            SERIAL               PRIMARY KEY,
+   PAYMENTID            SERIAL               NOT NULL,
    SUBSCRIPTIONID       INTEGER              NOT NULL,
    AMOUNT               DECIMAL(10,2)        NOT NULL CHECK (AMOUNT > 0),
    ISPAYED              BOOLEAN              NOT NULL DEFAULT FALSE,
    DUEDATE              DATE                 NOT NULL,
    PAYMENTDATE          DATE                 NULL,
    PAYMENTMETHOD        VARCHAR(50),
-   REFERENCE            VARCHAR(100)         UNIQUE,
+   REFERENCE            VARCHAR(100),
+   ISOVERDUE            BOOLEAN              NOT NULL DEFAULT FALSE,
    CREATED_AT           TIMESTAMP            DEFAULT CURRENT_TIMESTAMP,
    UPDATED_AT           TIMESTAMP            DEFAULT CURRENT_TIMESTAMP,
+   CONSTRAINT PK_PAYMENT PRIMARY KEY (PAYMENTID, DUEDATE),
+   CONSTRAINT UQ_PAYMENT_REFERENCE UNIQUE (REFERENCE, DUEDATE),
+   -- One payment per subscription and billing cycle: makes the billing run idempotent
+   CONSTRAINT UQ_PAYMENT_SUBSCRIPTION_DUE UNIQUE (SUBSCRIPTIONID, DUEDATE),
    CONSTRAINT FK_PAYMENT_SUBSCRIPTION FOREIGN KEY (SUBSCRIPTIONID) 
       REFERENCES MEMBERSUBSCRIPTION (SUBSCRIPTIONID) ON DELETE RESTRICT ON UPDATE CASCADE,
-   CONSTRAINT CHK_PAYMENT_DATE CHECK (PAYMENTDATE IS NULL OR PAYMENTDATE >= DUEDATE)
-);
+   CONSTRAINT CHK_PAYMENT_DATE CHECK (PAYMENTDATE IS NULL OR PAYMENTDATE >= DUEDATE),
+   CONSTRAINT CHK_PAYMENT_OVERDUE CHECK (NOT (ISPAYED AND ISOVERDUE))
+) PARTITION BY RANGE (DUEDATE);
 
 /*==============================================================*/
 /* Table: CLASSBOOKING                                          */
@@ -244,17 +293,106 @@ CREATE TABLE CLASSBOOKING (
 /*==============================================================*/
 /* Table: CHECKIN                                               */
 /*==============================================================*/
+-- Partitioned by month of DATE (see fn_ensure_month_partitions below)
 CREATE TABLE CHECKIN (
-   CHECKINID            SERIAL               PRIMARY KEY,
+   CHECKINID            SERIAL               NOT NULL,
    MEMBERID             INTEGER              NOT NULL,
    DATE                 DATE                 NOT NULL DEFAULT CURRENT_DATE,
    ENTRANCETIME         TIME                 NOT NULL DEFAULT CURRENT_TIME,
    EXITTIME             TIME                 NULL,
    CREATED_AT           TIMESTAMP            DEFAULT CURRENT_TIMESTAMP,
    UPDATED_AT           TIMESTAMP            DEFAULT CURRENT_TIMESTAMP,
+   CONSTRAINT PK_CHECKIN PRIMARY KEY (CHECKINID, DATE),
    CONSTRAINT FK_CHECKIN_MEMBER FOREIGN KEY (MEMBERID) 
       REFERENCES MEMBER (MEMBERID) ON DELETE RESTRICT ON UPDATE CASCADE,
    CONSTRAINT CHK_CHECKIN_TIMES CHECK (EXITTIME IS NULL OR EXITTIME > ENTRANCETIME)
+) PARTITION BY RANGE (DATE);
+
+/*==============================================================*/
+/* Table: DASHBOARDCOUNTERS                                     */
+/*==============================================================*/
+-- Single row with the dashboard totals, kept up to date by the triggers below
+-- so vw_dashboard_stats does not need to COUNT(*) the base tables.
+CREATE TABLE DASHBOARDCOUNTERS (
+   COUNTERID            INTEGER              PRIMARY KEY DEFAULT 1 CHECK (COUNTERID = 1),
+   TOTAL_MEMBERS        BIGINT               NOT NULL DEFAULT 0,
+   TOTAL_INSTRUCTORS    BIGINT               NOT NULL DEFAULT 0,
+   ACTIVE_MEMBERSHIPS   BIGINT               NOT NULL DEFAULT 0,
+   UPDATED_AT           TIMESTAMP            DEFAULT CURRENT_TIMESTAMP
+);
+
+/*==============================================================*/
+/* Table: ARCHIVEWATERMARK                                      */
+/*==============================================================*/
+-- One row per kind of history moved to MongoDB (PrimeFit.archive): rows dated
+-- before ARCHIVED_BEFORE may no longer be in CHECKIN/CLASSBOOKING, so the
+-- aggregates of those dates must never be rebuilt from PostgreSQL. Raised
+-- before the first DELETE of an archive run and never lowered.
+CREATE TABLE ARCHIVEWATERMARK (
+   KIND                 VARCHAR(20)          PRIMARY KEY CHECK (KIND IN ('checkins', 'bookings')),
+   ARCHIVED_BEFORE      DATE                 NOT NULL,
+   UPDATED_AT           TIMESTAMP            DEFAULT CURRENT_TIMESTAMP
+);
+
+/*==============================================================*/
+/* Table: DAILYCHECKINCOUNT                                     */
+/*==============================================================*/
+-- Check-ins per day; today's count is a primary key lookup on CURRENT_DATE.
+CREATE TABLE DAILYCHECKINCOUNT (
+   DATE                 DATE                 PRIMARY KEY,
+   TOTAL                BIGINT               NOT NULL DEFAULT 0 CHECK (TOTAL >= 0),
+   UPDATED_AT           TIMESTAMP            DEFAULT CURRENT_TIMESTAMP
+);
+
+/*==============================================================*/
+/* Table: HOURLYOCCUPANCY                                       */
+/*==============================================================*/
+-- Entries and exits per day and hour, kept by the triggers on CHECKIN.
+-- People inside now = SUM(ENTRIES - EXITS) for CURRENT_DATE; the running sum
+-- by hour is the occupancy series (vw_occupancy_today). Every change is
+-- announced with NOTIFY occupancy so the dashboards never poll CHECKIN.
+CREATE TABLE HOURLYOCCUPANCY (
+   DATE                 DATE                 NOT NULL,
+   HOUR                 SMALLINT             NOT NULL CHECK (HOUR BETWEEN 0 AND 23),
+   ENTRIES              BIGINT               NOT NULL DEFAULT 0,
+   EXITS                BIGINT               NOT NULL DEFAULT 0,
+   UPDATED_AT           TIMESTAMP            DEFAULT CURRENT_TIMESTAMP,
+   CONSTRAINT PK_HOURLYOCCUPANCY PRIMARY KEY (DATE, HOUR)
+);
+
+/*==============================================================*/
+/* Table: MEMBER_MONTH_STATS                                    */
+/*==============================================================*/
+-- Per-member monthly activity rollup read by vw_member_stats_month.
+-- MONTH is the first day of the month. Maintained by the triggers on CHECKIN
+-- and CLASSBOOKING; past months can be rebuilt with backfill_member_month_stats.
+CREATE TABLE MEMBER_MONTH_STATS (
+   MEMBERID             INTEGER              NOT NULL,
+   MONTH                DATE                 NOT NULL,
+   CHECKIN_COUNT        INTEGER              NOT NULL DEFAULT 0,
+   CLASS_BOOKINGS       INTEGER              NOT NULL DEFAULT 0,
+   TOTAL_HOURS          NUMERIC(10,2)        NOT NULL DEFAULT 0,
+   UPDATED_AT           TIMESTAMP            DEFAULT CURRENT_TIMESTAMP,
+   CONSTRAINT PK_MEMBER_MONTH_STATS PRIMARY KEY (MEMBERID, MONTH),
+   CONSTRAINT FK_MEMBER_MONTH_STATS_MEMBER FOREIGN KEY (MEMBERID) 
+      REFERENCES MEMBER (MEMBERID) ON DELETE CASCADE ON UPDATE CASCADE
+);
+
+/*==============================================================*/
+/* Table: TURNSTILEEVENT                                        */
+/*==============================================================*/
+-- Events received from the turnstiles (PrimeFit.turnstile). EVENTID is the
+-- id generated by the device, so a retried event is stored only once.
+-- 'in' events create CHECKIN rows; 'out' events close the open CHECKIN.
+CREATE TABLE TURNSTILEEVENT (
+   EVENTID              VARCHAR(64)          PRIMARY KEY,
+   MEMBERID             INTEGER              NOT NULL,
+   EVENTTYPE            VARCHAR(3)           NOT NULL CHECK (EVENTTYPE IN ('in', 'out')),
+   EVENTTIME            TIMESTAMP            NOT NULL,
+   DEVICEID             VARCHAR(50),
+   RECEIVED_AT          TIMESTAMP            DEFAULT CURRENT_TIMESTAMP,
+   CONSTRAINT FK_TURNSTILEEVENT_MEMBER FOREIGN KEY (MEMBERID) 
+      REFERENCES MEMBER (MEMBERID) ON DELETE CASCADE ON UPDATE CASCADE
 );
 
 -- CREATE PERFORMANCE INDEXES
@@ -266,15 +404,24 @@ CREATE TABLE CHECKIN (
 -- MEMBER indexes
 -- NIF is UNIQUE, so no separate index needed. Keep partial index for active members and registration lookup.
 CREATE INDEX IF NOT EXISTS IDX_MEMBER_ACTIVE ON MEMBER (ISACTIVE) WHERE ISACTIVE = TRUE;
-CREATE INDEX IF NOT EXISTS IDX_MEMBER_REGISTRATION_DATE ON MEMBER (REGISTRATIONDATE);
+-- (REGISTRATIONDATE, MEMBERID) serve a paginação por cursor da listagem de membros.
+CREATE INDEX IF NOT EXISTS IDX_MEMBER_REGISTRATION_DATE ON MEMBER (REGISTRATIONDATE, MEMBERID);
+-- Member search: substring (LIKE '%...%') and prefix lookups on NIF and phone.
+CREATE INDEX IF NOT EXISTS IDX_MEMBER_NIF_TRGM ON MEMBER USING GIN ((NIF::TEXT) gin_trgm_ops);
+CREATE INDEX IF NOT EXISTS IDX_MEMBER_PHONE_TRGM ON MEMBER USING GIN (PHONE gin_trgm_ops);
 
 -- INSTRUCTOR indexes
 -- NIF is UNIQUE (no separate index). Keep partial index for active instructors.
 CREATE INDEX IF NOT EXISTS IDX_INSTRUCTOR_ACTIVE ON INSTRUCTOR (ISACTIVE) WHERE ISACTIVE = TRUE;
 
+-- TURNSTILEEVENT indexes
+CREATE INDEX IF NOT EXISTS IDX_TURNSTILEEVENT_RECEIVED ON TURNSTILEEVENT (RECEIVED_AT);
+
 -- CHECKIN indexes
 -- Composite index for member + date to support recent checkins per member.
-CREATE INDEX IF NOT EXISTS IDX_CHECKIN_MEMBER_DATE ON CHECKIN (MEMBERID, DATE);
+-- ENTRANCETIME completes the history order (date DESC, entrancetime DESC) so
+-- "last N checkins of a member" is a backward index scan with no sort.
+CREATE INDEX IF NOT EXISTS IDX_CHECKIN_MEMBER_DATE ON CHECKIN (MEMBERID, DATE, ENTRANCETIME);
 -- Separate index on date for queries like "WHERE date = CURRENT_DATE".
 CREATE INDEX IF NOT EXISTS IDX_CHECKIN_DATE ON CHECKIN (DATE);
 -- ENTRANCETIME is rarely filtered alone; omit index unless proven needed.
@@ -286,8 +433,14 @@ CREATE INDEX IF NOT EXISTS IDX_CLASS_ROOM ON CLASS (ROOM);
 
 -- CLASSSCHEDULE indexes
 CREATE INDEX IF NOT EXISTS IDX_CLASSSCHEDULE_CLASS ON CLASSSCHEDULE (CLASSID);
-CREATE INDEX IF NOT EXISTS IDX_CLASSSCHEDULE_DATE_TIME ON CLASSSCHEDULE (DATE, STARTTIME);
+-- CLASSSCHEDULEID como desempate para a paginação por cursor (date, starttime).
+CREATE INDEX IF NOT EXISTS IDX_CLASSSCHEDULE_DATE_TIME ON CLASSSCHEDULE (DATE, STARTTIME, CLASSSCHEDULEID);
 CREATE INDEX IF NOT EXISTS IDX_CLASSSCHEDULE_ACTIVE ON CLASSSCHEDULE (ISACTIVE) WHERE ISACTIVE = TRUE;
+-- Occurrences generated from a recurrence, by date (cancellations of sync_class_schedules).
+CREATE INDEX IF NOT EXISTS IDX_CLASSSCHEDULE_RECURRENCE ON CLASSSCHEDULE (RECURRENCEID, DATE) WHERE RECURRENCEID IS NOT NULL;
+
+-- CLASSRECURRENCE indexes
+CREATE INDEX IF NOT EXISTS IDX_CLASSRECURRENCE_CLASS ON CLASSRECURRENCE (CLASSID);
 
 -- CLASSBOOKING indexes
 CREATE INDEX IF NOT EXISTS IDX_CLASSBOOKING_MEMBER ON CLASSBOOKING (MEMBERID);
@@ -301,14 +454,16 @@ CREATE INDEX IF NOT EXISTS IDX_MEMBERSUBSCRIPTION_ACTIVE ON MEMBERSUBSCRIPTION (
 CREATE INDEX IF NOT EXISTS IDX_MEMBERSUBSCRIPTION_DATES ON MEMBERSUBSCRIPTION (STARTDATE, ENDDATE);
 
 -- PAYMENT indexes
-CREATE INDEX IF NOT EXISTS IDX_PAYMENT_SUBSCRIPTION ON PAYMENT (SUBSCRIPTIONID);
-CREATE INDEX IF NOT EXISTS IDX_PAYMENT_DUE_DATE ON PAYMENT (DUEDATE);
+-- Lookups by SUBSCRIPTIONID use UQ_PAYMENT_SUBSCRIPTION_DUE (SUBSCRIPTIONID, DUEDATE).
+-- PAYMENTID como desempate para a paginação por cursor (duedate).
+CREATE INDEX IF NOT EXISTS IDX_PAYMENT_DUE_DATE ON PAYMENT (DUEDATE, PAYMENTID);
 CREATE INDEX IF NOT EXISTS IDX_PAYMENT_UNPAID_DUE ON PAYMENT (DUEDATE) WHERE ISPAYED = FALSE;
 
 -- MACHINE indexes
 CREATE INDEX IF NOT EXISTS IDX_MACHINE_STATUS ON MACHINE (MACHINESTATUSID);
 CREATE INDEX IF NOT EXISTS IDX_MACHINE_MAINTENANCE_DATE ON MACHINE (MAINTENANCEDATE);
 CREATE INDEX IF NOT EXISTS IDX_MACHINE_TYPE ON MACHINE (TYPE);
+CREATE INDEX IF NOT EXISTS IDX_MACHINE_NAME ON MACHINE (NAME, MACHINEID);
 
 -- MACHINEMAINTENANCELOG indexes
 CREATE INDEX IF NOT EXISTS IDX_MAINTENANCELOG_MACHINE ON MACHINEMAINTENANCELOG (MACHINEID);
@@ -323,6 +478,9 @@ CREATE INDEX IF NOT EXISTS IDX_USERTYPE_LABEL ON USERTYPE (LABEL);
 CREATE INDEX IF NOT EXISTS IDX_USERS_USERTYPE ON USERS (USERTYPEID);
 CREATE INDEX IF NOT EXISTS IDX_USERS_ACTIVE ON USERS (ISACTIVE) WHERE ISACTIVE = TRUE;
 CREATE INDEX IF NOT EXISTS IDX_USERS_LAST_LOGIN ON USERS (LAST_LOGIN);
+-- Member search: substring and fuzzy (word similarity, <%) matching on name and email.
+CREATE INDEX IF NOT EXISTS IDX_USERS_NAME_TRGM ON USERS USING GIN (LOWER(NAME) gin_trgm_ops);
+CREATE INDEX IF NOT EXISTS IDX_USERS_EMAIL_TRGM ON USERS USING GIN (LOWER(EMAIL) gin_trgm_ops);
 
 -- Avoid creating explicit indexes on columns that already have UNIQUE constraints (e.g. MEMBER.NIF, MEMBER.USERID, INSTRUCTOR.NIF, INSTRUCTOR.USERID, USERS.EMAIL)
 
@@ -345,11 +503,355 @@ CREATE TRIGGER update_users_updated_at BEFORE UPDATE ON USERS FOR EACH ROW EXECU
 CREATE TRIGGER update_machine_updated_at BEFORE UPDATE ON MACHINE FOR EACH ROW EXECUTE FUNCTION update_updated_at_column();
 CREATE TRIGGER update_class_updated_at BEFORE UPDATE ON CLASS FOR EACH ROW EXECUTE FUNCTION update_updated_at_column();
 CREATE TRIGGER update_membersubscription_updated_at BEFORE UPDATE ON MEMBERSUBSCRIPTION FOR EACH ROW EXECUTE FUNCTION update_updated_at_column();
+CREATE TRIGGER update_classrecurrence_updated_at BEFORE UPDATE ON CLASSRECURRENCE FOR EACH ROW EXECUTE FUNCTION update_updated_at_column();
 CREATE TRIGGER update_classschedule_updated_at BEFORE UPDATE ON CLASSSCHEDULE FOR EACH ROW EXECUTE FUNCTION update_updated_at_column();
 CREATE TRIGGER update_payment_updated_at BEFORE UPDATE ON PAYMENT FOR EACH ROW EXECUTE FUNCTION update_updated_at_column();
 CREATE TRIGGER update_classbooking_updated_at BEFORE UPDATE ON CLASSBOOKING FOR EACH ROW EXECUTE FUNCTION update_updated_at_column();
 CREATE TRIGGER update_checkin_updated_at BEFORE UPDATE ON CHECKIN FOR EACH ROW EXECUTE FUNCTION update_updated_at_column();
 
+-- CREATE TRIGGER FOR THE PAYMENT OVERDUE FLAG
+-- ISOVERDUE is set by the billing run (PrimeFit.billing.mark_overdue) and
+-- cleared here whenever a payment is settled, whatever the code path
+-- (reconciliation, manual payment, procedures), so CHK_PAYMENT_OVERDUE holds
+CREATE OR REPLACE FUNCTION fn_payment_clear_overdue()
+RETURNS TRIGGER AS $$
+BEGIN
+    IF NEW.ISPAYED THEN
+        NEW.ISOVERDUE = FALSE;
+    END IF;
+    RETURN NEW;
+END;
+$$ language 'plpgsql';
+
+CREATE TRIGGER payment_clear_overdue BEFORE UPDATE OF ISPAYED, ISOVERDUE ON PAYMENT FOR EACH ROW EXECUTE FUNCTION fn_payment_clear_overdue();
+
+-- CREATE TRIGGERS FOR CATALOG CACHE INVALIDATION
+-- PrimeFit.catalog caches PLAN, USERTYPE and MACHINESTATUS in every worker and
+-- listens on catalog_changed; the payload is the table that changed. The
+-- notification is only delivered after COMMIT.
+CREATE OR REPLACE FUNCTION fn_notify_catalog_change()
+RETURNS TRIGGER AS $$
+BEGIN
+    PERFORM pg_notify('catalog_changed', lower(TG_TABLE_NAME));
+    RETURN NULL;
+END;
+$$ language 'plpgsql';
+
+CREATE TRIGGER plan_catalog_changed AFTER INSERT OR UPDATE OR DELETE OR TRUNCATE ON PLAN FOR EACH STATEMENT EXECUTE FUNCTION fn_notify_catalog_change();
+CREATE TRIGGER usertype_catalog_changed AFTER INSERT OR UPDATE OR DELETE OR TRUNCATE ON USERTYPE FOR EACH STATEMENT EXECUTE FUNCTION fn_notify_catalog_change();
+CREATE TRIGGER machinestatus_catalog_changed AFTER INSERT OR UPDATE OR DELETE OR TRUNCATE ON MACHINESTATUS FOR EACH STATEMENT EXECUTE FUNCTION fn_notify_catalog_change();
+
+-- CREATE TRIGGERS FOR DASHBOARD COUNTERS
+-- Statement-level triggers with transition tables: a bulk INSERT/COPY applies a
+-- single delta per statement instead of one counter UPDATE per row.
+-- The CHECKIN/CLASSBOOKING aggregate triggers do nothing while the
+-- transaction has primefit.archiving = on (SET LOCAL by PrimeFit.archive):
+-- archived rows still count in DAILYCHECKINCOUNT, HOURLYOCCUPANCY,
+-- MEMBER_MONTH_STATS and BOOKED_COUNT.
+-- TG_ARGV[0] is the DASHBOARDCOUNTERS column maintained by the trigger.
+CREATE OR REPLACE FUNCTION fn_dashboard_counter_isactive()
+RETURNS TRIGGER AS $$
+DECLARE
+    v_delta BIGINT := 0;
+BEGIN
+    IF TG_OP IN ('INSERT', 'UPDATE') THEN
+        SELECT v_delta + COUNT(*) FILTER (WHERE isactive) INTO v_delta FROM new_rows;
+    END IF;
+    IF TG_OP IN ('UPDATE', 'DELETE') THEN
+        SELECT v_delta - COUNT(*) FILTER (WHERE isactive) INTO v_delta FROM old_rows;
+    END IF;
+
+    IF v_delta <> 0 THEN
+        EXECUTE format(
+            'UPDATE dashboardcounters SET %1$I = %1$I + $1, updated_at = CURRENT_TIMESTAMP WHERE counterid = 1',
+            TG_ARGV[0]
+        ) USING v_delta;
+    END IF;
+    RETURN NULL;
+END;
+$$ language 'plpgsql';
+
+CREATE OR REPLACE FUNCTION fn_daily_checkin_counter()
+RETURNS TRIGGER AS $$
+BEGIN
+    -- archive_history moves old rows to MongoDB: the aggregates keep them
+    IF current_setting('primefit.archiving', true) = 'on' THEN
+        RETURN NULL;
+    END IF;
+    IF TG_OP = 'DELETE' THEN
+        UPDATE dailycheckincount d
+        SET total = d.total - o.cnt, updated_at = CURRENT_TIMESTAMP
+        FROM (SELECT date, COUNT(*) AS cnt FROM old_rows GROUP BY date) o
+        WHERE d.date = o.date;
+    ELSIF TG_OP = 'UPDATE' THEN
+        -- Only rows whose DATE changed move between days (exit updates are a no-op)
+        UPDATE dailycheckincount d
+        SET total = d.total - o.cnt, updated_at = CURRENT_TIMESTAMP
+        FROM (
+            SELECT o.date, COUNT(*) AS cnt
+            FROM old_rows o JOIN new_rows n ON n.checkinid = o.checkinid
+            WHERE n.date <> o.date
+            GROUP BY o.date
+        ) o
+        WHERE d.date = o.date;
+
+        INSERT INTO dailycheckincount (date, total)
+        SELECT n.date, COUNT(*)
+        FROM old_rows o JOIN new_rows n ON n.checkinid = o.checkinid
+        WHERE n.date <> o.date
+        GROUP BY n.date
+        ON CONFLICT (date) DO UPDATE
+        SET total = dailycheckincount.total + EXCLUDED.total, updated_at = CURRENT_TIMESTAMP;
+    ELSE
+        INSERT INTO dailycheckincount (date, total)
+        SELECT date, COUNT(*) FROM new_rows GROUP BY date
+        ON CONFLICT (date) DO UPDATE
+        SET total = dailycheckincount.total + EXCLUDED.total, updated_at = CURRENT_TIMESTAMP;
+    END IF;
+    RETURN NULL;
+END;
+$$ language 'plpgsql';
+
+-- Each version of a row counts +1 entry at its entrance hour and +1 exit at
+-- its exit hour; old versions count with the opposite sign, so closing a
+-- check-in only touches the exit hour. The NOTIFY payload is the list of
+-- affected dates and is delivered once per transaction, after COMMIT.
+CREATE OR REPLACE FUNCTION fn_hourly_occupancy()
+RETURNS TRIGGER AS $$
+DECLARE
+    v_date DATE[] := '{}';
+    v_hour SMALLINT[] := '{}';
+    v_entries BIGINT[] := '{}';
+    v_exits BIGINT[] := '{}';
+    v_dates TEXT;
+BEGIN
+    -- archive_history moves old rows to MongoDB: the aggregates keep them
+    IF current_setting('primefit.archiving', true) = 'on' THEN
+        RETURN NULL;
+    END IF;
+    -- new_rows/old_rows only exist for the operations that define them
+    IF TG_OP IN ('INSERT', 'UPDATE') THEN
+        SELECT v_date || array_agg(date), v_hour || array_agg(hour),
+               v_entries || array_agg(entries), v_exits || array_agg(exits)
+        INTO v_date, v_hour, v_entries, v_exits
+        FROM (
+            SELECT date, EXTRACT(HOUR FROM entrancetime)::SMALLINT AS hour, 1::BIGINT AS entries, 0::BIGINT AS exits
+            FROM new_rows
+            UNION ALL
+            SELECT date, EXTRACT(HOUR FROM exittime)::SMALLINT, 0, 1
+            FROM new_rows WHERE exittime IS NOT NULL
+        ) n;
+    END IF;
+    IF TG_OP IN ('UPDATE', 'DELETE') THEN
+        SELECT v_date || array_agg(date), v_hour || array_agg(hour),
+               v_entries || array_agg(entries), v_exits || array_agg(exits)
+        INTO v_date, v_hour, v_entries, v_exits
+        FROM (
+            SELECT date, EXTRACT(HOUR FROM entrancetime)::SMALLINT AS hour, -1::BIGINT AS entries, 0::BIGINT AS exits
+            FROM old_rows
+            UNION ALL
+            SELECT date, EXTRACT(HOUR FROM exittime)::SMALLINT, 0, -1
+            FROM old_rows WHERE exittime IS NOT NULL
+        ) o;
+    END IF;
+
+    WITH applied AS (
+        INSERT INTO hourlyoccupancy (date, hour, entries, exits)
+        SELECT date, hour, SUM(entries), SUM(exits)
+        FROM unnest(v_date, v_hour, v_entries, v_exits) AS d(date, hour, entries, exits)
+        WHERE date IS NOT NULL
+        GROUP BY date, hour
+        HAVING SUM(entries) <> 0 OR SUM(exits) <> 0
+        ON CONFLICT (date, hour) DO UPDATE
+        SET entries = hourlyoccupancy.entries + EXCLUDED.entries,
+            exits = hourlyoccupancy.exits + EXCLUDED.exits,
+            updated_at = CURRENT_TIMESTAMP
+        RETURNING date
+    )
+    SELECT string_agg(DISTINCT date::TEXT, ',') INTO v_dates FROM applied;
+
+    IF v_dates IS NOT NULL THEN
+        PERFORM pg_notify('occupancy', v_dates);
+    END IF;
+    RETURN NULL;
+END;
+$$ language 'plpgsql';
+
+CREATE TRIGGER member_counter_ins AFTER INSERT ON MEMBER REFERENCING NEW TABLE AS new_rows FOR EACH STATEMENT EXECUTE FUNCTION fn_dashboard_counter_isactive('total_members');
+CREATE TRIGGER member_counter_upd AFTER UPDATE ON MEMBER REFERENCING OLD TABLE AS old_rows NEW TABLE AS new_rows FOR EACH STATEMENT EXECUTE FUNCTION fn_dashboard_counter_isactive('total_members');
+CREATE TRIGGER member_counter_del AFTER DELETE ON MEMBER REFERENCING OLD TABLE AS old_rows FOR EACH STATEMENT EXECUTE FUNCTION fn_dashboard_counter_isactive('total_members');
+CREATE TRIGGER instructor_counter_ins AFTER INSERT ON INSTRUCTOR REFERENCING NEW TABLE AS new_rows FOR EACH STATEMENT EXECUTE FUNCTION fn_dashboard_counter_isactive('total_instructors');
+CREATE TRIGGER instructor_counter_upd AFTER UPDATE ON INSTRUCTOR REFERENCING OLD TABLE AS old_rows NEW TABLE AS new_rows FOR EACH STATEMENT EXECUTE FUNCTION fn_dashboard_counter_isactive('total_instructors');
+CREATE TRIGGER instructor_counter_del AFTER DELETE ON INSTRUCTOR REFERENCING OLD TABLE AS old_rows FOR EACH STATEMENT EXECUTE FUNCTION fn_dashboard_counter_isactive('total_instructors');
+CREATE TRIGGER membersubscription_counter_ins AFTER INSERT ON MEMBERSUBSCRIPTION REFERENCING NEW TABLE AS new_rows FOR EACH STATEMENT EXECUTE FUNCTION fn_dashboard_counter_isactive('active_memberships');
+CREATE TRIGGER membersubscription_counter_upd AFTER UPDATE ON MEMBERSUBSCRIPTION REFERENCING OLD TABLE AS old_rows NEW TABLE AS new_rows FOR EACH STATEMENT EXECUTE FUNCTION fn_dashboard_counter_isactive('active_memberships');
+CREATE TRIGGER membersubscription_counter_del AFTER DELETE ON MEMBERSUBSCRIPTION REFERENCING OLD TABLE AS old_rows FOR EACH STATEMENT EXECUTE FUNCTION fn_dashboard_counter_isactive('active_memberships');
+CREATE TRIGGER checkin_counter_ins AFTER INSERT ON CHECKIN REFERENCING NEW TABLE AS new_rows FOR EACH STATEMENT EXECUTE FUNCTION fn_daily_checkin_counter();
+CREATE TRIGGER checkin_counter_upd AFTER UPDATE ON CHECKIN REFERENCING OLD TABLE AS old_rows NEW TABLE AS new_rows FOR EACH STATEMENT EXECUTE FUNCTION fn_daily_checkin_counter();
+CREATE TRIGGER checkin_counter_del AFTER DELETE ON CHECKIN REFERENCING OLD TABLE AS old_rows FOR EACH STATEMENT EXECUTE FUNCTION fn_daily_checkin_counter();
+CREATE TRIGGER checkin_occupancy_ins AFTER INSERT ON CHECKIN REFERENCING NEW TABLE AS new_rows FOR EACH STATEMENT EXECUTE FUNCTION fn_hourly_occupancy();
+CREATE TRIGGER checkin_occupancy_upd AFTER UPDATE ON CHECKIN REFERENCING OLD TABLE AS old_rows NEW TABLE AS new_rows FOR EACH STATEMENT EXECUTE FUNCTION fn_hourly_occupancy();
+CREATE TRIGGER checkin_occupancy_del AFTER DELETE ON CHECKIN REFERENCING OLD TABLE AS old_rows FOR EACH STATEMENT EXECUTE FUNCTION fn_hourly_occupancy();
+
+-- CREATE TRIGGERS FOR MEMBER MONTHLY STATS
+-- Deltas are grouped by (memberid, month) so a bulk statement upserts each
+-- affected rollup row once. On UPDATE the old and new versions are summed with
+-- opposite signs, so only months whose totals changed are written (e.g. the
+-- exit of an open check-in adds its hours).
+CREATE OR REPLACE FUNCTION fn_checkin_hours(p_entrancetime TIME, p_exittime TIME)
+RETURNS NUMERIC AS $$
+    SELECT COALESCE(EXTRACT(EPOCH FROM (p_exittime - p_entrancetime)) / 3600, 0)::NUMERIC;
+$$ language 'sql' IMMUTABLE;
+
+CREATE OR REPLACE FUNCTION fn_member_month_stats_checkin()
+RETURNS TRIGGER AS $$
+BEGIN
+    -- archive_history moves old rows to MongoDB: the aggregates keep them
+    IF current_setting('primefit.archiving', true) = 'on' THEN
+        RETURN NULL;
+    END IF;
+    IF TG_OP = 'INSERT' THEN
+        INSERT INTO member_month_stats (memberid, month, checkin_count, total_hours)
+        SELECT memberid, DATE_TRUNC('month', date)::date, COUNT(*), SUM(fn_checkin_hours(entrancetime, exittime))
+        FROM new_rows
+        GROUP BY memberid, DATE_TRUNC('month', date)::date
+        ON CONFLICT (memberid, month) DO UPDATE
+        SET checkin_count = member_month_stats.checkin_count + EXCLUDED.checkin_count,
+            total_hours = member_month_stats.total_hours + EXCLUDED.total_hours,
+            updated_at = CURRENT_TIMESTAMP;
+    ELSIF TG_OP = 'DELETE' THEN
+        UPDATE member_month_stats mms
+        SET checkin_count = mms.checkin_count - o.cnt,
+            total_hours = mms.total_hours - o.hours,
+            updated_at = CURRENT_TIMESTAMP
+        FROM (
+            SELECT memberid, DATE_TRUNC('month', date)::date AS month, COUNT(*) AS cnt,
+                   SUM(fn_checkin_hours(entrancetime, exittime)) AS hours
+            FROM old_rows
+            GROUP BY memberid, DATE_TRUNC('month', date)::date
+        ) o
+        WHERE mms.memberid = o.memberid AND mms.month = o.month;
+    ELSE
+        INSERT INTO member_month_stats (memberid, month, checkin_count, total_hours)
+        SELECT memberid, month, SUM(cnt), SUM(hours)
+        FROM (
+            SELECT memberid, DATE_TRUNC('month', date)::date AS month, 1 AS cnt,
+                   fn_checkin_hours(entrancetime, exittime) AS hours
+            FROM new_rows
+            UNION ALL
+            SELECT memberid, DATE_TRUNC('month', date)::date, -1,
+                   -fn_checkin_hours(entrancetime, exittime)
+            FROM old_rows
+        ) delta
+        GROUP BY memberid, month
+        HAVING SUM(cnt) <> 0 OR SUM(hours) <> 0
+        ON CONFLICT (memberid, month) DO UPDATE
+        SET checkin_count = member_month_stats.checkin_count + EXCLUDED.checkin_count,
+            total_hours = member_month_stats.total_hours + EXCLUDED.total_hours,
+            updated_at = CURRENT_TIMESTAMP;
+    END IF;
+    RETURN NULL;
+END;
+$$ language 'plpgsql';
+
+CREATE OR REPLACE FUNCTION fn_member_month_stats_booking()
+RETURNS TRIGGER AS $$
+BEGIN
+    -- archive_history moves old rows to MongoDB: the aggregates keep them
+    IF current_setting('primefit.archiving', true) = 'on' THEN
+        RETURN NULL;
+    END IF;
+    IF TG_OP = 'INSERT' THEN
+        INSERT INTO member_month_stats (memberid, month, class_bookings)
+        SELECT memberid, DATE_TRUNC('month', bookingdate)::date, COUNT(*)
+        FROM new_rows
+        GROUP BY memberid, DATE_TRUNC('month', bookingdate)::date
+        ON CONFLICT (memberid, month) DO UPDATE
+        SET class_bookings = member_month_stats.class_bookings + EXCLUDED.class_bookings,
+            updated_at = CURRENT_TIMESTAMP;
+    ELSE
+        UPDATE member_month_stats mms
+        SET class_bookings = mms.class_bookings - o.cnt,
+            updated_at = CURRENT_TIMESTAMP
+        FROM (
+            SELECT memberid, DATE_TRUNC('month', bookingdate)::date AS month, COUNT(*) AS cnt
+            FROM old_rows
+            GROUP BY memberid, DATE_TRUNC('month', bookingdate)::date
+        ) o
+        WHERE mms.memberid = o.memberid AND mms.month = o.month;
+    END IF;
+    RETURN NULL;
+END;
+$$ language 'plpgsql';
+
+-- BOOKED_COUNT follows CLASSBOOKING in both directions: inserted bookings take
+-- seats and deleted ones give them back, one UPDATE per statement. A full class
+-- makes the UPDATE fail CHK_SCHEDULE_BOOKED_COUNT (the row lock serialises
+-- concurrent bookings); a NULL MAXPARTICIPANTS means no limit.
+CREATE OR REPLACE FUNCTION fn_classschedule_booked_count()
+RETURNS TRIGGER AS $$
+BEGIN
+    -- archive_history moves old rows to MongoDB: the aggregates keep them
+    IF current_setting('primefit.archiving', true) = 'on' THEN
+        RETURN NULL;
+    END IF;
+    IF TG_OP = 'INSERT' THEN
+        UPDATE classschedule cs
+        SET booked_count = cs.booked_count + n.cnt
+        FROM (SELECT classscheduleid, COUNT(*) AS cnt FROM new_rows GROUP BY classscheduleid) n
+        WHERE cs.classscheduleid = n.classscheduleid;
+    ELSE
+        UPDATE classschedule cs
+        SET booked_count = cs.booked_count - o.cnt
+        FROM (SELECT classscheduleid, COUNT(*) AS cnt FROM old_rows GROUP BY classscheduleid) o
+        WHERE cs.classscheduleid = o.classscheduleid;
+    END IF;
+    RETURN NULL;
+END;
+$$ language 'plpgsql';
+
+CREATE TRIGGER checkin_month_stats_ins AFTER INSERT ON CHECKIN REFERENCING NEW TABLE AS new_rows FOR EACH STATEMENT EXECUTE FUNCTION fn_member_month_stats_checkin();
+CREATE TRIGGER checkin_month_stats_upd AFTER UPDATE ON CHECKIN REFERENCING OLD TABLE AS old_rows NEW TABLE AS new_rows FOR EACH STATEMENT EXECUTE FUNCTION fn_member_month_stats_checkin();
+CREATE TRIGGER checkin_month_stats_del AFTER DELETE ON CHECKIN REFERENCING OLD TABLE AS old_rows FOR EACH STATEMENT EXECUTE FUNCTION fn_member_month_stats_checkin();
+CREATE TRIGGER classbooking_month_stats_ins AFTER INSERT ON CLASSBOOKING REFERENCING NEW TABLE AS new_rows FOR EACH STATEMENT EXECUTE FUNCTION fn_member_month_stats_booking();
+CREATE TRIGGER classbooking_month_stats_del AFTER DELETE ON CLASSBOOKING REFERENCING OLD TABLE AS old_rows FOR EACH STATEMENT EXECUTE FUNCTION fn_member_month_stats_booking();
+CREATE TRIGGER classbooking_booked_count_ins AFTER INSERT ON CLASSBOOKING REFERENCING NEW TABLE AS new_rows FOR EACH STATEMENT EXECUTE FUNCTION fn_classschedule_booked_count();
+CREATE TRIGGER classbooking_booked_count_del AFTER DELETE ON CLASSBOOKING REFERENCING OLD TABLE AS old_rows FOR EACH STATEMENT EXECUTE FUNCTION fn_classschedule_booked_count();
+
+-- CREATE MONTHLY PARTITIONS (CHECKIN by DATE, PAYMENT by DUEDATE)
+-- Creates the partitions <table>_yYYYYmMM for p_months months starting at the
+-- month of p_from (existing ones are skipped). Indexes, constraints and
+-- triggers declared on the parent are applied to each new partition.
+-- Also called by the manage_partitions command to keep future months ready.
+CREATE OR REPLACE FUNCTION fn_ensure_month_partitions(p_table TEXT, p_from DATE, p_months INTEGER)
+RETURNS INTEGER AS $$
+DECLARE
+    v_start DATE := date_trunc('month', p_from)::date;
+    v_name TEXT;
+    v_created INTEGER := 0;
+BEGIN
+    FOR i IN 0 .. p_months - 1 LOOP
+        v_name := format('%s_y%sm%s', lower(p_table), to_char(v_start, 'YYYY'), to_char(v_start, 'MM'));
+        IF to_regclass(v_name) IS NULL THEN
+            EXECUTE format(
+                'CREATE TABLE %I PARTITION OF %I FOR VALUES FROM (%L) TO (%L)',
+                v_name, lower(p_table), v_start, (v_start + INTERVAL '1 month')::date
+            );
+            v_created := v_created + 1;
+        END IF;
+        v_start := (v_start + INTERVAL '1 month')::date;
+    END LOOP;
+    RETURN v_created;
+END;
+$$ language 'plpgsql';
+
+-- Rows outside every monthly partition land here; manage_partitions reports them
+CREATE TABLE CHECKIN_DEFAULT PARTITION OF CHECKIN DEFAULT;
+CREATE TABLE PAYMENT_DEFAULT PARTITION OF PAYMENT DEFAULT;
+
+SELECT fn_ensure_month_partitions('checkin', (CURRENT_DATE - INTERVAL '24 months')::date, 28);
+SELECT fn_ensure_month_partitions('payment', (CURRENT_DATE - INTERVAL '24 months')::date, 28);
+
 -- CREATE SECURITY POLICIES (ROW LEVEL SECURITY)
 -- Enable RLS on sensitive tables
 ALTER TABLE MEMBER ENABLE ROW LEVEL SECURITY;
@@ -358,6 +860,8 @@ ALTER TABLE MEMBERSUBSCRIPTION ENABLE ROW LEVEL SECURITY;
 ALTER TABLE USERS ENABLE ROW LEVEL SECURITY;
 
 -- INSERT DEFAULT DATA
+INSERT INTO DASHBOARDCOUNTERS (COUNTERID) VALUES (1);
+
 INSERT INTO USERTYPE (LABEL) VALUES 
 ('Gestor'),
 ('Instrutor'),
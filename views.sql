@@ -11,6 +11,7 @@ DROP VIEW IF EXISTS vw_instructor_info;
 DROP VIEW IF EXISTS vw_instructor_classes;
 DROP VIEW IF EXISTS vw_class_schedules;
 DROP VIEW IF EXISTS vw_dashboard_stats;
+DROP VIEW IF EXISTS vw_occupancy_today;
 DROP VIEW IF EXISTS vw_all_members;
 DROP VIEW IF EXISTS vw_all_classes;
 DROP VIEW IF EXISTS vw_all_checkins;
@@ -62,48 +63,52 @@ LEFT JOIN users u ON m.userid = u.userid
 WHERE m.isactive = true;
 
 -- View for member stats current month
+-- Activity comes from the MEMBER_MONTH_STATS rollup (one primary key lookup per
+-- member) instead of joining checkin x classbooking x payment and de-duplicating.
 CREATE OR REPLACE VIEW vw_member_stats_month AS
 SELECT 
-    COUNT(DISTINCT c.checkinid) AS checkin_count,
-    COUNT(DISTINCT cb.bookingid) AS class_bookings,
-    SUM(EXTRACT(EPOCH FROM (c.exittime - c.entrancetime)) / 3600) AS total_hours,
-    MIN(pay.duedate) AS next_payment,
+    COALESCE(mms.checkin_count, 0) AS checkin_count,
+    COALESCE(mms.class_bookings, 0) AS class_bookings,
+    COALESCE(mms.total_hours, 0) AS total_hours,
+    np.next_payment,
     pl.monthlyprice AS payment_price,
     m.memberid,
     m.userid AS userid
 FROM member m
-LEFT JOIN checkin c ON c.memberid = m.memberid 
-    AND c.date >= DATE_TRUNC('month', CURRENT_DATE) 
-    AND c.date <= CURRENT_DATE
-LEFT JOIN classbooking cb ON cb.memberid = m.memberid 
-    AND cb.bookingdate >= DATE_TRUNC('month', CURRENT_DATE) 
-    AND cb.bookingdate <= CURRENT_TIMESTAMP
+LEFT JOIN member_month_stats mms ON mms.memberid = m.memberid 
+    AND mms.month = DATE_TRUNC('month', CURRENT_DATE)::date
 LEFT JOIN membersubscription ms ON ms.memberid = m.memberid AND ms.isactive = true
 LEFT JOIN plan pl ON ms.planid = pl.planid
-LEFT JOIN payment pay ON pay.subscriptionid = ms.subscriptionid 
-    AND pay.ispayed = false 
-    AND pay.duedate >= DATE_TRUNC('month', CURRENT_DATE)
-WHERE m.isactive = true
-GROUP BY m.memberid, m.userid, pl.monthlyprice;
+LEFT JOIN LATERAL (
+    SELECT MIN(pay.duedate) AS next_payment
+    FROM payment pay
+    WHERE pay.subscriptionid = ms.subscriptionid 
+        AND pay.ispayed = false 
+        AND pay.duedate >= DATE_TRUNC('month', CURRENT_DATE)
+) np ON true
+WHERE m.isactive = true;
 
+-- Upcoming booked classes, filtered by memberid (IDX_CLASSBOOKING_MEMBER)
 CREATE OR REPLACE VIEW vw_member_schedule_classes AS
 SELECT 
+    cb.bookingid,
     c.name AS class_name, 
     cs.date, 
     cs.starttime, 
     cs.endtime,
     c.room,
     u.name AS instructor_name,
-    m.userid
-FROM classschedule cs
+    cb.memberid
+FROM classbooking cb
+JOIN classschedule cs ON cs.classscheduleid = cb.classscheduleid
 LEFT JOIN class c ON cs.classid = c.classid
 LEFT JOIN instructor i ON c.instructorid = i.instructorid
 LEFT JOIN users u ON i.userid = u.userid
-LEFT JOIN classbooking cb ON cs.classscheduleid = cb.classscheduleid
-LEFT JOIN member m ON cb.memberid = m.memberid
 WHERE cs.isactive = true and cs.date >= CURRENT_DATE;
 
 -- View for classes available today (can be filtered by member to exclude already booked classes)
+-- Seats come from CLASSSCHEDULE.BOOKED_COUNT, maintained by the CLASSBOOKING
+-- triggers; a NULL MAXPARTICIPANTS (no limit) gives NULL available_spots
 CREATE OR REPLACE VIEW vw_member_available_classes AS
 SELECT 
     cs.classscheduleid,
@@ -116,24 +121,17 @@ SELECT
     cs.starttime,
     cs.endtime,
     cs.maxparticipants,
-    COALESCE(booking_count.total_bookings, 0) AS current_bookings,
-    (cs.maxparticipants - COALESCE(booking_count.total_bookings, 0)) AS available_spots
+    cs.booked_count AS current_bookings,
+    (cs.maxparticipants - cs.booked_count) AS available_spots
 
 FROM classschedule cs
 JOIN class c ON cs.classid = c.classid AND c.isactive = true
 JOIN instructor i ON c.instructorid = i.instructorid
 JOIN users u ON i.userid = u.userid
-LEFT JOIN (
-    SELECT 
-        classscheduleid, 
-        COUNT(*) as total_bookings
-    FROM classbooking 
-    GROUP BY classscheduleid
-) booking_count ON cs.classscheduleid = booking_count.classscheduleid
 WHERE cs.isactive = true 
     AND cs.date = CURRENT_DATE 
     AND cs.starttime > CURRENT_TIME
-    AND (cs.maxparticipants - COALESCE(booking_count.total_bookings, 0)) > 0;
+    AND (cs.maxparticipants IS NULL OR cs.booked_count < cs.maxparticipants);
 
 -- View for classes available for a specific member (excluding already booked classes)
 CREATE OR REPLACE VIEW vw_classes_for_member AS
@@ -148,8 +146,8 @@ SELECT
     cs.starttime,
     cs.endtime,
     cs.maxparticipants,
-    COALESCE(booking_count.total_bookings, 0) AS current_bookings,
-    (cs.maxparticipants - COALESCE(booking_count.total_bookings, 0)) AS available_spots,
+    cs.booked_count AS current_bookings,
+    (cs.maxparticipants - cs.booked_count) AS available_spots,
     m.memberid,
     m.userid
 
@@ -158,19 +156,12 @@ JOIN class c ON cs.classid = c.classid AND c.isactive = true
 JOIN instructor i ON c.instructorid = i.instructorid
 JOIN users u ON i.userid = u.userid
 CROSS JOIN member m
-LEFT JOIN (
-    SELECT 
-        classscheduleid, 
-        COUNT(*) as total_bookings
-    FROM classbooking 
-    GROUP BY classscheduleid
-) booking_count ON cs.classscheduleid = booking_count.classscheduleid
 LEFT JOIN classbooking existing_booking ON cs.classscheduleid = existing_booking.classscheduleid 
     AND existing_booking.memberid = m.memberid
 WHERE cs.isactive = true 
     AND m.isactive = true
     AND cs.date = CURRENT_DATE
-    AND (cs.maxparticipants - COALESCE(booking_count.total_bookings, 0)) > 0
+    AND (cs.maxparticipants IS NULL OR cs.booked_count < cs.maxparticipants)
     AND existing_booking.bookingid IS NULL; 
 
 -- View for member account details
@@ -229,10 +220,8 @@ SELECT
     c.room, 
     c.capacity, 
     c.duration_minutes,
-    c.instructorid,
-    i.userid
+    c.instructorid
 FROM class c
-JOIN instructor i ON c.instructorid = i.instructorid
 WHERE c.isactive = true;
 
 -- View for class schedules with instructor info
@@ -245,20 +234,33 @@ SELECT
     cs.endtime,
     cs.maxparticipants, 
     c.room,
-    c.instructorid,
-    i.userid
+    c.instructorid
 FROM classschedule cs
 JOIN class c ON cs.classid = c.classid
-JOIN instructor i ON c.instructorid = i.instructorid
 WHERE cs.isactive = true;
 
--- View for dashboard statistics
+-- View for dashboard statistics (counters maintained by triggers, see sq.sql)
 CREATE OR REPLACE VIEW vw_dashboard_stats AS
 SELECT 
-    (SELECT COUNT(*) FROM member WHERE isactive = true) as total_members,
-    (SELECT COUNT(*) FROM instructor WHERE isactive = true) as total_instructors,
-    (SELECT COUNT(*) FROM membersubscription WHERE isactive = true) as active_memberships,
-    (SELECT COUNT(*) FROM checkin WHERE date = CURRENT_DATE) as today_checkins;
+    dc.counterid,
+    dc.total_members,
+    dc.total_instructors,
+    dc.active_memberships,
+    COALESCE(dcc.total, 0) as today_checkins
+FROM dashboardcounters dc
+LEFT JOIN dailycheckincount dcc ON dcc.date = CURRENT_DATE
+WHERE dc.counterid = 1;
+
+-- View for today's occupancy by hour (HOURLYOCCUPANCY is maintained by triggers,
+-- see sq.sql). OCCUPANCY is the number of people inside at the end of each hour.
+CREATE OR REPLACE VIEW vw_occupancy_today AS
+SELECT 
+    h.hour,
+    COALESCE(ho.entries, 0) as entries,
+    COALESCE(ho.exits, 0) as exits,
+    (SUM(COALESCE(ho.entries, 0) - COALESCE(ho.exits, 0)) OVER (ORDER BY h.hour))::BIGINT as occupancy
+FROM generate_series(0, 23) AS h(hour)
+LEFT JOIN hourlyoccupancy ho ON ho.date = CURRENT_DATE AND ho.hour = h.hour;
 
 -- View for all members with subscription info
 CREATE OR REPLACE VIEW vw_all_members AS
@@ -330,7 +332,8 @@ SELECT
     p.duedate, 
     p.paymentdate, 
     p.ispayed, 
-    p.paymentmethod
+    p.paymentmethod,
+    p.isoverdue
 FROM payment p
 JOIN membersubscription ms ON p.subscriptionid = ms.subscriptionid
 JOIN member m ON ms.memberid = m.memberid
@@ -349,6 +352,8 @@ SELECT
 FROM plan;
 
 -- View for member payment history
+-- 'Em Atraso' comes from PAYMENT.ISOVERDUE (set by the billing run after the
+-- grace period, cleared on settlement) so it matches the manager's filter
 CREATE OR REPLACE VIEW vw_member_payment_history AS
 SELECT 
     p.paymentid,
@@ -357,18 +362,17 @@ SELECT
     p.paymentmethod,
     CASE 
         WHEN p.ispayed = true THEN 'Pago'
-        WHEN p.duedate < CURRENT_DATE THEN 'Em Atraso'
+        WHEN p.isoverdue = true THEN 'Em Atraso'
         ELSE 'Pendente'
     END as payment_status,
     p.paymentdate,
-    ms.memberid,
-    m.userid
+    ms.memberid
 FROM payment p
-JOIN membersubscription ms ON p.subscriptionid = ms.subscriptionid
-JOIN member m ON ms.memberid = m.memberid
-ORDER BY p.duedate DESC;
+JOIN membersubscription ms ON p.subscriptionid = ms.subscriptionid;
 
 -- View for member checkin history
+-- No ORDER BY in the view: callers filter by member and order/limit themselves,
+-- which lets the planner walk IDX_CHECKIN_MEMBER_DATE backwards and stop early
 CREATE OR REPLACE VIEW vw_member_checkin_history AS
 SELECT 
     c.checkinid,
@@ -388,8 +392,5 @@ SELECT
             )
         ELSE 'Em curso'
     END as duration_formatted,
-    c.memberid,
-    m.userid
-FROM checkin c
-JOIN member m ON c.memberid = m.memberid
-ORDER BY c.date DESC, c.entrancetime DESC;
+    c.memberid
+FROM checkin c;